@@ -0,0 +1,481 @@
+import os
+import csv
+import sys
+import json
+import time
+import bisect
+import hashlib
+import argparse
+import threading
+import urllib.request
+from decimal import Decimal, InvalidOperation
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from agrural_csvappend import sidecar_paths
+from agrural_praca import DEFAULT_ALIAS_FILE, PracaCanon, fold
+
+# API de leitura (JSON) dos preços, para as ferramentas que hoje consultam a dbo.PrecoSoja
+# direto: um serviço local com todo o histórico em memória, lido do banco uma vez e depois
+# aquecido com o lote de cada carga (o coletor faz POST /carga depois do commit, --api-url).
+#
+#   GET /precos/ultimo?produto=&uf=&praca=          última cotação de cada praça
+#   GET /precos?data=AAAA-MM-DD&produto=&uf=&praca=  cotações do dia (sem data: o dia mais recente)
+#   GET /precos?de=AAAA-MM-DD&ate=AAAA-MM-DD&...     período (série de uma praça com &praca=)
+#   GET /saude                                       geração, linhas, última carga
+#   POST /carga                                      lote carregado + marca d'água da carga, só de 127.0.0.1
+#
+# Cada resposta sai com ETag (hash do corpo) e If-None-Match igual devolve 304. As respostas
+# ficam guardadas até a próxima carga confirmada: o lote recebido em /carga (vale na hora) ou
+# a marca d'água da carga (PrecoSojaCarga, gravada na transação do MERGE) diferente da última
+# lida da fonte, conferida a cada --poll-s (pega as cargas que não avisaram a API: backfill,
+# sources, outro PC). O aviso traz a marca d'água de antes e de depois da carga, lidas na
+# transação dela: se a de antes é a última vista, a de depois passa a ser a vista e o poll
+# seguinte não relê nada; se não é (carga sem aviso no meio), o poll relê uma vez.
+# Fontes: SQL Server, o SQLite de teste ou o CSV do scrape (mtime/tamanho no lugar da marca).
+
+DEFAULT_PORT = 8780
+POLL_S = 30.0
+# mesmos nomes de coluna do dbo.PrecoSoja
+VALUE_COLS = ("compra_rs_sc", "var_dia_pct", "var_sem_pct", "var_mes_pct")
+# colunas do CSV (agrural_batch.COLUMNS) -> valores
+_CSV_VALUES = ("compra_R$/sc", "var_dia_%", "var_sem_%", "var_mes_%")
+
+# só as linhas da AgRural, as mesmas da marca d'água lida em version() (o comando sources
+# grava outras fontes no mesmo fato)
+_SELECT = ("SELECT data, produto, uf, praca, compra_rs_sc, var_dia_pct, var_sem_pct, var_mes_pct FROM {} "
+           "WHERE fonte = 'AgRural'")
+
+Version = Optional[Tuple]
+
+
+def _version(row) -> Version:
+    # marca d'água como tupla de textos: a lida da fonte e a que chega em /carga (JSON)
+    # comparam igual quando são a mesma linha
+    return tuple(None if v is None else str(v) for v in row) if row else None
+
+
+def _cents(v) -> Optional[int]:
+    # Decimal do pyodbc, número do SQLite ou texto do CSV -> centésimos (None = nulo)
+    if v is None or v == "":
+        return None
+    try:
+        return int(Decimal(str(v)).scaleb(2).to_integral_value())
+    except InvalidOperation:
+        return None
+
+
+def _iso(d) -> Optional[str]:
+    return d.isoformat() if hasattr(d, "isoformat") else (d or None)
+
+
+# ----------- fontes -----------
+# rows(): (data, produto, uf, praca, centésimos x4); version(): muda só quando uma carga é confirmada
+
+class SqliteSource:
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _connect(self):
+        import sqlite3
+        # só leitura: a API nunca cria o esquema nem segura trava de escrita
+        return sqlite3.connect(f"file:{os.path.abspath(self.path)}?mode=ro", uri=True)
+
+    def version(self) -> Version:
+        if not os.path.exists(self.path):
+            return None
+        cn = self._connect()
+        try:
+            return _version(cn.execute("SELECT max_data, snapshot, linhas, load_ts FROM PrecoSojaCarga "
+                                       "WHERE fonte='AgRural'").fetchone())
+        except Exception:  # banco anterior à marca d'água
+            return _version(cn.execute("SELECT COUNT(*), MAX(load_ts) FROM PrecoSojaFato").fetchone())
+        finally:
+            cn.close()
+
+    def rows(self) -> Iterable[Tuple]:
+        if not os.path.exists(self.path):
+            return []
+        cn = self._connect()
+        try:
+            return [r[:4] + tuple(_cents(v) for v in r[4:]) for r in cn.execute(_SELECT.format("PrecoSoja"))]
+        finally:
+            cn.close()
+
+
+class SqlServerSource:
+    name = "sqlserver"
+
+    def __init__(self, conn_str: str):
+        self.conn_str = conn_str
+        self._cn = None
+
+    def _cursor(self):
+        if self._cn is None:
+            import pyodbc
+            self._cn = pyodbc.connect(self.conn_str, autocommit=True)
+        return self._cn.cursor()
+
+    def _run(self, sql: str) -> List:
+        # conexão caída (SQL Express reiniciado): reabre uma vez
+        try:
+            return self._cursor().execute(sql).fetchall()
+        except Exception:
+            self._cn = None
+            return self._cursor().execute(sql).fetchall()
+
+    def version(self) -> Version:
+        rows = self._run("IF OBJECT_ID('dbo.PrecoSojaCarga','U') IS NOT NULL "
+                         "SELECT [max_data],[snapshot],[linhas],[load_ts] FROM dbo.PrecoSojaCarga "
+                         "WHERE [fonte]=N'AgRural' "
+                         "ELSE SELECT COUNT(*), MAX([load_ts]) FROM dbo.PrecoSoja")
+        return _version(rows[0]) if rows else None
+
+    def rows(self) -> Iterable[Tuple]:
+        return [(_iso(r[0]), r[1], r[2], r[3]) + tuple(_cents(v) for v in r[4:])
+                for r in self._run(_SELECT.format("dbo.PrecoSoja"))]
+
+
+class CsvSource:
+    name = "csv"
+
+    def __init__(self, path: str):
+        self.path = path
+        # CSV do scrape --append: o log de atualizações vem depois e vence
+        self.paths = (path, sidecar_paths(path)[0])
+
+    def version(self) -> Version:
+        out = []
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                out.append(None)
+                continue
+            out.append((st.st_mtime_ns, st.st_size))
+        return tuple(out) if out[0] else None
+
+    def rows(self) -> Iterable[Tuple]:
+        out = []
+        for path in self.paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, "r", encoding="utf-8", newline="") as f:
+                for r in csv.DictReader(f):
+                    # linhas sem data (CSV do scrape sem data no site) não entram em nenhuma consulta
+                    if r.get("data"):
+                        out.append((r["data"], r.get("produto") or "soja", r.get("uf") or None,
+                                    r.get("praca") or "") + tuple(_cents(r.get(c)) for c in _CSV_VALUES))
+        return out
+
+
+# ----------- cache em memória -----------
+
+class PriceStore:
+    # histórico inteiro indexado por data e por praça; a praça é a chave da DimPraca
+    # (uf + nome dobrado), então outra grafia no lote não vira praça nova
+
+    def __init__(self, canon: PracaCanon):
+        self.canon = canon
+        self.rows: Dict[Tuple[str, str, str, str], Tuple] = {}      # (data, produto, uf, chave) -> valores
+        self.by_date: Dict[str, Dict[Tuple[str, str, str], None]] = {}  # data -> (produto, uf, chave)
+        self.dates: List[str] = []                                  # datas em ordem
+        self.latest: Dict[Tuple[str, str, str], str] = {}           # (produto, uf, chave) -> maior data
+        self.names: Dict[Tuple[str, str], str] = {}                 # (uf, chave) -> grafia de exibição
+
+    def merge(self, rows: Iterable[Tuple]) -> int:
+        n = 0
+        keys: Dict[Tuple[str, str], str] = {}  # (uf, grafia) -> chave; as praças se repetem
+        for data, produto, uf, praca, *vals in rows:
+            if not data or not uf:
+                continue
+            if (uf, praca) not in keys:
+                nome = self.canon.name(uf, praca)
+                keys[(uf, praca)] = chave = fold(nome)
+                self.names.setdefault((uf, chave), nome)
+            pk = (produto, uf, keys[(uf, praca)])
+            if data not in self.by_date:
+                self.by_date[data] = {}
+                bisect.insort(self.dates, data)
+            self.by_date[data][pk] = None
+            self.rows[(data,) + pk] = tuple(vals)
+            if self.latest.get(pk, "") < data:
+                self.latest[pk] = data
+            n += 1
+        return n
+
+    def _record(self, data: str, pk: Tuple[str, str, str]) -> Dict:
+        vals = self.rows[(data,) + pk]
+        rec = {"data": data, "produto": pk[0], "uf": pk[1], "praca": self.names[(pk[1], pk[2])]}
+        rec.update((c, None if v is None else v / 100) for c, v in zip(VALUE_COLS, vals))
+        return rec
+
+    @staticmethod
+    def _match(pk: Tuple[str, str, str], produto: Optional[str], uf: Optional[str], chave: Optional[str]) -> bool:
+        return (produto is None or pk[0] == produto) and (uf is None or pk[1] == uf) and (chave is None or pk[2] == chave)
+
+    def latest_prices(self, produto=None, uf=None, chave=None) -> List[Dict]:
+        out = [self._record(d, pk) for pk, d in self.latest.items() if self._match(pk, produto, uf, chave)]
+        return sorted(out, key=lambda r: (r["produto"], r["uf"], r["praca"]))
+
+    def prices(self, de: str, ate: str, produto=None, uf=None, chave=None) -> List[Dict]:
+        lo, hi = bisect.bisect_left(self.dates, de), bisect.bisect_right(self.dates, ate)
+        out = []
+        for d in self.dates[lo:hi]:
+            out += [self._record(d, pk) for pk in self.by_date[d] if self._match(pk, produto, uf, chave)]
+        return sorted(out, key=lambda r: (r["produto"], r["uf"], r["praca"], r["data"]))
+
+    def last_date(self, produto=None) -> Optional[str]:
+        if produto is None:
+            return self.dates[-1] if self.dates else None
+        return max((d for pk, d in self.latest.items() if pk[0] == produto), default=None)
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def _date_param(q: Dict[str, str], name: str) -> Optional[str]:
+    v = q.get(name)
+    if v is None:
+        return None
+    try:
+        return datetime.strptime(v, "%Y-%m-%d").date().isoformat()
+    except ValueError:
+        raise BadRequest(f"{name}: use AAAA-MM-DD (recebido: {v})")
+
+
+class PriceApi:
+    # estado do serviço: loja em memória + respostas prontas (ETag) da geração atual
+
+    def __init__(self, source, canon: Optional[PracaCanon] = None):
+        self.source = source
+        self.canon = canon or PracaCanon()
+        self.lock = threading.Lock()
+        self.store = PriceStore(self.canon)
+        self.responses: Dict[str, Tuple[str, bytes]] = {}
+        self.version: Version = None
+        self.generation = 0
+        self.loaded_at: Optional[str] = None
+        self.hits = self.misses = 0
+
+    def _bump(self, version: Version) -> None:
+        # chamado com o lock: nova carga confirmada -> respostas guardadas deixam de valer
+        self.version = version
+        self.generation += 1
+        self.loaded_at = datetime.now().replace(microsecond=0).isoformat()
+        self.responses = {}
+
+    def reload(self) -> int:
+        # leitura completa da fonte fora do lock; troca a loja inteira de uma vez
+        version = self.source.version()
+        store = PriceStore(self.canon)
+        n = store.merge(self.source.rows())
+        with self.lock:
+            self.store = store
+            self._bump(version)
+        print(f"API: {n} cotações carregadas de {self.source.name} (geração {self.generation}).")
+        return n
+
+    def refresh(self) -> bool:
+        # marca d'água diferente da vista = carga que não passou por /carga
+        version = self.source.version()
+        if version == self.version:
+            return False
+        self.reload()
+        return True
+
+    def warm(self, batch: Dict, watermark: Optional[List] = None) -> int:
+        # lote de PriceBatch.to_json (já gravado pelo coletor): entra direto na loja.
+        # watermark = [antes, depois] da carga (LoadResult.watermark). Antes = última vista:
+        # nenhuma carga sem aviso no meio, e depois vira a vista. Senão (ou sem marca) a vista
+        # não muda e o poll seguinte relê a fonte uma vez.
+        text, cents, valid = batch["text"], batch["cents"], batch["valid"]
+        cols = [text[c] for c in ("data", "produto", "uf", "praca")]
+        cols += [[v if ok else None for v, ok in zip(cents[c], valid[c])] for c in _CSV_VALUES]
+        before, after = (_version(m) for m in watermark) if watermark else (None, None)
+        with self.lock:
+            n = self.store.merge(zip(*cols))
+            self._bump(after if after is not None and before == self.version else self.version)
+        print(f"API: lote de {n} cotações aplicado (geração {self.generation}).")
+        return n
+
+    def health(self) -> Dict:
+        with self.lock:
+            return {"fonte": self.source.name, "geracao": self.generation, "carregado_em": self.loaded_at,
+                    "cotacoes": len(self.store.rows), "pracas": len(self.store.names),
+                    "ultima_data": self.store.last_date(), "respostas_em_cache": len(self.responses),
+                    "acertos": self.hits, "faltas": self.misses}
+
+    def _query(self, path: str, q: Dict[str, str]) -> Dict:
+        produto = q.get("produto", "").strip().lower() or None
+        uf = q.get("uf", "").strip().upper() or None
+        chave = self.canon.key(uf, q["praca"]) if q.get("praca") else None
+        store = self.store
+        if path == "/precos/ultimo":
+            return {"precos": store.latest_prices(produto, uf, chave)}
+        data, de, ate = _date_param(q, "data"), _date_param(q, "de"), _date_param(q, "ate")
+        if data and (de or ate):
+            raise BadRequest("use data= ou de=/ate=, não os dois")
+        if data or not (de or ate):
+            data = data or store.last_date(produto)
+            return {"data": data, "precos": store.prices(data, data, produto, uf, chave) if data else []}
+        return {"de": de, "ate": ate, "precos": store.prices(de or "", ate or "9999-12-31", produto, uf, chave)}
+
+    def get(self, path: str, q: Dict[str, str]) -> Tuple[str, bytes]:
+        key = path + "?" + "&".join(f"{k}={q[k]}" for k in sorted(q))
+        with self.lock:
+            hit = self.responses.get(key)
+            if hit is not None:
+                self.hits += 1
+                return hit
+            self.misses += 1
+            body = json.dumps(self._query(path, q), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            # ETag = hash do corpo: uma carga que não mexe nesta consulta mantém o 304 do cliente
+            hit = self.responses[key] = ('"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"', body)
+            return hit
+
+
+# ----------- HTTP -----------
+
+class ApiServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, api: PriceApi, host: str = "127.0.0.1", port: int = DEFAULT_PORT):
+        self.api = api
+        super().__init__((host, port), _Handler)
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self) -> "ApiServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # cabeçalho e corpo em escritas separadas + keep-alive
+
+    def log_message(self, fmt, *args):  # sem uma linha por requisição no console
+        pass
+
+    def _send(self, status: int, body: bytes = b"", etag: Optional[str] = None) -> None:
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")  # o cliente guarda, mas revalida sempre
+        if status != 304:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+    def _error(self, status: int, msg: str) -> None:
+        self._send(status, json.dumps({"erro": msg}, ensure_ascii=False).encode("utf-8"))
+
+    def do_GET(self):
+        api = self.server.api
+        url = urlsplit(self.path)
+        path = url.path.rstrip("/") or "/"
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if path == "/saude":
+            return self._send(200, json.dumps(api.health(), ensure_ascii=False).encode("utf-8"))
+        if path not in ("/precos", "/precos/ultimo"):
+            return self._error(404, f"caminho desconhecido: {path}")
+        try:
+            etag, body = api.get(path, q)
+        except BadRequest as e:
+            return self._error(400, str(e))
+        inm = self.headers.get("If-None-Match")
+        if inm and (inm.strip() == "*" or etag in [t.strip().removeprefix("W/") for t in inm.split(",")]):
+            return self._send(304, etag=etag)
+        self._send(200, body, etag)
+
+    def do_POST(self):
+        if urlsplit(self.path).path.rstrip("/") != "/carga":
+            return self._error(404, f"caminho desconhecido: {self.path}")
+        if self.client_address[0] not in ("127.0.0.1", "::1"):
+            return self._error(403, "carga só pela própria máquina")
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+            # {"lote": ..., "marca": [antes, depois]}; coletores antigos mandam só o lote
+            if "lote" in body:
+                n = self.server.api.warm(body["lote"], body.get("marca"))
+            else:
+                n = self.server.api.warm(body)
+        except (ValueError, KeyError, TypeError) as e:
+            return self._error(400, f"lote inválido: {type(e).__name__}: {e}")
+        self._send(200, json.dumps({"cotacoes": n, "geracao": self.server.api.generation}).encode("utf-8"))
+
+
+def poll(api: PriceApi, every_s: float, stop: threading.Event) -> None:
+    while not stop.wait(every_s):
+        try:
+            api.refresh()
+        except Exception as e:  # banco fora do ar: segue servindo o que tem
+            print(f"API: marca d'água indisponível ({type(e).__name__}: {e}).", file=sys.stderr)
+
+
+def notify(url: str, batch, watermark: Optional[Tuple] = None, timeout: float = 5.0) -> Optional[Dict]:
+    # chamado pelo coletor depois do commit, com LoadResult.watermark; a API fora do ar não
+    # atrapalha a carga (ela pega a carga pela marca d'água no próximo --poll-s)
+    body = {"lote": batch.to_json(), "marca": [_version(m) for m in watermark] if watermark else None}
+    req = urllib.request.Request(url.rstrip("/") + "/carga", data=json.dumps(body).encode("utf-8"),
+                                 headers={"Content-Type": "application/json"}, method="POST")
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return json.loads(resp.read())
+    except Exception as e:
+        print(f"API: aviso de carga não entregue em {url} ({type(e).__name__}: {e}).", file=sys.stderr)
+        return None
+
+
+def make_source(args):
+    if args.sqlite:
+        return SqliteSource(args.sqlite)
+    if args.csv:
+        return CsvSource(args.csv)
+    return SqlServerSource(args.conn_str)
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="API JSON de leitura dos preços, com cache em memória e ETag/304.")
+    src = p.add_mutually_exclusive_group(required=True)
+    src.add_argument("--conn-str", help="String ODBC do SQL Server (lê dbo.PrecoSoja).")
+    src.add_argument("--sqlite", metavar="DB", help="Banco SQLite do --sink sqlite (stand-in local).")
+    src.add_argument("--csv", metavar="FILE", help="CSV do scrape (soja_agrural.csv).")
+    p.add_argument("--host", default="127.0.0.1", help="Endereço (padrão: só a própria máquina).")
+    p.add_argument("--port", type=int, default=DEFAULT_PORT)
+    p.add_argument("--poll-s", type=float, default=POLL_S,
+                   help="Intervalo (s) da conferência da marca d'água, para cargas que não avisaram a API.")
+    p.add_argument("--pracas-alias", default=DEFAULT_ALIAS_FILE, help="JSON com apelidos das praças.")
+    args = p.parse_args()
+
+    api = PriceApi(make_source(args), PracaCanon.load(args.pracas_alias))
+    t0 = time.perf_counter()
+    api.reload()
+    print(f"API: pronta em {time.perf_counter() - t0:.2f}s, http://{args.host}:{args.port}/precos/ultimo")
+    stop = threading.Event()
+    threading.Thread(target=poll, args=(api, args.poll_s, stop), daemon=True).start()
+    server = ApiServer(api, args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
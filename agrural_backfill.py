@@ -0,0 +1,135 @@
+import os
+import re
+import sys
+import tarfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from agrural_batch import PriceBatch
+from agrural_metrics import METRICS
+from agrural_sinks import Sink
+from agrural_core import batch_from_html
+
+HTML_EXT = (".html", ".htm")
+
+# datas no nome do arquivo: 20250918, 2025-09-18, 2025_09_18
+_NAME_DATE_RE = re.compile(r"(20\d{2})[-_]?(\d{2})[-_]?(\d{2})")
+
+
+def _date_from_name(name: str) -> Optional[str]:
+    m = _NAME_DATE_RE.search(os.path.basename(name))
+    if not m:
+        return None
+    try:
+        return datetime(int(m.group(1)), int(m.group(2)), int(m.group(3))).date().isoformat()
+    except ValueError:
+        return None
+
+
+def _decode(raw: bytes) -> str:
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return raw.decode("cp1252", errors="replace")
+
+
+# Cada item: (nome, mtime, caminho ou None, bytes ou None). Em pastas só o caminho
+# atravessa o pool; em tar o conteúdo já vem lido (o tar não é compartilhável entre processos).
+def iter_snapshots(source: str) -> Iterator[Tuple[str, float, Optional[str], Optional[bytes]]]:
+    if os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            for fn in sorted(files):
+                if fn.lower().endswith(HTML_EXT):
+                    path = os.path.join(root, fn)
+                    yield path, os.path.getmtime(path), path, None
+        return
+    with tarfile.open(source, "r:*") as tar:
+        for m in tar:
+            if m.isfile() and m.name.lower().endswith(HTML_EXT):
+                f = tar.extractfile(m)
+                if f is not None:
+                    yield m.name, float(m.mtime), None, f.read()
+
+
+def _parse_snapshot(item, parser: str, restrict: bool, produtos: Optional[List[str]]):
+    name, mtime, path, raw = item
+    try:
+        if raw is None:
+            with open(path, "rb") as f:
+                raw = f.read()
+        batch = batch_from_html(_decode(raw), parser=parser, restrict=restrict,
+                                produtos=produtos, fallback_today=False)
+        batch = batch.take(batch.has_uf())
+        missing = np.array([not d for d in batch.text["data"]], dtype=bool)
+        if missing.any():
+            fallback = _date_from_name(name)
+            if not fallback:
+                raise RuntimeError("data não encontrada no HTML nem no nome do arquivo")
+            batch.text["data"][missing] = fallback
+        return name, mtime, batch, None
+    except Exception as e:  # falha por arquivo não derruba o backfill
+        return name, mtime, None, f"{type(e).__name__}: {e}"
+
+
+def parse_snapshots(source: str, workers: Optional[int] = None, parser: str = "html.parser",
+                    restrict: bool = False, produtos: Optional[List[str]] = None):
+    # Parse em paralelo com janela limitada de tarefas em voo (tar grande não vai todo p/ memória).
+    # Dedup por (data detectada, produto): vence o snapshot mais recente (mtime).
+    best: Dict[Tuple[str, str], Tuple[float, str, PriceBatch]] = {}
+    failures: List[Tuple[str, str]] = []
+    total = 0
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        items = iter_snapshots(source)
+
+        def drain(done):
+            for fut in done:
+                name, mtime, batch, err = fut.result()
+                if err:
+                    failures.append((name, err))
+                    continue
+                keys = list(zip(batch.text["data"].tolist(), batch.text["produto"].tolist()))
+                for key in set(keys):
+                    if key not in best or mtime > best[key][0]:
+                        mask = np.fromiter((k == key for k in keys), dtype=bool, count=len(keys))
+                        best[key] = (mtime, name, batch.take(mask))
+
+        for item in items:
+            total += 1
+            pending.add(pool.submit(_parse_snapshot, item, parser, restrict, produtos))
+            if len(pending) >= workers * 4:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                drain(done)
+        drain(wait(pending)[0])
+
+    return PriceBatch.concat([best[key][2] for key in sorted(best)]), total, failures
+
+
+def run_backfill(source: str, sink: Optional[Sink], workers: Optional[int] = None,
+                 batch_size: int = 50000, parser: str = "html.parser", restrict: bool = False,
+                 produtos: Optional[List[str]] = None) -> int:
+    t0 = datetime.now()
+    with METRICS.timer("parse_snapshots", workers=workers):
+        batch, total, failures = parse_snapshots(source, workers, parser, restrict, produtos)
+    METRICS.count("snapshots", total)
+    METRICS.count("snapshot_failures", len(failures))
+    METRICS.count("rows_parsed", len(batch))
+    secs = (datetime.now() - t0).total_seconds()
+    dates = sorted(set(batch.text["data"].tolist()))
+    print(f"Backfill: {total} snapshots lidos em {secs:.1f}s, {len(failures)} falhas, "
+          f"{len(batch)} linhas em {len(dates)} datas"
+          + (f" ({dates[0]} a {dates[-1]})." if dates else "."))
+    for name, err in failures:
+        print(f"  FALHA {name}: {err}", file=sys.stderr)
+
+    if sink is None:
+        print("Dry-run: nada gravado.")
+    elif len(batch):
+        with METRICS.timer("load", sink=sink.name, strategy=sink.strategy):
+            sink.load(batch, batch_size=batch_size)
+        METRICS.count("rows_loaded", len(batch))
+    return 1 if failures and not len(batch) else 0
@@ -0,0 +1,181 @@
+import os
+import re
+import csv
+import hashlib
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+TEXT_COLS = ("data", "produto", "uf", "praca")
+NUM_COLS = ("compra_R$/sc", "var_dia_%", "var_sem_%", "var_mes_%")
+COLUMNS = TEXT_COLS + NUM_COLS
+
+# Escala fixa = decimal(10,2)/decimal(6,2) do SQL Server: valores guardados em centésimos (int64)
+SCALE = 2
+_UF_RE = re.compile(r"[A-Z]{2}")
+
+
+def br_to_cents(values: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    # Versão vetorizada de br_to_float: "1.234,56" -> 123456, "-1,4%" -> -140.
+    # Devolve (centésimos int64, máscara de válidos). Mais de 2 casas arredonda "half away
+    # from zero", como o SQL Server faz ao converter para decimal(p,2). Sem float no caminho.
+    a = np.asarray(values, dtype=str)
+    if a.size == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool)
+    a = np.char.strip(np.char.replace(a, "\xa0", " "))
+    a = np.char.replace(a, "−", "-")
+    a = np.char.replace(np.char.replace(a, ".", ""), ",", ".")
+    a = np.char.strip(np.char.replace(a, "%", ""))
+
+    neg = np.char.startswith(a, "-")
+    body = np.char.lstrip(a, "+-")
+    one_sign = (np.char.str_len(a) - np.char.str_len(body)) <= 1
+    parts = np.char.partition(body, ".")
+    ip, fp = parts[..., 0], parts[..., 2]
+    ip_len, fp_len = np.char.str_len(ip), np.char.str_len(fp)
+    valid = (
+        one_sign
+        & ((ip_len > 0) | (fp_len > 0))
+        & ((ip_len == 0) | np.char.isdecimal(ip))
+        & ((fp_len == 0) | np.char.isdecimal(fp))
+        & (ip_len <= 15)
+    )
+
+    ip = np.where(valid & (ip_len > 0), ip, "0").astype(np.int64)
+    # 3 primeiras casas decimais (a 3a só decide o arredondamento)
+    f3 = np.char.ljust(np.where(valid, fp, ""), SCALE + 1, "0").astype(f"<U{SCALE + 1}").astype(np.int64)
+    mag = ip * 100 + f3 // 10 + (f3 % 10 >= 5)
+    cents = np.where(neg, -mag, mag)
+    return np.where(valid, cents, 0).astype(np.int64), valid
+
+
+def cents_to_str(cents: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    # 14000 -> "140.0", 6825 -> "68.25", -140 -> "-1.4" (mesmo texto que o float gerava no CSV)
+    absv = np.abs(cents)
+    ip = (absv // 100).astype(str)
+    fp = np.char.rstrip(np.char.zfill((absv % 100).astype(str), 2), "0")
+    fp = np.where(np.char.str_len(fp) == 0, "0", fp)
+    txt = np.char.add(np.char.add(np.where(cents < 0, "-", ""), ip), np.char.add(".", fp))
+    return np.where(valid, txt, "")
+
+
+# Lote colunar: colunas de texto como arrays object, numéricas como centésimos int64 + máscara.
+class PriceBatch:
+
+    def __init__(self, text: Dict[str, np.ndarray], cents: Dict[str, np.ndarray], valid: Dict[str, np.ndarray]):
+        self.text = text
+        self.cents = cents
+        self.valid = valid
+
+    def __len__(self) -> int:
+        return len(self.text["praca"])
+
+    @classmethod
+    def empty(cls) -> "PriceBatch":
+        return cls({c: np.empty(0, dtype=object) for c in TEXT_COLS},
+                   {c: np.zeros(0, dtype=np.int64) for c in NUM_COLS},
+                   {c: np.zeros(0, dtype=bool) for c in NUM_COLS})
+
+    @classmethod
+    def from_raw(cls, date_iso: Optional[str], produto: str, uf_cells: List[str], pracas: List[str],
+                 numeric: Dict[str, List[str]]) -> "PriceBatch":
+        # Recebe as células cruas já escolhidas da grade (uma por linha de dados) e aplica,
+        # de uma vez, o que antes era feito célula a célula: UF herdada, conversão BR e filtros.
+        n = len(pracas)
+        if n == 0:
+            return cls.empty()
+        # UF: a célula vale se for 2 letras maiúsculas; senão herda a última válida
+        is_uf = np.fromiter((bool(_UF_RE.fullmatch((c or "").strip())) for c in uf_cells), dtype=bool, count=n)
+        uf_vals = np.array([(c or "").strip() for c in uf_cells], dtype=object)
+        last = np.maximum.accumulate(np.where(is_uf, np.arange(n), -1))
+        uf = np.where(last >= 0, uf_vals[np.maximum(last, 0)], None)
+
+        cents, valid = {}, {}
+        for col in NUM_COLS:
+            cents[col], valid[col] = br_to_cents(numeric[col])
+
+        praca = np.array(pracas, dtype=object)
+        low = np.char.lower(np.asarray(pracas, dtype=str))
+        keep = (np.char.str_len(low) > 0) & valid["compra_R$/sc"] & (low != "praça") & (low != "praca")
+
+        text = {
+            "data": np.full(n, date_iso, dtype=object),
+            "produto": np.full(n, produto, dtype=object),
+            "uf": uf,
+            "praca": praca,
+        }
+        return cls(text, cents, valid).take(keep)
+
+    @classmethod
+    def concat(cls, batches: Sequence["PriceBatch"]) -> "PriceBatch":
+        batches = [b for b in batches if len(b)]
+        if not batches:
+            return cls.empty()
+        if len(batches) == 1:
+            return batches[0]
+        return cls({c: np.concatenate([b.text[c] for b in batches]) for c in TEXT_COLS},
+                   {c: np.concatenate([b.cents[c] for b in batches]) for c in NUM_COLS},
+                   {c: np.concatenate([b.valid[c] for b in batches]) for c in NUM_COLS})
+
+    def take(self, idx) -> "PriceBatch":
+        return PriceBatch({c: v[idx] for c, v in self.text.items()},
+                          {c: v[idx] for c, v in self.cents.items()},
+                          {c: v[idx] for c, v in self.valid.items()})
+
+    def has_uf(self) -> np.ndarray:
+        return np.array([u is not None for u in self.text["uf"]], dtype=bool)
+
+    def first_date(self) -> Optional[str]:
+        return next((d for d in self.text["data"] if d), None)
+
+    def keys(self) -> List[str]:
+        # chave da PK (data|produto|uf|praca), como texto
+        return ["|".join(k) for k in zip(*(self.text[c].tolist() for c in TEXT_COLS))]
+
+    def fingerprints(self) -> List[str]:
+        # hash curto dos 4 valores de cada linha (centésimos; nulo = mínimo do int64)
+        vals = np.stack([np.where(self.valid[c], self.cents[c], np.iinfo(np.int64).min) for c in NUM_COLS],
+                        axis=1).astype("<i8")
+        return [hashlib.blake2b(row.tobytes(), digest_size=8).hexdigest() for row in vals]
+
+    def decimals(self, col: str) -> List[Optional[Decimal]]:
+        return [Decimal(int(c)).scaleb(-SCALE) if ok else None
+                for c, ok in zip(self.cents[col].tolist(), self.valid[col].tolist())]
+
+    def to_records(self) -> List[Dict]:
+        # compatibilidade com o formato antigo (lista de dicts, float/NaN)
+        cols = {c: self.text[c].tolist() for c in TEXT_COLS}
+        for c in NUM_COLS:
+            cols[c] = [v / 100 if ok else float("nan")
+                       for v, ok in zip(self.cents[c].tolist(), self.valid[c].tolist())]
+        return [dict(zip(COLUMNS, vals)) for vals in zip(*(cols[c] for c in COLUMNS))]
+
+    def to_json(self) -> Dict:
+        # colunas como listas (centésimos inteiros: sem perda), para guardar o lote em disco
+        return {"text": {c: self.text[c].tolist() for c in TEXT_COLS},
+                "cents": {c: self.cents[c].tolist() for c in NUM_COLS},
+                "valid": {c: self.valid[c].tolist() for c in NUM_COLS}}
+
+    @classmethod
+    def from_json(cls, d: Dict) -> "PriceBatch":
+        return cls({c: np.array(d["text"][c], dtype=object) for c in TEXT_COLS},
+                   {c: np.array(d["cents"][c], dtype=np.int64) for c in NUM_COLS},
+                   {c: np.array(d["valid"][c], dtype=bool) for c in NUM_COLS})
+
+    def sql_params(self) -> List[Tuple]:
+        # (data, produto, uf, praca, compra, var_dia, var_sem, var_mes) com Decimal exato
+        return list(zip(*(self.text[c].tolist() for c in TEXT_COLS), *(self.decimals(c) for c in NUM_COLS)))
+
+    def csv_rows(self) -> List[Tuple[str, ...]]:
+        # mesmo formato que o pandas gerava: vazio para nulo, ponto decimal
+        cols = [["" if v is None else v for v in self.text[c].tolist()] for c in TEXT_COLS]
+        cols += [cents_to_str(self.cents[c], self.valid[c]).tolist() for c in NUM_COLS]
+        return list(zip(*cols))
+
+    def write_csv(self, path: str) -> None:
+        # quebra de linha do SO, como o pandas
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            w = csv.writer(f, lineterminator=os.linesep)
+            w.writerow(COLUMNS)
+            w.writerows(self.csv_rows())
@@ -0,0 +1,325 @@
+import os
+import re
+import sys
+import json
+import hashlib
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+
+# Mesmos elementos que find_soja_table usa como âncora do título
+_HEADING_RE = re.compile(r"<(h2|h3|h4|strong|p)\b[^>]*>(.*?)</\1\s*>", re.IGNORECASE | re.DOTALL)
+_TABLE_RE = re.compile(r"<table\b.*?</table\s*>", re.IGNORECASE | re.DOTALL)
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+
+# Recorta do HTML bruto o trecho do 1o título de commodity → fim da última tabela
+# de commodity (todas as tabelas que o extrator lê), sem montar DOM
+def price_fragment(html: str) -> str:
+    # agrural_core importa este módulo: a lista de commodities vem de lá na hora do uso
+    from agrural_core import COMMODITIES
+    start = end = None
+    for h in _HEADING_RE.finditer(html):
+        text = _TAG_RE.sub(" ", h.group(2)).lower()
+        if any(c in text for c in COMMODITIES):
+            t = _TABLE_RE.search(html, h.end())
+            if t:
+                start = h.start() if start is None else start
+                end = t.end() if end is None else max(end, t.end())
+    if start is None:
+        # sem âncora reconhecível: compara a página inteira (conservador)
+        return html
+    return html[start:end]
+
+
+def fragment_hash(html: str) -> str:
+    return hashlib.sha256(price_fragment(html).encode("utf-8")).hexdigest()
+
+
+def response_cache_name(prefix: str, destinos: Iterable[str], produtos: Optional[Iterable[str]] = None) -> str:
+    # Um arquivo de cache por combinação de destinos e commodities: uma execução só com csv
+    # (ou só soja) que já viu a página não pode fazer a carga padrão (db) pular o dia.
+    from agrural_core import COMMODITIES
+    scope = "+".join(sorted(set(destinos))) + "_" + "+".join(sorted(set(produtos or COMMODITIES)))
+    return f"{prefix}_{scope}.json"
+
+
+# Cache em disco de validadores HTTP (ETag/Last-Modified) + hash do fragmento da tabela.
+# O estado novo só é gravado em commit(), depois que a execução terminou com sucesso;
+# assim uma carga que falhou no meio não é pulada na próxima rodada.
+class ResponseCache:
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, name: str = "agrural_http.json"):
+        self.path = os.path.join(cache_dir, name)
+        self._entries: Dict[str, Dict] = {}
+        self._pending: Dict[str, Dict] = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        e = self._entries.get(url) or {}
+        h = {}
+        if e.get("etag"):
+            h["If-None-Match"] = e["etag"]
+        if e.get("last_modified"):
+            h["If-Modified-Since"] = e["last_modified"]
+        return h
+
+    def is_unchanged(self, url: str, digest: str) -> bool:
+        e = self._entries.get(url)
+        return bool(e) and e.get("fragment_hash") == digest
+
+    def stage(self, url: str, etag: Optional[str], last_modified: Optional[str], digest: str) -> None:
+        self._pending[url] = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "fragment_hash": digest,
+            "saved_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
+
+    def commit(self) -> None:
+        if not self._pending:
+            return
+        self._entries.update(self._pending)
+        self._pending = {}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+
+# Fingerprint por linha do último snapshot carregado (chave da PK -> hash dos valores).
+# Só é confiável se o "snapshot" (hash do conjunto) for o mesmo gravado na marca d'água
+# do banco; qualquer outra carga no meio (backfill, outra máquina, restore) invalida.
+class RowFingerprints:
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, name: str = "agrural_rows.json"):
+        self.path = os.path.join(cache_dir, name)
+        self._pending: Optional[Dict] = None
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        self.snapshot: Optional[str] = state.get("snapshot")
+        self._rows: Dict[str, str] = state.get("rows") or {}
+
+    def diff(self, keys: List[str], hashes: List[str], trusted: bool) -> Tuple[List[int], int, int, int]:
+        # (índices a enviar, inseridas, alteradas, sem mudança); sem referência confiável
+        # tudo vai para o banco e conta como inserida
+        if not trusted:
+            return list(range(len(keys))), len(keys), 0, 0
+        send, inserted, updated = [], 0, 0
+        for i, (k, h) in enumerate(zip(keys, hashes)):
+            old = self._rows.get(k)
+            if old == h:
+                continue
+            send.append(i)
+            if old is None:
+                inserted += 1
+            else:
+                updated += 1
+        return send, inserted, updated, len(keys) - len(send)
+
+    def stage(self, keys: List[str], hashes: List[str]) -> str:
+        rows = dict(zip(keys, hashes))
+        digest = hashlib.sha256("\n".join(f"{k}={rows[k]}" for k in sorted(rows)).encode("utf-8")).hexdigest()[:32]
+        self._pending = {"snapshot": digest, "rows": rows,
+                         "saved_at": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+        return digest
+
+    def commit(self) -> None:
+        if self._pending is None:
+            return
+        state, self._pending = self._pending, None
+        self.snapshot, self._rows = state["snapshot"], state["rows"]
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+
+# Lotes que um destino (CSV, Parquet, banco) não conseguiu gravar. A página já foi baixada e
+# o cache de resposta avança; o lote fica aqui e é entregue só àquele destino na próxima
+# execução, antes do lote novo, sem baixar a página de novo nem regravar os outros destinos.
+class PendingBatches:
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, prefix: str = "pendente"):
+        self.cache_dir = cache_dir
+        self.prefix = prefix
+
+    def _path(self, destino: str) -> str:
+        return os.path.join(self.cache_dir, f"{self.prefix}_{destino}.json")
+
+    def load(self, destino: str) -> List:
+        # sem pendentes (o caso comum) não carrega agrural_batch/numpy: a execução "sem
+        # mudança" pelo cache continua só com o requests
+        path = self._path(destino)
+        if not os.path.exists(path):
+            return []
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)["batches"]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self._set_aside(path, e)
+            return []
+        from agrural_batch import PriceBatch
+        try:
+            return [PriceBatch.from_json(b) for b in data]
+        except (ValueError, KeyError, TypeError) as e:
+            self._set_aside(path, e)
+            return []
+
+    def _set_aside(self, path: str, err: Exception) -> None:
+        # arquivo ilegível não vira "sem pendentes" em silêncio: a próxima entrega o
+        # sobrescreveria (ou apagaria) e os lotes não entregues sumiriam sem rastro
+        bad = f"{path}.{datetime.now().strftime('%Y%m%dT%H%M%S%f')}.corrompido"
+        try:
+            os.replace(path, bad)
+        except OSError as e:
+            print(f"ATENCAO: lotes pendentes ilegíveis em {path} ({type(err).__name__}: {err}); "
+                  f"não foi possível movê-lo ({e}).", file=sys.stderr)
+            return
+        print(f"ATENCAO: lotes pendentes ilegíveis em {path} ({type(err).__name__}: {err}); "
+              f"arquivo movido para {bad}.", file=sys.stderr)
+
+    def save(self, destino: str, batches: List) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(destino)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"saved_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                       "batches": [b.to_json() for b in batches]}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def clear(self, destino: str) -> None:
+        try:
+            os.remove(self._path(destino))
+        except FileNotFoundError:
+            pass
+
+
+# Localizador aprendido das tabelas: depois de uma extração bem-sucedida guarda, por produto,
+# o caminho estrutural (tag, posição entre irmãos de mesma tag) da tabela, do título que a
+# ancora e do elemento com a data, mais um fingerprint do cabeçalho. Nas execuções seguintes
+# find() vai direto a esses nós e só confirma; qualquer divergência devolve None e o chamador
+# volta às heurísticas (find_commodity_tables / parse_date_near), reaprendendo em seguida.
+# O caminho depende do backend de parse, por isso a chave inclui parser e SoupStrainer.
+_DATE_RE = re.compile(r"\d{2}-[A-Za-z]{3}-\d{2,4}")
+HEADING_TAGS = ["h2", "h3", "h4", "strong", "p"]
+
+
+def _node_path(el) -> List[List]:
+    path = []
+    while el.parent is not None:
+        path.append([el.name, len(el.find_previous_siblings(el.name))])
+        el = el.parent
+    return path[::-1]
+
+
+def _resolve(soup, path: Optional[List[List]]):
+    node = soup
+    for name, i in path or []:
+        kids = node.find_all(name, recursive=False, limit=i + 1)
+        if len(kids) <= i:
+            return None
+        node = kids[i]
+    return node if path else None
+
+
+def header_fingerprint(table) -> str:
+    tr = table.find("tr")
+    cells = tr.find_all(["td", "th"]) if tr is not None else []
+    key = "|".join(c.get_text(" ", strip=True).lower() for c in cells)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+class TableLocator:
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, name: str = "agrural_locator.json"):
+        self.path = os.path.join(cache_dir, name)
+        self._pending: Dict[str, List[Dict]] = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._entries: Dict[str, List[Dict]] = json.load(f)
+        except (OSError, ValueError):
+            self._entries = {}
+        self.last_miss: Optional[str] = None
+
+    def find(self, soup, key: str) -> Optional[Dict[str, Tuple[object, Optional[str]]]]:
+        # produto -> (tabela, texto do elemento da data ou None); None = localizador não serve
+        entries = self._entries.get(key)
+        if not entries:
+            self.last_miss = "nada aprendido ainda"
+            return None
+        found, seen = {}, set()
+        for e in entries:
+            table = _resolve(soup, e["table"])
+            if table is None or table.name != "table" or id(table) in seen:
+                self.last_miss = f"tabela de {e['produto']} não está no caminho aprendido"
+                return None
+            if header_fingerprint(table) != e["header"]:
+                self.last_miss = f"cabeçalho da tabela de {e['produto']} mudou"
+                return None
+            heading = _resolve(soup, e["heading"])
+            if (heading is None or e["produto"] not in heading.get_text(" ", strip=True).lower()
+                    or heading.find_next("table") is not table):
+                self.last_miss = f"título de {e['produto']} mudou"
+                return None
+            date_el = _resolve(soup, e.get("date"))
+            found[e["produto"]] = (table, date_el.get_text(" ") if date_el is not None else None)
+            seen.add(id(table))
+        self.last_miss = None
+        return found
+
+    def locate(self, soup, key: str, heuristic) -> Tuple[Dict[str, object], Dict[str, Optional[str]], bool]:
+        # (tabelas, texto da data por produto, acertou?); na falha usa heuristic(soup) e reaprende
+        found = self.find(soup, key)
+        if found is not None:
+            return {p: t for p, (t, _) in found.items()}, {p: d for p, (_, d) in found.items()}, True
+        tables = heuristic(soup)
+        if "soja" in tables:
+            self.learn(key, tables)
+        return tables, {}, False
+
+    def learn(self, key: str, tables: Dict[str, object]) -> None:
+        # tables: saída de find_commodity_tables (mesma ordem)
+        entries = []
+        for produto, table in tables.items():
+            heading = table.find_previous(
+                lambda t: t.name in HEADING_TAGS and produto in t.get_text(" ", strip=True).lower())
+            if heading is None:  # achada pelo texto da tabela (sem título): não dá para confirmar
+                return
+            date_path = None
+            node = table
+            for _ in range(8):
+                node = node.find_previous(string=True)
+                if not node:
+                    break
+                if _DATE_RE.search(str(node)):
+                    # texto solto num ancestral da tabela: get_text pegaria a página toda
+                    if not any(p is node.parent for p in table.parents):
+                        date_path = _node_path(node.parent)
+                    break
+            entries.append({"produto": produto, "table": _node_path(table), "heading": _node_path(heading),
+                            "date": date_path, "header": header_fingerprint(table)})
+        if entries != self._entries.get(key):
+            self._pending[key] = entries
+
+    def commit(self) -> None:
+        if not self._pending:
+            return
+        self._entries.update(self._pending)
+        self._pending = {}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
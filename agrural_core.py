@@ -0,0 +1,387 @@
+from __future__ import annotations
+
+import re
+from datetime import datetime, date as _date
+from typing import TYPE_CHECKING, List, Dict, Optional
+
+from agrural_cache import ResponseCache, TableLocator, fragment_hash
+from agrural_parsers import make_soup
+from agrural_metrics import METRICS
+from agrural_http import get as http_get, iter_body
+from agrural_grid import expand_grid
+
+# Extração da página da AgRural (download, tabelas, rowspan, grade -> PriceBatch), uma vez
+# só para os dois scripts e para agrural_sources/agrural_backfill. O que cada script faz com
+# o lote (CSV, Parquet, banco) fica em agrural_fanout.
+
+# requests, bs4 e numpy são importados só no caminho que os usa (ver --profile-startup)
+if TYPE_CHECKING:
+    import requests
+    from bs4 import BeautifulSoup
+    from agrural_batch import PriceBatch
+
+URL = "https://agrural.com.br/precossojaemilho/"
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+    ),
+    "Accept-Language": "pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7",
+}
+
+# única lista de commodities: agrural_cache (hash do trecho) e agrural_stream importam daqui
+COMMODITIES = ("soja", "milho")
+
+# ----------- util -----------
+def normalize(s: str) -> str:
+    return (s or "").strip().replace("\xa0", " ")
+
+def br_to_float(text: str) -> float:
+    if text is None:
+        return float("nan")
+    t = text.strip().replace("\xa0", " ").replace("−", "-").replace("\u2212", "-")
+    t = t.replace(".", "").replace(",", ".").replace("%", "").strip()
+    if t in {"", "-", "—"}:
+        return float("nan")
+    try:
+        return float(t)
+    except ValueError:
+        return float("nan")
+
+def read_html_file(path: str) -> str:
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+# ----------- tabelas -----------
+def find_soja_table(soup: BeautifulSoup) -> Optional[BeautifulSoup]:
+    for h in soup.find_all(["h2", "h3", "h4", "strong", "p"]):
+        if "soja" in h.get_text(" ", strip=True).lower():
+            t = h.find_next("table")
+            if t:
+                return t
+    for t in soup.find_all("table"):
+        txt = t.get_text(" ", strip=True).lower()
+        if all(x in txt for x in ["estado", "praça", "compra"]):
+            return t
+    return None
+
+def find_commodity_tables(soup: BeautifulSoup) -> Dict[str, BeautifulSoup]:
+    # Uma passada pelos títulos: cada commodity fica com a 1a tabela após o seu título
+    found, taken = {}, set()
+    for h in soup.find_all(["h2", "h3", "h4", "strong", "p"]):
+        txt = h.get_text(" ", strip=True).lower()
+        for prod in COMMODITIES:
+            if prod in found or prod not in txt:
+                continue
+            t = h.find_next("table")
+            if t and id(t) not in taken:
+                found[prod] = t
+                taken.add(id(t))
+        if len(found) == len(COMMODITIES):
+            break
+    if "soja" not in found:
+        t = find_soja_table(soup)
+        if t is not None and id(t) not in taken:
+            found["soja"] = t
+    return found
+
+def parse_date_near(table: BeautifulSoup) -> Optional[str]:
+    prev = []
+    node = table
+    for _ in range(8):
+        node = node.find_previous(string=True)
+        if not node:
+            break
+        prev.append(str(node))
+    return date_from_text(" ".join(prev))
+
+def date_from_text(blob: str) -> Optional[str]:
+    # 1a data dd-Mmm-aa no texto que antecede a tabela (da string mais próxima para a mais longe)
+    m = re.search(r"(\d{2}-[A-Za-z]{3}-\d{2,4})", blob)
+    if not m:
+        return None
+    raw = m.group(1)
+    for fmt in ("%d-%b-%y", "%d-%b-%Y"):
+        try:
+            return datetime.strptime(raw, fmt).date().isoformat()
+        except ValueError:
+            pass
+    pt2en = {
+        "jan": "Jan", "fev": "Feb", "mar": "Mar", "abr": "Apr", "mai": "May", "jun": "Jun",
+        "jul": "Jul", "ago": "Aug", "set": "Sep", "out": "Oct", "nov": "Nov", "dez": "Dec",
+    }
+    m2 = re.search(r"(\d{2})-([A-Za-z]{3})-(\d{2,4})", raw, flags=re.IGNORECASE)
+    if m2:
+        d, mon, y = m2.groups()
+        mon = pt2en.get(mon.lower(), mon.title())
+        for fmt in ("%d-%b-%y", "%d-%b-%Y"):
+            try:
+                return datetime.strptime(f"{d}-{mon}-{y}", fmt).date().isoformat()
+            except ValueError:
+                pass
+    return None
+
+def expand_html_table(table: BeautifulSoup) -> List[List[str]]:
+    body = table.find("tbody") or table
+    return expand_rows([[(c.get_text(" ", strip=True), c.get("rowspan"), c.get("colspan"))
+                         for c in tr.find_all(["td", "th"])]
+                        for tr in body.find_all("tr")])
+
+def expand_rows(rows_raw: List[List[tuple]]) -> List[List[str]]:
+    # linhas de (texto, rowspan[, colspan]) -> grade com os valores das células mescladas repetidos
+    return expand_grid(rows_raw, normalize)
+
+# ----------- download -----------
+def fetch_html(cache: Optional[ResponseCache] = None, session: Optional[requests.Session] = None) -> Optional[str]:
+    # None => página não mudou desde a última execução bem-sucedida (304 ou mesmo hash)
+    headers = dict(HEADERS)
+    if cache is not None:
+        headers.update(cache.conditional_headers(URL))
+    with METRICS.timer("fetch"):
+        resp = http_get(URL, session, headers=headers)
+    METRICS.count("http_requests")
+    METRICS.set("http_status", resp.status_code)
+    if resp.status_code == 304:
+        METRICS.count("cache_hits")
+        return None
+    html = resp.text
+    METRICS.count("http_bytes", len(resp.content))
+    if cache is not None:
+        digest = fragment_hash(html)
+        cache.stage(URL, resp.headers.get("ETag"), resp.headers.get("Last-Modified"), digest)
+        if cache.is_unchanged(URL, digest):
+            METRICS.count("cache_hits")
+            return None
+    return html
+
+def fetch_batch(cache: Optional[ResponseCache] = None, parser: str = "html.parser",
+                restrict: bool = False, produtos: Optional[List[str]] = None,
+                session: Optional[requests.Session] = None, stream: bool = False,
+                locator: Optional[TableLocator] = None, fallback_today: bool = True) -> Optional[PriceBatch]:
+    if stream:
+        return fetch_batch_stream(cache, produtos, session, fallback_today)
+    html = fetch_html(cache, session)
+    if html is None:
+        return None
+    return batch_from_html(html, parser=parser, restrict=restrict, produtos=produtos,
+                           fallback_today=fallback_today, locator=locator)
+
+def fetch_batch_stream(cache: Optional[ResponseCache] = None, produtos: Optional[List[str]] = None,
+                       session: Optional[requests.Session] = None,
+                       fallback_today: bool = True) -> Optional[PriceBatch]:
+    # --stream: lê o corpo em pedaços e fecha a conexão quando a última tabela pedida fecha,
+    # sem montar DOM. O hash do cache é calculado sobre o trecho lido.
+    from agrural_stream import CHUNK_SIZE, stream_tables
+    headers = dict(HEADERS)
+    if cache is not None:
+        headers.update(cache.conditional_headers(URL))
+    with METRICS.timer("fetch"):
+        resp = http_get(URL, session, headers=headers, stream=True)
+    try:
+        METRICS.count("http_requests")
+        METRICS.set("http_status", resp.status_code)
+        if resp.status_code == 304:
+            METRICS.count("cache_hits")
+            return None
+        with METRICS.timer("stream"):
+            res = stream_tables(iter_body(resp, CHUNK_SIZE), resp.encoding, produtos)
+    finally:
+        resp.close()
+    METRICS.count("http_bytes", res.bytes_read)
+    METRICS.set("stream_complete", res.complete)
+    if cache is not None:
+        digest = fragment_hash(res.text)
+        cache.stage(URL, resp.headers.get("ETag"), resp.headers.get("Last-Modified"), digest)
+        if cache.is_unchanged(URL, digest):
+            METRICS.count("cache_hits")
+            return None
+    return batch_from_stream(res, produtos, fallback_today)
+
+def extract(cache: Optional[ResponseCache] = None, parser: str = "html.parser", restrict: bool = False,
+            produtos: Optional[List[str]] = None, from_html: Optional[str] = None,
+            session: Optional[requests.Session] = None, stream: bool = False,
+            locator: Optional[TableLocator] = None, fallback_today: bool = True) -> Optional[PriceBatch]:
+    # Página (site ou arquivo salvo) -> lote pronto para os destinos, só com linhas que têm UF.
+    # None => página sem mudança pelo cache.
+    if from_html:
+        # replay offline de uma página salva (mesmo caminho de parse, sem rede)
+        html = read_html_file(from_html)
+        if stream:
+            from agrural_stream import iter_text, stream_tables
+            batch = batch_from_stream(stream_tables(iter_text(html), produtos=produtos), produtos, fallback_today)
+        else:
+            batch = batch_from_html(html, parser=parser, restrict=restrict, produtos=produtos,
+                                    fallback_today=fallback_today, locator=locator)
+    else:
+        batch = fetch_batch(cache, parser=parser, restrict=restrict, produtos=produtos, session=session,
+                            stream=stream, locator=locator, fallback_today=fallback_today)
+    if batch is None:
+        return None
+    if locator is not None:
+        locator.commit()  # extração deu certo: o caminho aprendido vale para a próxima
+    # UF é herdada dentro da tabela (rowspan); linha sem UF alguma não cabe na PK
+    has_uf = batch.has_uf()
+    METRICS.count("rows_skipped", int((~has_uf).sum()))
+    return batch.take(has_uf)
+
+# ----------- lote -----------
+def batch_from_stream(res, produtos: Optional[List[str]] = None, fallback_today: bool = True) -> PriceBatch:
+    # mesmo lote de batch_from_html, a partir do que agrural_stream.stream_tables capturou
+    from agrural_batch import PriceBatch
+    if res.tables is None:
+        print(f"Leitura em fluxo: {res.reason}; usando o DOM.")
+        METRICS.count("stream_fallbacks")
+        return batch_from_html(res.text, produtos=produtos, fallback_today=fallback_today)
+    METRICS.count("tables", len(res.tables))
+    if "soja" not in res.tables:
+        raise RuntimeError("Tabela de Soja não encontrada (layout pode ter mudado).")
+    batches = []
+    for produto, (blob, rows_raw) in res.tables.items():
+        if produtos and produto not in produtos:
+            continue
+        date_iso = _date_or_today(date_from_text(blob), fallback_today)
+        with METRICS.timer("expand", produto=produto):
+            grid = expand_rows(rows_raw)
+        with METRICS.timer("rows", produto=produto):
+            batches.append(batch_from_grid(grid, date_iso, produto))
+    return PriceBatch.concat(batches)
+
+def batch_from_html(html: str, parser: str = "html.parser", restrict: bool = False,
+                    produtos: Optional[List[str]] = None, fallback_today: bool = True,
+                    locator: Optional[TableLocator] = None) -> PriceBatch:
+    from agrural_batch import PriceBatch
+    with METRICS.timer("soup", parser=parser, restrict=restrict):
+        soup = make_soup(html, parser, restrict)
+    dates = {}
+    with METRICS.timer("find_tables"):
+        if locator is None:
+            tables = find_commodity_tables(soup)
+        else:
+            # caminho aprendido na última extração; heurísticas só se não bater
+            tables, dates, hit = locator.locate(soup, f"{parser}|{int(restrict)}", find_commodity_tables)
+            METRICS.count("locator_hits" if hit else "locator_misses")
+            if not hit:
+                print(f"Localizador de tabela: {locator.last_miss}; usando as heurísticas.")
+    METRICS.count("tables", len(tables))
+    if "soja" not in tables:
+        raise RuntimeError("Tabela de Soja não encontrada (layout pode ter mudado).")
+    wanted = {p: t for p, t in tables.items() if not produtos or p in produtos}
+    if restrict or parser == "selectolax":
+        # o parse restrito só guarda títulos e tabelas: a data num <span>/<div>/<em> some e
+        # viraria a data de hoje. Sem data perto de alguma tabela, refaz com o DOM completo.
+        missing = [p for p, t in wanted.items()
+                   if not ((dates.get(p) and date_from_text(dates[p])) or parse_date_near(t))]
+        if missing:
+            full = "html.parser" if parser == "selectolax" else parser
+            print(f"Parse restrito: data não encontrada perto de {', '.join(missing)}; usando o DOM completo ({full}).")
+            METRICS.count("restrict_fallbacks")
+            return batch_from_html(html, full, False, produtos, fallback_today, locator)
+    return PriceBatch.concat([
+        batch_from_table(table, produto, fallback_today, dates.get(produto))
+        for produto, table in wanted.items()
+    ])
+
+def rows_from_html(html: str, parser: str = "html.parser", restrict: bool = False,
+                   produtos: Optional[List[str]] = None) -> List[Dict]:
+    # formato antigo (lista de dicts), usado pela comparação de backends
+    return batch_from_html(html, parser, restrict, produtos).to_records()
+
+def batch_from_table(table: BeautifulSoup, produto: str = "soja", fallback_today: bool = True,
+                     date_text: Optional[str] = None) -> PriceBatch:
+    with METRICS.timer("parse_date", produto=produto):
+        # date_text: texto do elemento da data apontado pelo localizador
+        date_iso = (date_from_text(date_text) if date_text else None) or parse_date_near(table)
+    date_iso = _date_or_today(date_iso, fallback_today)
+    with METRICS.timer("expand", produto=produto):
+        grid = expand_html_table(table)
+    with METRICS.timer("rows", produto=produto):
+        return batch_from_grid(grid, date_iso, produto)
+
+def _date_or_today(date_iso: Optional[str], fallback_today: bool) -> Optional[str]:
+    # Fallback: se não achar a data no HTML, usa a data de hoje (YYYY-MM-DD).
+    # O backfill e o CSV desligam isso: snapshot antigo com data de hoje corromperia o histórico.
+    if date_iso:
+        return date_iso
+    if fallback_today:
+        METRICS.count("date_fallbacks")
+        return _date.today().isoformat()
+    METRICS.count("dates_missing")
+    return None
+
+# nomes (trechos do cabeçalho, em minúsculas) de cada coluna da grade; o 1o nome de
+# estado/praca/compra identifica a linha de cabeçalho. Outras fontes passam o seu mapa.
+GRID_COLUMNS = {
+    "estado": ("estado",),
+    "praca": ("praça", "praca"),
+    "compra": ("compra",),
+    "var_dia": ("variação hoje", "variacao hoje", "variação do dia", "var hoje"),
+    "var_sem": ("1 semana", "semana"),
+    "var_mes": ("1 mês", "1 mes", "mês", "mes"),
+}
+
+def batch_from_grid(grid: List[List[str]], date_iso: Optional[str], produto: str = "soja",
+                    columns: Optional[Dict[str, tuple]] = None) -> PriceBatch:
+    from agrural_batch import PriceBatch
+    if not grid:
+        return PriceBatch.empty()
+    columns = columns or GRID_COLUMNS
+
+    # header
+    hdr_i = None
+    marks = [columns[k][0] for k in ("estado", "praca", "compra")]
+    for i, row in enumerate(grid[:3]):
+        low = [c.lower() for c in row]
+        if all(m in " ".join(low) for m in marks):
+            hdr_i = i
+            break
+    header = grid[hdr_i] if hdr_i is not None else grid[0]
+    lower = [h.lower() for h in header]
+
+    def idx_of(*names):
+        for i, h in enumerate(lower):
+            if any(n in h for n in names):
+                return i
+        return None
+
+    i_estado = idx_of(*columns["estado"])
+    i_praca  = idx_of(*columns["praca"])
+    i_compra = idx_of(*columns["compra"])
+    i_var_d  = idx_of(*columns["var_dia"])
+    i_var_w  = idx_of(*columns["var_sem"])
+    i_var_m  = idx_of(*columns["var_mes"])
+
+    start = (hdr_i + 1) if hdr_i is not None else 1
+    data_rows = grid[start:]
+
+    # só escolhe as células cruas; UF herdada, conversão numérica e filtros são colunares
+    ufs, pracas, compras, var_ds, var_ws, var_ms = [], [], [], [], [], []
+    fixed = None not in (i_praca, i_compra, i_var_d, i_var_w, i_var_m)
+    for r in data_rows:
+        if "agrural" in " ".join([c.lower() for c in r]):
+            continue
+        uf_cell = r[i_estado] if (i_estado is not None and i_estado < len(r)) else (r[0] if r else "")
+
+        if not fixed:
+            if len(r) < 5:
+                ufs.append(uf_cell)
+                pracas.append("")
+                compras.append(""); var_ds.append(""); var_ws.append(""); var_ms.append("")
+                continue
+            praca, compra, var_d, var_w, var_m = r[-5:]
+        else:
+            praca = r[i_praca] if i_praca < len(r) else ""
+            compra = r[i_compra] if i_compra < len(r) else ""
+            var_d = r[i_var_d] if i_var_d < len(r) else ""
+            var_w = r[i_var_w] if i_var_w < len(r) else ""
+            var_m = r[i_var_m] if i_var_m < len(r) else ""
+
+        ufs.append(uf_cell)
+        pracas.append(praca)
+        compras.append(compra); var_ds.append(var_d); var_ws.append(var_w); var_ms.append(var_m)
+
+    batch = PriceBatch.from_raw(date_iso, produto, ufs, pracas, {
+        "compra_R$/sc": compras, "var_dia_%": var_ds, "var_sem_%": var_ws, "var_mes_%": var_ms,
+    })
+    METRICS.count("rows_parsed", len(batch))
+    METRICS.count("rows_skipped", len(pracas) - len(batch))
+    return batch
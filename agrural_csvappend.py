@@ -0,0 +1,357 @@
+from __future__ import annotations
+
+import io
+import os
+import csv
+import sys
+import json
+import hashlib
+import argparse
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+from agrural_praca import fold
+
+if TYPE_CHECKING:
+    from agrural_batch import PriceBatch
+
+# CSV só de acréscimo (scrape_agrural_soja.py --append). Cada chave data+produto+uf+praça
+# entra uma vez no CSV principal; o índice ao lado guarda, por chave, o hash dos valores e a
+# posição (byte) da linha, em um arquivo por mês (soja_agrural.idx/AAAA-MM.tsv). Uma execução
+# lê só os meses do lote (normalmente um), então o custo não cresce com o arquivo:
+#   chave nova            -> linha no fim do CSV
+#   valores iguais        -> nada
+#   valores diferentes    -> linha no log de atualizações (soja_agrural.atualizacoes.csv)
+# O log tem o mesmo formato do CSV (linha mais recente vale). Com COMPACT_AT linhas no log (ou
+# --compact) as atualizações são aplicadas no CSV: só o trecho a partir da 1a linha
+# atualizada é regravado (o começo é copiado byte a byte) e o log é zerado.
+#
+# meta.json guarda o tamanho confirmado do CSV e do log. Se o disco não bater (execução
+# interrompida no meio, arquivo editado à mão), o índice é reconstruído lendo o CSV e o log;
+# reaplicar o log é idempotente. Linhas sem data ficam de fora (não têm chave).
+
+COMPACT_AT = 2000
+
+Key = Tuple[str, str, str, str]
+# hash dos valores, posição no CSV, posição no log (None = sem atualização pendente)
+Entry = List
+
+
+def sidecar_paths(path: str) -> Tuple[str, str]:
+    # (log de atualizações, pasta do índice)
+    base = os.path.splitext(path)[0]
+    return base + ".atualizacoes.csv", base + ".idx"
+
+
+def _line(row) -> bytes:
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator=os.linesep).writerow(row)
+    return buf.getvalue().encode("utf-8")
+
+
+def _header() -> bytes:
+    from agrural_batch import COLUMNS
+    return _line(COLUMNS)
+
+
+def _parse(line: bytes) -> List[str]:
+    return next(csv.reader([line.decode("utf-8")]))
+
+
+def _key(row) -> Key:
+    return row[0], row[1], row[2], fold(row[3])
+
+
+def _fp(row) -> str:
+    # valores como texto do CSV (já canônico: centésimos -> "140.0")
+    return hashlib.blake2b("|".join(row[4:]).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _lines(path: str, start: int = 0) -> Iterator[Tuple[int, bytes]]:
+    # (posição, linha) a partir de start; a última linha sem quebra (gravação interrompida) fica de fora
+    with open(path, "rb") as f:
+        f.seek(start)
+        off = start
+        for line in f:
+            if not line.endswith(b"\n"):
+                return
+            yield off, line
+            off += len(line)
+
+
+def _size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class AppendCsv:
+
+    def __init__(self, path: str, compact_at: int = COMPACT_AT):
+        self.path = path
+        self.log_path, self.idx_dir = sidecar_paths(path)
+        self.meta_path = os.path.join(self.idx_dir, "meta.json")
+        self.compact_at = compact_at
+        self.meta: Dict = {}
+        self._months: Dict[str, Dict[Key, Entry]] = {}
+        self._open()
+
+    # ----------- estado em disco -----------
+    def _write_meta(self) -> None:
+        tmp = self.meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self.meta_path)
+
+    def _month_path(self, month: str) -> str:
+        return os.path.join(self.idx_dir, f"{month}.tsv")
+
+    def _month(self, month: str) -> Dict[Key, Entry]:
+        if month not in self._months:
+            entries: Dict[Key, Entry] = {}
+            try:
+                with open(self._month_path(month), "r", encoding="utf-8") as f:
+                    for line in f:
+                        d, p, uf, chave, fp, off, log_off = line.rstrip("\n").split("\t")
+                        entries[(d, p, uf, chave)] = [fp, int(off), int(log_off) if log_off else None]
+            except FileNotFoundError:
+                pass
+            self._months[month] = entries
+        return self._months[month]
+
+    @staticmethod
+    def _index_line(key: Key, e: Entry) -> str:
+        return "\t".join(key + (e[0], str(e[1]), "" if e[2] is None else str(e[2]))) + "\n"
+
+    def _write_month(self, month: str) -> None:
+        path = self._month_path(month)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.writelines(self._index_line(k, e) for k, e in self._months[month].items())
+        os.replace(path + ".tmp", path)
+
+    def _open(self) -> None:
+        os.makedirs(self.idx_dir, exist_ok=True)
+        header = _header()
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                first = f.readline()
+            if first != header:
+                # CSV de outro formato (ex.: sobrescrito por versões sem a coluna produto)
+                old = self.path + ".formato_antigo"
+                os.replace(self.path, old)
+                print(f"CSV com outro cabeçalho movido para {old}; começando um novo em {self.path}.",
+                      file=sys.stderr)
+        if not os.path.exists(self.path):
+            with open(self.path, "wb") as f:
+                f.write(header)
+            if os.path.exists(self.log_path):
+                os.remove(self.log_path)
+            self.rebuild(quiet=True)
+            return
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                self.meta = json.load(f)
+        except (OSError, ValueError):
+            self.meta = {}
+        if (self.meta.get("compactando") or self.meta.get("csv_size") != _size(self.path)
+                or self.meta.get("log_size") != _size(self.log_path)):
+            self.rebuild()
+
+    def rebuild(self, quiet: bool = False) -> int:
+        # índice a partir do CSV e do log (linha mais recente vale); corta linha incompleta no fim
+        months: Dict[str, Dict[Key, Entry]] = {}
+        sizes = {}
+        for which, path in (("csv", self.path), ("log", self.log_path)):
+            end = 0
+            if os.path.exists(path):
+                for off, line in _lines(path):
+                    end = off + len(line)
+                    if off == 0:
+                        continue  # cabeçalho
+                    row = _parse(line)
+                    if not row or not row[0]:
+                        continue
+                    key = _key(row)
+                    m = months.setdefault(key[0][:7], {})
+                    if which == "csv":
+                        m.setdefault(key, [_fp(row), off, None])
+                    elif key in m:
+                        m[key][0], m[key][2] = _fp(row), off
+                if _size(path) != end:
+                    with open(path, "r+b") as f:
+                        f.truncate(end)
+            sizes[which] = end
+        for name in os.listdir(self.idx_dir):
+            if name.endswith(".tsv"):
+                os.remove(os.path.join(self.idx_dir, name))
+        self._months = months
+        for month in months:
+            self._write_month(month)
+        log_rows = sum(e[2] is not None for m in months.values() for e in m.values())
+        self.meta = {"csv_size": sizes["csv"], "log_size": sizes["log"], "log_rows": log_rows}
+        self._write_meta()
+        n = sum(len(m) for m in months.values())
+        if not quiet:
+            print(f"Índice do CSV reconstruído: {n} chaves, {log_rows} atualizações no log.")
+        return n
+
+    # ----------- gravação -----------
+    def append(self, batch: PriceBatch) -> Dict[str, int]:
+        out = {"inserted": 0, "updated": 0, "unchanged": 0, "sem_data": 0}
+        main: List[bytes] = []
+        log: List[bytes] = []
+        off, log_off = self.meta["csv_size"], self.meta["log_size"]
+        if log_off == 0:
+            log.append(_header())
+            log_off = len(log[0])
+        new_lines: Dict[str, List[str]] = {}
+        seen = set()
+        for row in batch.csv_rows():
+            if not row[0]:
+                out["sem_data"] += 1
+                continue
+            key = _key(row)
+            if key in seen:  # outra grafia da mesma praça no lote: vale a 1a
+                continue
+            seen.add(key)
+            month = self._month(key[0][:7])
+            fp, e = _fp(row), month.get(key)
+            if e is not None and e[0] == fp:
+                out["unchanged"] += 1
+                continue
+            line = _line(row)
+            if e is None:
+                e = month[key] = [fp, off, None]
+                main.append(line)
+                off += len(line)
+                out["inserted"] += 1
+            else:
+                e[0], e[2] = fp, log_off
+                log.append(line)
+                log_off += len(line)
+                out["updated"] += 1
+            new_lines.setdefault(key[0][:7], []).append(self._index_line(key, e))
+
+        # dados primeiro, índice depois, meta.json por último (é o que confirma a gravação)
+        if main:
+            with open(self.path, "ab") as f:
+                f.writelines(main)
+        if out["updated"]:
+            with open(self.log_path, "ab") as f:
+                f.writelines(log)
+        for month, lines in new_lines.items():
+            with open(self._month_path(month), "a", encoding="utf-8") as f:
+                f.writelines(lines)
+        if new_lines:
+            self.meta.update(csv_size=off, log_size=log_off if out["updated"] else self.meta["log_size"],
+                             log_rows=self.meta["log_rows"] + out["updated"])
+            self._write_meta()
+        if self.meta["log_rows"] >= self.compact_at:
+            self.compact()
+        return out
+
+    def compact(self) -> int:
+        # aplica o log no CSV regravando só a partir da 1a linha atualizada
+        if not self.meta.get("log_rows"):
+            return 0
+        updates: Dict[Key, bytes] = {}
+        for off, line in _lines(self.log_path):
+            if off:
+                updates[_key(_parse(line))] = line
+        start = min(self._month(k[0][:7])[k][1] for k in updates)
+        tmp = self.path + ".tmp"
+        moved: List[Tuple[Key, int]] = []
+        with open(self.path, "rb") as src, open(tmp, "wb") as dst:
+            left = start
+            while left:
+                chunk = src.read(min(left, 1 << 20))
+                dst.write(chunk)
+                left -= len(chunk)
+            off = start
+            for _, line in _lines(self.path, start):
+                key = _key(_parse(line))
+                line = updates.get(key, line)
+                dst.write(line)
+                moved.append((key, off))
+                off += len(line)
+        # interrompida daqui até o meta.json final, a próxima abertura reconstrói o índice
+        self.meta["compactando"] = True
+        self._write_meta()
+        os.replace(tmp, self.path)
+        os.remove(self.log_path)
+        touched = set()
+        for key, pos in moved:
+            e = self._month(key[0][:7])[key]
+            e[1], e[2] = pos, None
+            touched.add(key[0][:7])
+        for month in touched:
+            self._write_month(month)  # reescrito sem as linhas substituídas
+        self.meta = {"csv_size": off, "log_size": 0, "log_rows": 0}
+        self._write_meta()
+        print(f"CSV compactado: {len(updates)} atualizações aplicadas, {len(moved)} linhas regravadas "
+              f"(de {start} bytes em diante).")
+        return len(updates)
+
+    # ----------- leitura -----------
+    def lookup(self, data: str, produto: str, uf: str, praca: str) -> Optional[List[str]]:
+        # linha atual de uma chave, direto pela posição (log se houver atualização)
+        e = self._month(data[:7]).get((data, produto, uf, fold(praca)))
+        if e is None:
+            return None
+        path, off = (self.log_path, e[2]) if e[2] is not None else (self.path, e[1])
+        with open(path, "rb") as f:
+            f.seek(off)
+            return _parse(f.readline())
+
+    def rows(self) -> List[List[str]]:
+        # visão atual do arquivo inteiro: CSV com as atualizações do log aplicadas
+        cur: Dict[Key, List[str]] = {}
+        for path in (self.path, self.log_path):
+            if os.path.exists(path):
+                for off, line in _lines(path):
+                    if off:
+                        row = _parse(line)
+                        cur[_key(row)] = row
+        return list(cur.values())
+
+    def check(self) -> List[str]:
+        # confere o índice em disco contra uma leitura completa dos arquivos
+        problems = []
+        on_disk = {m: dict(self._month(m)) for m in
+                   (n[:-4] for n in os.listdir(self.idx_dir) if n.endswith(".tsv"))}
+        for row in self.rows():
+            key = _key(row)
+            e = on_disk.get(key[0][:7], {}).pop(key, None)
+            if e is None:
+                problems.append(f"fora do índice: {key}")
+            elif e[0] != _fp(row) or self.lookup(*row[:4]) != row:
+                problems.append(f"índice divergente: {key}")
+        problems += [f"chave só no índice: {k}" for m in on_disk.values() for k in m]
+        return problems
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Manutenção do CSV em modo acréscimo (--append do scrape).")
+    p.add_argument("csv", nargs="?", default="soja_agrural.csv")
+    p.add_argument("--compact", action="store_true", help="Aplica o log de atualizações no CSV agora.")
+    p.add_argument("--rebuild", action="store_true", help="Reconstrói o índice lendo o CSV e o log.")
+    p.add_argument("--check", action="store_true", help="Confere o índice contra uma leitura completa.")
+    args = p.parse_args()
+
+    store = AppendCsv(args.csv)
+    if args.rebuild:
+        store.rebuild()
+    if args.compact:
+        store.compact()
+    if args.check:
+        problems = store.check()
+        for msg in problems[:20]:
+            print(msg)
+        print(f"{len(problems)} problemas no índice." if problems else "Índice confere com o CSV.")
+        return 1 if problems else 0
+    print(f"{args.csv}: {store.meta['csv_size']} bytes, {store.meta['log_rows']} atualizações no log.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
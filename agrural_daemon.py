@@ -0,0 +1,123 @@
+import os
+import json
+import random
+import signal
+import threading
+import traceback
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+# Modo residente: o processo fica de pé, agenda as próprias coletas e reaproveita a sessão
+# HTTP e a conexão do banco entre ciclos (o custo de subir Python + imports + login ODBC
+# é pago uma vez só). O estado vai para um JSON lido por quem monitora o processo.
+
+
+def _now() -> datetime:
+    return datetime.now().replace(microsecond=0)
+
+
+def _load_status(path: str) -> Dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_status(path: str, status: Dict) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(status, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def _next_run(now: datetime, interval_min: float, jitter_min: float) -> datetime:
+    delay = max(1.0, interval_min + random.uniform(-jitter_min, jitter_min))
+    return now + timedelta(minutes=delay)
+
+
+def _tomorrow(now: datetime, jitter_min: float) -> datetime:
+    # orçamento do dia esgotado: volta depois da meia-noite, com jitter para não bater na hora cheia
+    midnight = datetime(now.year, now.month, now.day) + timedelta(days=1)
+    return (midnight + timedelta(minutes=random.uniform(0, max(jitter_min, 1.0)))).replace(microsecond=0)
+
+
+def run_daemon(cycle: Callable[[], Dict], interval_min: float = 240, jitter_min: float = 15,
+               max_per_day: int = 3, status_path: str = "daemon_status.json",
+               on_error: Optional[Callable[[], None]] = None,
+               stop: Optional[threading.Event] = None) -> int:
+    stop = stop or threading.Event()
+
+    def _stop(signum, frame):
+        print(f"Sinal {signum} recebido: encerrando após o ciclo atual.")
+        stop.set()
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            signal.signal(sig, _stop)
+        except ValueError:  # fora da thread principal (ex.: chamado de outro serviço)
+            pass
+
+    # contagem diária sobrevive a reinícios: um restart não "zera" o limite de acessos ao site
+    prev = _load_status(status_path)
+    today = _now().date().isoformat()
+    status = {
+        "pid": os.getpid(),
+        "started_at": _now().isoformat(),
+        "state": "running",
+        "interval_min": interval_min,
+        "jitter_min": jitter_min,
+        "max_requests_per_day": max_per_day,
+        "day": today,
+        "requests_today": prev.get("requests_today", 0) if prev.get("day") == today else 0,
+        "cycles": 0,
+        "failures": 0,
+        "last_run_at": prev.get("last_run_at"),
+        "last_success_at": prev.get("last_success_at"),
+        "last_result": prev.get("last_result"),
+        "last_error": None,
+        "next_run_at": None,
+    }
+    print(f"Daemon iniciado (pid {status['pid']}): a cada {interval_min:g} ± {jitter_min:g} min, "
+          f"até {max_per_day} acessos/dia. Status em {status_path}")
+
+    next_run = _now()
+    while not stop.is_set():
+        now = _now()
+        if now.date().isoformat() != status["day"]:
+            status["day"], status["requests_today"] = now.date().isoformat(), 0
+
+        if status["requests_today"] >= max_per_day:
+            if next_run.date() <= now.date():  # ainda não reagendado para amanhã
+                next_run = _tomorrow(now, jitter_min)
+                print(f"Limite diário atingido ({max_per_day}); próxima coleta em {next_run.isoformat()}")
+        elif now >= next_run:
+            status["requests_today"] += 1
+            status["cycles"] += 1
+            status["last_run_at"] = now.isoformat()
+            try:
+                status["last_result"] = cycle()
+                status["last_success_at"] = _now().isoformat()
+                status["last_error"] = None
+            except Exception as e:  # um ciclo com erro não derruba o daemon
+                status["failures"] += 1
+                status["last_error"] = f"{type(e).__name__}: {e}"
+                print(f"ERRO no ciclo: {status['last_error']}")
+                traceback.print_exc()
+                if on_error is not None:
+                    on_error()  # ex.: fecha a conexão; o próximo ciclo reconecta
+            next_run = _next_run(_now(), interval_min, jitter_min)
+            print(f"Próxima coleta em {next_run.isoformat()}")
+
+        status["next_run_at"] = next_run.isoformat()
+        status["heartbeat_at"] = _now().isoformat()
+        _write_status(status_path, status)
+        # acorda no horário agendado ou, no máximo, a cada minuto (heartbeat e virada do dia)
+        stop.wait(min(60.0, max(0.0, (next_run - _now()).total_seconds())))
+
+    status["state"] = "stopped"
+    status["next_run_at"] = None
+    _write_status(status_path, status)
+    print("Daemon encerrado.")
+    return 0
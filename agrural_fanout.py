@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+from agrural_cache import PendingBatches, RowFingerprints
+from agrural_metrics import METRICS
+
+if TYPE_CHECKING:
+    from agrural_batch import PriceBatch
+    from agrural_sinks import LoadResult, Sink
+
+# Um lote extraído uma vez e entregue a vários destinos (CSV, Parquet, banco), cada um na sua
+# thread. Cada destino devolve o seu status; a falha de um não derruba os outros: o lote
+# dele vai para a fila de pendentes (agrural_cache.PendingBatches) e é reentregue só a ele
+# na próxima execução, sem nova coleta.
+
+DESTINOS = ("db", "csv", "parquet")
+
+
+class Destino:
+    name = "destino"
+
+    def deliver(self, batch: PriceBatch) -> Dict:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class CsvDestino(Destino):
+    # o CSV é sobrescrito a cada execução (foto da página); com append, acumula só as chaves
+    # novas e as mudanças (agrural_csvappend)
+    name = "csv"
+
+    def __init__(self, path: str, append: bool = False):
+        self.path = path
+        self.append = append
+
+    def deliver(self, batch: PriceBatch) -> Dict:
+        if self.append:
+            from agrural_csvappend import AppendCsv
+            with METRICS.timer("write_csv", mode="append"):
+                r = AppendCsv(self.path).append(batch)
+            METRICS.count("rows_written", r["inserted"] + r["updated"])
+            METRICS.count("rows_unchanged", r["unchanged"])
+            print(f"OK! {self.path}: {r['inserted']} linhas novas, {r['updated']} alteradas (log de atualizações), "
+                  f"{r['unchanged']} sem mudança.")
+            if r["sem_data"]:
+                print(f"ATENCAO: {r['sem_data']} linhas sem data não foram acrescentadas.", file=sys.stderr)
+            return dict(r, status="gravado", rows=r["inserted"] + r["updated"])
+        with METRICS.timer("write_csv"):
+            batch.write_csv(self.path)
+        METRICS.count("rows_written", len(batch))
+        print(f"OK! {len(batch)} linhas salvas em {self.path}")
+        return {"status": "gravado", "rows": len(batch)}
+
+
+class ParquetDestino(Destino):
+    # histórico local que acumula (requer pyarrow); root None = agrural_history.DEFAULT_HISTORY_DIR,
+    # resolvido só na entrega (o pyarrow não entra no import dos scripts)
+    name = "parquet"
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root
+
+    def deliver(self, batch: PriceBatch) -> Dict:
+        from agrural_history import DEFAULT_HISTORY_DIR, append
+        root = self.root or DEFAULT_HISTORY_DIR
+        with METRICS.timer("write_parquet"):
+            n = append(batch, root)
+        print(f"Histórico: {n} linhas gravadas em {root}")
+        return {"status": "gravado", "rows": n}
+
+
+class DbDestino(Destino):
+    # checagem de data + envio incremental (fingerprints) + MERGE no sink (SQL Server/SQLite).
+    # notify: chamado com as linhas carregadas e o LoadResult (marca d'água da carga) depois
+    # do commit (ex.: agrural_api.notify)
+
+    def __init__(self, sink: Sink, fingerprints: Optional[RowFingerprints] = None,
+                 notify: Optional[Callable[[PriceBatch, LoadResult], object]] = None):
+        self.sink = sink
+        self.fingerprints = fingerprints
+        self.notify = notify
+        self.name = sink.name
+
+    def deliver(self, batch: PriceBatch) -> Dict:
+        sink, fingerprints = self.sink, self.fingerprints
+        scrape_date = batch.first_date()
+        if not scrape_date:
+            print("ATENCAO: Data do site nao encontrada. Nada gravado (evitando data incorreta).")
+            return {"status": "sem_data", "rows": 0}
+
+        with METRICS.timer("max_date"):
+            last = sink.max_date()
+        if last and scrape_date < last:  # só bloqueia se a data do site for MAIS ANTIGA
+            print(f"Sem novidades: site={scrape_date} < banco={last}. Nada a fazer.")
+            return {"status": "sem_novidades", "data": scrape_date, "rows": 0}
+
+        # data igual ou maior -> executa MERGE (idempotente; atualiza se valores mudaram).
+        # Com fingerprint local válido só vão para o #stg as linhas novas ou alteradas.
+        summary = {"data": scrape_date}
+        snapshot = None
+        if fingerprints is not None:
+            keys, hashes = batch.keys(), batch.fingerprints()
+            with METRICS.timer("watermark"):
+                wm = sink.watermark()
+            trusted = fingerprints.snapshot is not None and wm is not None and wm[1] == fingerprints.snapshot
+            idx, inserted, updated, unchanged = fingerprints.diff(keys, hashes, trusted)
+            snapshot = fingerprints.stage(keys, hashes)
+            if trusted:
+                print(f"Delta: {inserted} inseridas, {updated} alteradas, {unchanged} sem mudança.")
+                summary.update(inserted=inserted, updated=updated, unchanged=unchanged)
+            else:
+                print(f"Delta: sem fingerprint local válido para este banco; enviando as {len(keys)} linhas.")
+            METRICS.count("rows_unchanged", unchanged)
+            if not idx:
+                print("Nenhuma linha nova ou alterada: MERGE pulado.")
+                fingerprints.commit()
+                return dict(summary, status="sem_mudancas", rows=0)
+            batch = batch.take(idx)
+
+        with METRICS.timer("load", sink=sink.name, strategy=sink.strategy):
+            result = sink.load(batch, snapshot=snapshot)
+        METRICS.count("rows_loaded", len(batch))
+        if fingerprints is not None:
+            fingerprints.commit()
+        if self.notify is not None and result is not None:
+            self.notify(batch, result)
+        return dict(summary, status="carregado", rows=len(batch),
+                    rows_per_sec=round(result.rows_per_sec) if result else None)
+
+    def close(self) -> None:
+        self.sink.close()
+
+
+def _deliver(destino: Destino, batch: Optional[PriceBatch], pending: Optional[PendingBatches]) -> Dict:
+    # pendentes de execuções anteriores primeiro (ordem de coleta), depois o lote novo
+    queue = (pending.load(destino.name) if pending is not None else []) + ([batch] if batch is not None else [])
+    if not queue:
+        return {"status": "cache", "rows": 0}
+    replayed = len(queue) - (batch is not None)
+    if replayed:
+        print(f"[{destino.name}] reentregando {replayed} lote(s) pendente(s).")
+    result: Dict = {}
+    for i, b in enumerate(queue):
+        try:
+            with METRICS.timer("destino", destino=destino.name):
+                result = destino.deliver(b)
+        except Exception as e:
+            print(f"[{destino.name}] ERRO: {type(e).__name__}: {e}", file=sys.stderr)
+            traceback.print_exc()
+            if pending is not None:
+                pending.save(destino.name, queue[i:])
+            return {"status": "erro", "error": f"{type(e).__name__}: {e}", "pendentes": len(queue) - i}
+    if replayed and pending is not None:
+        pending.clear(destino.name)
+    return dict(result, reentregues=replayed) if replayed else result
+
+
+def fan_out(batch: Optional[PriceBatch], destinos: List[Destino],
+            pending: Optional[PendingBatches] = None) -> Dict:
+    # batch None = página sem mudança: só os pendentes são entregues
+    if len(destinos) == 1:
+        results = {destinos[0].name: _deliver(destinos[0], batch, pending)}
+    else:
+        with ThreadPoolExecutor(max_workers=len(destinos), thread_name_prefix="destino") as pool:
+            futures = {d.name: pool.submit(_deliver, d, batch, pending) for d in destinos}
+            results = {name: f.result() for name, f in futures.items()}
+
+    for name, r in results.items():
+        METRICS.set(f"destino_{name}", r["status"])
+        if r["status"] == "erro":
+            METRICS.count("destino_falhas")
+    if len(results) > 1:
+        print("Destinos: " + ", ".join(f"{name}={r['status']}" for name, r in results.items()))
+    statuses = {r["status"] for r in results.values()}
+    if "erro" in statuses:
+        status = "falhas"
+    elif len(statuses) == 1:
+        status = statuses.pop()
+    else:
+        status = "ok"
+    return {"status": status, "rows": sum(r.get("rows", 0) for r in results.values()), "destinos": results}
@@ -0,0 +1,117 @@
+import re
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Expansão de tabela HTML em grade: cada célula (texto, rowspan[, colspan]) ocupa
+# rowspan x colspan posições e o texto é repetido em todas, para que as colunas fiquem
+# alinhadas com o cabeçalho. Segue o algoritmo de tabela do HTML: a célula vai para a
+# 1a coluna livre da linha, rowspan=0 vai até a última linha, valores inválidos valem 1.
+# Células sobrepostas (colspan por cima de um rowspan de cima, erro de modelo no HTML):
+# vale a última escrita, e a célula de baixo reaparece quando a de cima termina.
+#
+# A ocupação fica em duas listas pré-alocadas por coluna (até que linha a coluna está
+# ocupada e com qual texto), em vez de um dict por célula: cada posição da grade é
+# escrita uma vez e lida uma vez, então o custo é linear no tamanho da grade.
+
+# limites do HTML (rowspan > 65534 e colspan > 1000 são truncados)
+MAX_ROWSPAN = 65534
+MAX_COLSPAN = 1000
+
+# inteiro não negativo do HTML: espaços, "+" opcional e os dígitos ASCII do começo
+_INT_RE = re.compile(r"[ \t\n\f\r]*\+?([0-9]+)")
+
+
+def span(value, limit: int, zero: int = 1) -> int:
+    # "2" / " 2" / "2;" / "2.5" -> 2 (como o navegador); None, "", "x", "-1" -> 1.
+    # zero: o que 0 vale (colspan=0 -> 1; rowspan passa 0 = até a última linha)
+    if value is None or value == "":
+        return 1
+    if isinstance(value, int):
+        n = value
+    else:
+        m = _INT_RE.match(value)
+        if not m:
+            return 1
+        n = int(m.group(1))
+    if n < 0:
+        return 1
+    if n == 0:
+        return zero
+    return n if n <= limit else limit
+
+
+def expand_grid(rows_raw: Sequence[Sequence[Tuple]], text: Optional[Callable[[str], str]] = None) -> List[List[str]]:
+    n_rows = len(rows_raw)
+    # largura inicial: a linha com mais células; cresce (dobrando) com colspan ou com as
+    # rowspans de cima empurrando células para a direita
+    width = max(map(len, rows_raw), default=0) or 1
+    until = [0] * width    # coluna ocupada até a linha until[c] (exclusiva)
+    vals = [""] * width    # texto que ocupa a coluna
+    tall: List[Tuple[int, int]] = []           # (linha final, coluna final) das células com rowspan > 1
+    right, expiry = 0, n_rows                  # maior coluna final e 1a linha final entre elas
+    under: Dict[int, List[Tuple[int, str]]] = {}  # coluna -> células cobertas por sobreposição
+
+    def resume(k: int, r: int) -> bool:
+        # coluna k livre na linha r: volta a célula coberta que ainda não terminou, se houver
+        stack = under[k]
+        while stack and stack[-1][0] <= r:
+            stack.pop()
+        if stack:
+            until[k], vals[k] = stack.pop()
+        if not stack:
+            del under[k]
+        return until[k] > r
+
+    grid: List[List[str]] = []
+    for r, cells in enumerate(rows_raw):
+        row: List[str] = []
+        col = 0
+        for c in cells:
+            # pula as colunas ainda ocupadas por células de linhas anteriores
+            while col < width and (until[col] > r or (under and col in under and resume(col, r))):
+                row.append(vals[col])
+                col += 1
+            txt = text(c[0]) if text is not None else c[0]
+            rs = span(c[1], MAX_ROWSPAN, zero=0) if c[1] else 1
+            cs = span(c[2], MAX_COLSPAN) if len(c) > 2 and c[2] else 1
+            if rs == 1 and cs == 1:
+                # caso comum: a coluna está livre e nada abaixo depende dela
+                row.append(txt)
+                col += 1
+                continue
+            if rs == 0 or r + rs > n_rows:
+                rs = n_rows - r
+            end = col + cs
+            if end > width:
+                grow = max(end, 2 * width) - width
+                until.extend([0] * grow)
+                vals.extend([""] * grow)
+                width += grow
+            stop = r + rs
+            until[col], vals[col] = stop, txt
+            for k in range(col + 1, end):
+                if until[k] <= r and under and k in under:
+                    resume(k, r)
+                if until[k] > stop:  # sobreposição: a célula de cima continua depois desta
+                    under.setdefault(k, []).append((until[k], vals[k]))
+                until[k] = stop
+                vals[k] = txt
+            if cs == 1:
+                row.append(txt)
+            else:
+                row.extend([txt] * cs)
+            if rs > 1:
+                tall.append((stop, end))
+                right, expiry = max(right, end), min(expiry, stop)
+            col = end
+
+        # colunas ocupadas de cima à direita da última célula da linha (buraco no meio = "")
+        if expiry <= r:
+            tall = [t for t in tall if t[0] > r]
+            right = max((e for _, e in tall), default=0)
+            expiry = min((s for s, _ in tall), default=n_rows)
+        while col < right:
+            live = until[col] > r or (under and col in under and resume(col, r))
+            row.append(vals[col] if live else "")
+            col += 1
+        grid.append(row)
+    return grid
@@ -0,0 +1,208 @@
+import os
+import csv
+import sys
+import uuid
+import argparse
+from datetime import datetime, timezone
+from typing import List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError as e:  # dependência opcional: só o histórico precisa dela
+    raise ImportError("O histórico em Parquet precisa do pyarrow: pip install pyarrow") from e
+
+from agrural_batch import NUM_COLS, PriceBatch
+
+# ao lado dos scripts, não na pasta corrente (no Agendador de Tarefas ela costuma ser
+# System32). Os scripts não importam este módulo (pyarrow) só pelo padrão: ParquetDestino
+# sem pasta usa este
+DEFAULT_HISTORY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "historico")
+
+# Histórico local só de acréscimo, particionado por data (hive: historico/data=AAAA-MM-DD/).
+# Cada gravação cria um arquivo novo na partição do dia; a leitura fica com a versão mais
+# recente de cada chave (load_ts) e compact() junta os arquivos de uma partição em um só.
+# A data fica só no nome da pasta: filtro por período lê apenas as partições do período.
+
+KEY_COLS = ["data", "produto", "uf", "praca"]
+# mesmos nomes de coluna do dbo.PrecoSoja
+VALUE_COLS = ["compra_rs_sc", "var_dia_pct", "var_sem_pct", "var_mes_pct"]
+_VALUE_TYPES = [pa.decimal128(10, 2), pa.decimal128(6, 2), pa.decimal128(6, 2), pa.decimal128(6, 2)]
+
+FILE_SCHEMA = pa.schema(
+    [("produto", pa.string()), ("uf", pa.string()), ("praca", pa.string())]
+    + list(zip(VALUE_COLS, _VALUE_TYPES))
+    + [("load_ts", pa.timestamp("s", tz="UTC"))]
+)
+PARTITIONING = ds.partitioning(pa.schema([("data", pa.string())]), flavor="hive")
+
+# partição com esse número de arquivos é compactada logo após a gravação
+COMPACT_AT = 8
+
+
+def _partition_dir(root: str, date_iso: str) -> str:
+    return os.path.join(root, f"data={date_iso}")
+
+
+def _part_name(prefix: str = "part") -> str:
+    # ordem lexicográfica = ordem de gravação (desempate de load_ts iguais)
+    return f"{prefix}-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}.parquet"
+
+
+def _write_atomic(table: "pa.Table", folder: str, name: str) -> str:
+    # arquivos com "_" na frente são ignorados pelo dataset: grava e só então renomeia
+    os.makedirs(folder, exist_ok=True)
+    tmp = os.path.join(folder, "_" + name)
+    pq.write_table(table, tmp, compression="zstd")
+    final = os.path.join(folder, name)
+    os.replace(tmp, final)
+    return final
+
+
+def append(batch: PriceBatch, root: str = DEFAULT_HISTORY_DIR) -> int:
+    # Grava o lote (um arquivo por data). Linhas sem data não têm partição: ficam de fora.
+    dates = batch.text["data"]
+    no_date = sum(1 for d in dates if not d)
+    if no_date:
+        print(f"ATENCAO: {no_date} linhas sem data não foram para o histórico.", file=sys.stderr)
+    load_ts = datetime.now(timezone.utc).replace(microsecond=0)
+    written = 0
+    for date_iso in sorted({d for d in dates if d}):
+        part = batch.take(dates == date_iso)
+        cols = [pa.array(part.text[c].tolist(), pa.string()) for c in ("produto", "uf", "praca")]
+        cols += [pa.array(part.decimals(c), t) for c, t in zip(NUM_COLS, _VALUE_TYPES)]
+        cols.append(pa.array([load_ts] * len(part), FILE_SCHEMA.field("load_ts").type))
+        folder = _partition_dir(root, date_iso)
+        _write_atomic(pa.Table.from_arrays(cols, schema=FILE_SCHEMA), folder, _part_name())
+        written += len(part)
+        if len(_part_files(folder)) >= COMPACT_AT:
+            compact(root, date_iso)
+    return written
+
+
+def _part_files(folder: str) -> List[str]:
+    try:
+        return sorted(f for f in os.listdir(folder) if f.endswith(".parquet") and not f.startswith(("_", ".")))
+    except FileNotFoundError:
+        return []
+
+
+def _latest(table: "pa.Table") -> "pa.Table":
+    # uma linha por chave: a de load_ts mais recente (empate: a lida por último), em ordem de
+    # chave. Tudo no Arrow: ordena os índices por load_ts (ordenação estável, empate fica na
+    # ordem de leitura), agrupa pelas chaves ("last" em ordem, sem threads) e pega as linhas
+    if table.num_rows == 0:
+        return table
+    order = pc.sort_indices(table, sort_keys=[("load_ts", "ascending")])
+    keys = pa.table([table.column(c).take(order) for c in KEY_COLS] + [order], names=KEY_COLS + ["_pos"])
+    last = keys.group_by(KEY_COLS, use_threads=False).aggregate([("_pos", "last")])
+    last = last.sort_by([(c, "ascending") for c in KEY_COLS])
+    return table.take(last.column("_pos_last"))
+
+
+def read(root: str = DEFAULT_HISTORY_DIR, inicio: Optional[str] = None, fim: Optional[str] = None,
+         filtro: Optional["pc.Expression"] = None, columns: Optional[List[str]] = None) -> "pa.Table":
+    # Lê só as partições do período (inicio/fim inclusivos, AAAA-MM-DD) e só as colunas
+    # pedidas; `filtro` desce até os row groups (estatísticas do Parquet).
+    if not os.path.isdir(root):
+        raise FileNotFoundError(f"Histórico não encontrado: {root}")
+    dataset = ds.dataset(root, format="parquet", partitioning=PARTITIONING, schema=FILE_SCHEMA.append(
+        pa.field("data", pa.string())))
+    expr = None
+    for e in ((ds.field("data") >= inicio) if inicio else None,
+              (ds.field("data") <= fim) if fim else None,
+              filtro):
+        if e is not None:
+            expr = e if expr is None else expr & e
+    wanted = columns or VALUE_COLS
+    cols = KEY_COLS + [c for c in wanted if c not in KEY_COLS] + ["load_ts"]
+    table = _latest(dataset.to_table(columns=cols, filter=expr))
+    return table.select([c for c in cols if c != "load_ts"])
+
+
+def price_series(praca: str, inicio: Optional[str] = None, fim: Optional[str] = None,
+                 produto: str = "soja", uf: Optional[str] = None,
+                 root: str = DEFAULT_HISTORY_DIR) -> "pa.Table":
+    # série de preços de uma praça no período
+    filtro = (ds.field("praca") == praca) & (ds.field("produto") == produto)
+    if uf:
+        filtro = filtro & (ds.field("uf") == uf)
+    return read(root, inicio, fim, filtro)
+
+
+def prices_on(date_iso: str, produto: Optional[str] = None, root: str = DEFAULT_HISTORY_DIR) -> "pa.Table":
+    # todas as praças em uma data (uma partição só)
+    filtro = (ds.field("produto") == produto) if produto else None
+    return read(root, date_iso, date_iso, filtro)
+
+
+def compact(root: str = DEFAULT_HISTORY_DIR, date_iso: Optional[str] = None, min_files: int = 2) -> int:
+    # Junta os arquivos de cada partição (ou só de date_iso) em um, já sem versões antigas.
+    # O arquivo novo entra antes de os antigos saírem: leitura concorrente vê no máximo
+    # linhas repetidas, que _latest descarta.
+    if date_iso:
+        folders = [_partition_dir(root, date_iso)]
+    else:
+        folders = [os.path.join(root, d) for d in sorted(os.listdir(root)) if d.startswith("data=")]
+    compacted = 0
+    for folder in folders:
+        files = _part_files(folder)
+        if len(files) < min_files:
+            continue
+        table = pa.concat_tables(pq.read_table(os.path.join(folder, f), schema=FILE_SCHEMA) for f in files)
+        table = _latest(table.append_column("data", pa.array([""] * table.num_rows, pa.string())))
+        _write_atomic(table.select(FILE_SCHEMA.names), folder, _part_name("compact"))
+        for f in files:
+            os.remove(os.path.join(folder, f))
+        compacted += 1
+    return compacted
+
+
+def _print_table(table: "pa.Table", output: Optional[str]) -> None:
+    cols = [[("" if v is None else str(v)) for v in table.column(c).to_pylist()] for c in table.column_names]
+    f = open(output, "w", encoding="utf-8", newline="") if output else sys.stdout
+    try:
+        w = csv.writer(f, lineterminator="\n")
+        w.writerow(table.column_names)
+        w.writerows(zip(*cols))
+    finally:
+        if output:
+            f.close()
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Consulta e manutenção do histórico local (Parquet por data).")
+    p.add_argument("--root", default=DEFAULT_HISTORY_DIR, help="Pasta do histórico.")
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    s = sub.add_parser("serie", help="Série de preços de uma praça no período.")
+    s.add_argument("--praca", required=True)
+    s.add_argument("--uf")
+    s.add_argument("--produto", default="soja")
+    s.add_argument("--de", dest="inicio", help="AAAA-MM-DD (inclusive)")
+    s.add_argument("--ate", dest="fim", help="AAAA-MM-DD (inclusive)")
+    s.add_argument("-o", "--output", help="CSV de saída (padrão: tela).")
+
+    d = sub.add_parser("dia", help="Todas as praças em uma data.")
+    d.add_argument("--data", required=True)
+    d.add_argument("--produto")
+    d.add_argument("-o", "--output", help="CSV de saída (padrão: tela).")
+
+    c = sub.add_parser("compactar", help="Junta os arquivos de cada partição.")
+    c.add_argument("--data", help="Só esta partição.")
+    args = p.parse_args()
+
+    if args.cmd == "serie":
+        _print_table(price_series(args.praca, args.inicio, args.fim, args.produto, args.uf, args.root), args.output)
+    elif args.cmd == "dia":
+        _print_table(prices_on(args.data, args.produto, args.root), args.output)
+    else:
+        n = compact(args.root, args.data)
+        print(f"{n} partições compactadas.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+import time
+import random
+import importlib.util
+from typing import Dict, Optional
+
+from agrural_metrics import METRICS
+
+# Camada de HTTP comum aos coletores: sessão com pool de conexões (keep-alive), transferência
+# comprimida, novas tentativas com backoff exponencial + jitter em erro transitório (5xx, 429,
+# timeout, conexão recusada/caída) e um prazo total por requisição, para uma execução agendada
+# nunca ficar pendurada. Cada tentativa vira um evento "http_attempt" nas métricas.
+
+RETRIES = 3            # novas tentativas além da primeira
+BACKOFF_S = 1.0        # base do backoff (1, 2, 4... s, com jitter "full")
+MAX_BACKOFF_S = 30.0
+DEADLINE_S = 120.0     # prazo total, somando tentativas e esperas
+TIMEOUT_S = 30.0       # por tentativa (conexão e cada leitura do socket)
+CHUNK_SIZE = 16 * 1024  # leitura do corpo em pedaços, com o prazo conferido a cada um
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def _brotli() -> bool:
+    # urllib3 só descomprime br com brotli/brotlicffi instalado
+    for m in ("brotli", "brotlicffi"):
+        try:
+            if importlib.util.find_spec(m) is not None:
+                return True
+        except (ImportError, ValueError):
+            pass
+    return False
+
+
+ACCEPT_ENCODING = "gzip, deflate, br" if _brotli() else "gzip, deflate"
+
+
+class FetchError(RuntimeError):
+    pass
+
+
+def make_session(headers: Optional[Dict[str, str]] = None, pool_size: int = 4, retries: int = RETRIES,
+                 deadline_s: float = DEADLINE_S, timeout_s: float = TIMEOUT_S):
+    import requests
+    from requests.adapters import HTTPAdapter
+    s = requests.Session()
+    # as novas tentativas ficam em get() (com prazo e métricas), não no urllib3
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    s.headers["Accept-Encoding"] = ACCEPT_ENCODING
+    s.headers.update(headers or {})
+    # política de novas tentativas usada por get() com esta sessão
+    s.policy = {"retries": retries, "deadline_s": deadline_s, "timeout_s": timeout_s}
+    return s
+
+
+_SESSION = None
+
+
+def default_session():
+    # sessão do processo (execução avulsa); o daemon e o coletor de fontes criam as suas
+    global _SESSION
+    if _SESSION is None:
+        _SESSION = make_session()
+    return _SESSION
+
+
+def _wire_bytes(resp) -> Optional[int]:
+    # bytes que vieram pela rede (comprimidos); None se o transporte não informa
+    try:
+        n = resp.raw.tell()
+        return n if isinstance(n, int) else None
+    except Exception:
+        return None
+
+
+def _retry_after(resp) -> Optional[float]:
+    v = resp.headers.get("Retry-After") if resp is not None else None
+    try:
+        return max(0.0, float(v)) if v else None
+    except ValueError:  # formato data HTTP: usa o backoff normal
+        return None
+
+
+def iter_body(resp, chunk_size: int = CHUNK_SIZE):
+    # Corpo em pedaços, conferindo o prazo total de get() (resp.deadline) a cada um. O timeout
+    # do requests vale por leitura do socket: um servidor que manda poucos bytes por vez nunca
+    # o dispara. read1 devolve o que já chegou, sem esperar juntar chunk_size bytes.
+    import requests
+    from urllib3.exceptions import DecodeError, ProtocolError, ReadTimeoutError
+    deadline = getattr(resp, "deadline", None)
+    read1 = getattr(resp.raw, "read1", None)
+    chunks = None if read1 is not None else resp.iter_content(chunk_size)  # urllib3 1.x
+    got = 0
+    while True:
+        if chunks is not None:
+            data = next(chunks, b"")
+        else:
+            try:
+                data = read1(chunk_size, decode_content=True)
+            except ProtocolError as e:
+                raise requests.exceptions.ChunkedEncodingError(e)
+            except ReadTimeoutError as e:
+                raise requests.ConnectionError(e)
+            except DecodeError as e:
+                raise requests.exceptions.ContentDecodingError(e)
+        if not data:
+            return
+        got += len(data)
+        if deadline is not None and time.monotonic() > deadline:
+            resp.close()
+            raise FetchError(f"Prazo esgotado lendo o corpo de {resp.url} ({got} bytes recebidos).")
+        yield data
+
+
+def get(url: str, session=None, headers: Optional[Dict[str, str]] = None, stream: bool = False,
+        retries: Optional[int] = None, deadline_s: Optional[float] = None, timeout_s: Optional[float] = None,
+        backoff_s: float = BACKOFF_S):
+    # Devolve a resposta 2xx/3xx (304 incluso). Erro transitório: tenta de novo até `retries`
+    # vezes dentro do prazo; 4xx (fora 429) falha na hora, como raise_for_status().
+    # Sem valores explícitos vale a política da sessão (make_session). O prazo vale também para
+    # o corpo: com stream=True a resposta leva resp.deadline e deve ser lida por iter_body.
+    import requests
+    session = session or default_session()
+    policy = getattr(session, "policy", {})
+    retries = policy.get("retries", RETRIES) if retries is None else retries
+    deadline_s = policy.get("deadline_s", DEADLINE_S) if deadline_s is None else deadline_s
+    timeout_s = policy.get("timeout_s", TIMEOUT_S) if timeout_s is None else timeout_s
+    deadline = time.monotonic() + deadline_s
+    attempt = 0
+    while True:
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise FetchError(f"Prazo de {deadline_s:g}s esgotado em {url} ({attempt} tentativas).")
+        attempt += 1
+        t0 = time.perf_counter()
+        resp, error = None, None
+        try:
+            resp = session.get(url, headers=headers, timeout=min(timeout_s, left), stream=True)
+            resp.deadline = deadline
+            if not stream:
+                # corpo lido aqui, em pedaços: timeout de leitura conta nesta tentativa e o
+                # prazo total é conferido a cada pedaço (FetchError se esgotar)
+                resp._content = b"".join(iter_body(resp))
+                resp._content_consumed = True
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            error = e
+        ms = (time.perf_counter() - t0) * 1000
+        status = resp.status_code if resp is not None else None
+        METRICS.count("http_attempts")
+        METRICS.event("http_attempt", url=url, attempt=attempt, status=status, ms=round(ms, 3),
+                      bytes=None if resp is None or stream else len(resp.content),
+                      wire_bytes=None if resp is None or stream else _wire_bytes(resp),
+                      error=f"{type(error).__name__}: {error}" if error else None)
+
+        if error is None and status < 400:
+            return resp
+        if error is None and status not in RETRY_STATUS:
+            resp.raise_for_status()
+        if attempt > retries:
+            if error is not None:
+                raise error
+            resp.raise_for_status()
+        wait = _retry_after(resp)
+        if wait is None:
+            wait = min(MAX_BACKOFF_S, random.uniform(0, backoff_s * 2 ** (attempt - 1)))
+        if time.monotonic() + wait >= deadline:
+            raise FetchError(f"Prazo de {deadline_s:g}s não comporta nova tentativa em {url} "
+                             f"(última: {status or type(error).__name__}).")
+        if resp is not None:
+            resp.close()
+        METRICS.count("http_retries")
+        print(f"HTTP: tentativa {attempt} falhou ({status or type(error).__name__}); nova em {wait:.1f}s.")
+        time.sleep(wait)
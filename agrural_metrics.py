@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import uuid
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+DEFAULT_METRICS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "metrics.jsonl")
+
+# Instrumentação leve da execução: tempo por estágio, contadores (linhas, bytes, idas ao
+# banco) e valores pontuais (status HTTP). Cada estágio vira um evento JSON-lines; no fim
+# da execução um evento "run" resume tudo e, se pedido, o textfile do Prometheus
+# (node_exporter --collector.textfile.directory) é regravado. Os destinos da carga rodam em
+# threads (agrural_fanout): contadores e eventos são atualizados sob um lock.
+
+
+class Metrics:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = defaultdict(float)   # ms acumulados por estágio
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.values: Dict[str, object] = {}
+        self.events = []
+
+    @contextmanager
+    def timer(self, stage: str, **fields):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            ms = (time.perf_counter() - t0) * 1000
+            with self._lock:
+                self.stages[stage] += ms
+            self.event("stage", stage=stage, ms=round(ms, 3), **fields)
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += n
+
+    def set(self, name: str, value) -> None:
+        self.values[name] = value
+
+    def event(self, kind: str, **fields) -> None:
+        self.events.append(dict(ts=datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+                                run_id=self.run_id, event=kind, **fields))
+
+    def summary(self, status: str, **fields) -> Dict:
+        return dict(ts=datetime.now(timezone.utc).isoformat(timespec="milliseconds"), run_id=self.run_id,
+                    event="run", status=status, total_ms=round((time.perf_counter() - self.started) * 1000, 3),
+                    stages_ms={k: round(v, 3) for k, v in self.stages.items()},
+                    counters=dict(self.counters), **self.values, **fields)
+
+    def emit(self, status: str, jsonl_path: Optional[str] = None, prom_path: Optional[str] = None,
+             job: str = "agrural", **fields) -> Dict:
+        run = self.summary(status, **fields)
+        if jsonl_path:
+            os.makedirs(os.path.dirname(os.path.abspath(jsonl_path)), exist_ok=True)
+            with open(jsonl_path, "a", encoding="utf-8") as f:
+                for e in self.events + [run]:
+                    f.write(json.dumps(e, ensure_ascii=False, default=str) + "\n")
+        if prom_path:
+            write_prometheus(run, prom_path, job)
+        return run
+
+    def counted(self, conn):
+        # conexão DB-API cujas execute/executemany (na conexão ou nos cursores) contam
+        # como ida ao banco em counters["db_roundtrips"]
+        return _Counted(conn, self)
+
+
+class _Counted:
+
+    def __init__(self, target, metrics: Metrics):
+        object.__setattr__(self, "_target", target)
+        object.__setattr__(self, "_metrics", metrics)
+
+    def execute(self, *args):
+        self._metrics.count("db_roundtrips")
+        res = self._target.execute(*args)
+        return self if res is self._target else res
+
+    def executemany(self, *args):
+        self._metrics.count("db_roundtrips")
+        return self._target.executemany(*args)
+
+    def cursor(self):
+        return _Counted(self._target.cursor(), self._metrics)
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+    def __setattr__(self, name, value):
+        # cur.fast_executemany / cn.autocommit vão para o objeto real
+        setattr(self._target, name, value)
+
+    def __enter__(self):
+        self._target.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._target.__exit__(*exc)
+
+
+def _prom_escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def write_prometheus(run: Dict, path: str, job: str = "agrural") -> None:
+    # textfile do node_exporter: gauges da última execução (arquivo trocado de uma vez)
+    lab = f'job="{_prom_escape(job)}"'
+    lines = [
+        "# HELP agrural_last_run_timestamp_seconds Fim da última execução (epoch).",
+        "# TYPE agrural_last_run_timestamp_seconds gauge",
+        f"agrural_last_run_timestamp_seconds{{{lab}}} {time.time():.0f}",
+        "# HELP agrural_last_run_success 1 se a última execução terminou sem erro.",
+        "# TYPE agrural_last_run_success gauge",
+        f"agrural_last_run_success{{{lab}}} {0 if run['status'] == 'erro' else 1}",
+        "# HELP agrural_last_run_duration_seconds Duração total da última execução.",
+        "# TYPE agrural_last_run_duration_seconds gauge",
+        f"agrural_last_run_duration_seconds{{{lab}}} {run['total_ms'] / 1000:.6f}",
+        "# HELP agrural_stage_duration_seconds Duração de cada estágio na última execução.",
+        "# TYPE agrural_stage_duration_seconds gauge",
+    ]
+    for stage, ms in sorted(run["stages_ms"].items()):
+        lines.append(f'agrural_stage_duration_seconds{{{lab},stage="{_prom_escape(stage)}"}} {ms / 1000:.6f}')
+    lines += ["# HELP agrural_run_counter Contadores da última execução (linhas, bytes, idas ao banco).",
+              "# TYPE agrural_run_counter gauge"]
+    for name, n in sorted(run["counters"].items()):
+        lines.append(f'agrural_run_counter{{{lab},name="{_prom_escape(name)}"}} {n}')
+    if isinstance(run.get("http_status"), int):
+        lines += ["# TYPE agrural_http_status gauge", f"agrural_http_status{{{lab}}} {run['http_status']}"]
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
+
+
+METRICS = Metrics()
@@ -0,0 +1,104 @@
+import sys
+import json
+import argparse
+from typing import TYPE_CHECKING, Callable, Dict, List
+
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+
+PARSERS = ("html.parser", "lxml", "selectolax")
+
+# Só o que find_soja_table / parse_date_near / expand_html_table precisam:
+# os títulos (âncora + data) e as tabelas inteiras.
+PARSE_TAGS = ["h2", "h3", "h4", "strong", "p", "table"]
+_PARSE_CSS = ", ".join(PARSE_TAGS)
+
+
+def _selectolax_fragment(html: str) -> str:
+    # selectolax (lexbor, em C) varre a página inteira; devolvemos só os títulos e as
+    # tabelas de nível mais alto, em ordem de documento, para um BeautifulSoup pequeno.
+    try:
+        from selectolax.lexbor import LexborHTMLParser as _Parser
+    except ImportError:  # selectolax < 1.0
+        from selectolax.parser import HTMLParser as _Parser
+
+    picked, seen = [], set()
+    for node in _Parser(html).css(_PARSE_CSS):
+        anc, nested = node.parent, False
+        while anc is not None:
+            if anc.mem_id in seen:
+                nested = True
+                break
+            anc = anc.parent
+        if nested:
+            continue
+        seen.add(node.mem_id)
+        picked.append(node.html)
+    return "\n".join(picked)
+
+
+def make_soup(html: str, parser: str = "html.parser", restrict: bool = False) -> "BeautifulSoup":
+    from bs4 import BeautifulSoup, SoupStrainer
+    if parser not in PARSERS:
+        raise ValueError(f"Parser desconhecido: {parser} (opções: {', '.join(PARSERS)})")
+    if parser == "selectolax":
+        return BeautifulSoup(_selectolax_fragment(html), "html.parser")
+    if restrict:
+        return BeautifulSoup(html, parser, parse_only=SoupStrainer(PARSE_TAGS))
+    return BeautifulSoup(html, parser)
+
+
+def compare_backends(html: str, rows_from_html: Callable[..., List[Dict]]) -> Dict[str, List[str]]:
+    # Roda o extrator com cada backend (completo e restrito) e compara linha a linha
+    # com a referência html.parser completa. Retorna {backend: [diferenças]}.
+    def dump(rows):
+        # json trata NaN de forma estável (NaN != NaN quebraria a comparação direta)
+        return [json.dumps(r, sort_keys=True, ensure_ascii=False) for r in rows]
+
+    ref = dump(rows_from_html(html, parser="html.parser", restrict=False))
+    report: Dict[str, List[str]] = {}
+    for parser in PARSERS:
+        for restrict in (False, True):
+            if parser == "html.parser" and not restrict:
+                continue
+            if parser == "selectolax" and restrict:
+                continue  # selectolax já é sempre restrito
+            name = parser + (" (restrito)" if restrict else "")
+            try:
+                got = dump(rows_from_html(html, parser=parser, restrict=restrict))
+            except ImportError as e:
+                report[name] = [f"indisponível: {e}"]
+                continue
+            diffs = []
+            if len(got) != len(ref):
+                diffs.append(f"linhas: {len(got)} != {len(ref)}")
+            for i, (a, b) in enumerate(zip(ref, got)):
+                if a != b:
+                    diffs.append(f"linha {i}: esperado {a} obtido {b}")
+            report[name] = diffs
+    return report
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Compara os backends de parser sobre páginas salvas da AgRural.")
+    p.add_argument("html_files", nargs="+", help="Arquivos .html salvos da página de preços.")
+    args = p.parse_args()
+
+    from agrural_core import rows_from_html
+
+    rc = 0
+    for path in args.html_files:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            html = f.read()
+        for name, diffs in compare_backends(html, rows_from_html).items():
+            status = "OK" if not diffs else ("PULADO" if diffs[0].startswith("indisponível") else "DIFERENTE")
+            print(f"{path}: {name}: {status}")
+            for d in diffs[:10]:
+                print(f"    {d}")
+            if status == "DIFERENTE":
+                rc = 1
+    return rc
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import os
+import re
+import json
+import unicodedata
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from agrural_batch import PriceBatch
+
+# Nome canônico das praças. O site (e as outras fontes) nem sempre escreve a praça do mesmo
+# jeito: acento, caixa, espaço e pontuação mudam de um dia para outro ("Luís Eduardo
+# Magalhães" / "Luis Eduardo Magalhaes" / "LUÍS EDUARDO MAGALHÃES"), e às vezes o nome muda
+# ("LEM"). A chave da praça (uf + chave dobrada) é a mesma nos dois casos e vira o
+# praca_id da dbo.DimPraca; os apelidos vêm de um JSON:
+#   {"BA": {"Luís Eduardo Magalhães": ["LEM", "L. E. Magalhães"]}, ...}
+
+DEFAULT_ALIAS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pracas_alias.json")
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def fold(text: Optional[str]) -> str:
+    # "São  Luís-MA" -> "sao luis ma": sem acento, minúsculas, pontuação e espaços viram um espaço
+    t = unicodedata.normalize("NFKD", text or "")
+    t = "".join(c for c in t if not unicodedata.combining(c)).casefold()
+    return _NON_ALNUM.sub(" ", t).strip()
+
+
+def clean(text: Optional[str]) -> str:
+    # nome para exibição: só tira espaços repetidos / nas pontas (e o nbsp do HTML)
+    return " ".join((text or "").replace("\xa0", " ").split())
+
+
+class PracaCanon:
+
+    def __init__(self, aliases: Optional[Dict[str, Dict[str, List[str]]]] = None):
+        # (uf, chave de qualquer grafia) -> nome canônico
+        self.names: Dict[Tuple[str, str], str] = {}
+        for uf, pracas in (aliases or {}).items():
+            for nome, variantes in pracas.items():
+                for v in [nome] + list(variantes):
+                    self.names[(uf.strip().upper(), fold(v))] = clean(nome)
+
+    @classmethod
+    def load(cls, path: Optional[str] = DEFAULT_ALIAS_FILE) -> "PracaCanon":
+        # sem arquivo: só a dobra de acento/caixa/espaço
+        if not path or not os.path.exists(path):
+            return cls()
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def name(self, uf: Optional[str], praca: Optional[str]) -> str:
+        return self.names.get(((uf or "").strip(), fold(praca)), clean(praca))
+
+    def key(self, uf: Optional[str], praca: Optional[str]) -> str:
+        return fold(self.name(uf, praca))
+
+    def apply(self, batch: PriceBatch) -> Tuple[PriceBatch, int]:
+        # troca a praça pelo nome canônico e deixa uma linha por data+produto+uf+chave
+        # (a 1a do lote, como em agrural_sources.combine). Devolve (lote, linhas descartadas).
+        if not len(batch):
+            return batch, 0
+        import numpy as np
+        out = batch.take(np.arange(len(batch)))
+        cache: Dict[Tuple, Tuple[str, str]] = {}  # (uf, grafia) -> (nome, chave); praças se repetem
+        names, keys = [], []
+        for d, p, uf, praca in zip(*(out.text[c].tolist() for c in ("data", "produto", "uf", "praca"))):
+            if (uf, praca) not in cache:
+                nome = self.name(uf, praca)
+                cache[(uf, praca)] = (nome, fold(nome))
+            nome, chave = cache[(uf, praca)]
+            names.append(nome)
+            keys.append(f"{d}|{p}|{uf}|{chave}")
+        out.text["praca"] = np.array(names, dtype=object)
+        keys = np.array(keys, dtype=object)
+        _, first = np.unique(keys, return_index=True)
+        keep = np.sort(first)
+        return out.take(keep), len(out) - len(keep)
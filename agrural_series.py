@@ -0,0 +1,228 @@
+import csv
+import sys
+import argparse
+import warnings
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Séries de preço por (produto, uf, praca) em matrizes NumPy contíguas [praça x data], com um
+# índice de datas ordenado. As variações (dia/semana/mês) e as estatísticas móveis são
+# calculadas de uma vez para todas as praças; conferir() aponta onde a variação publicada
+# pelo site diverge da recalculada.
+
+VAR_COLS = ("var_dia", "var_sem", "var_mes")
+# colunas do CSV do scraper -> nomes internos
+_CSV_COLS = {"compra_R$/sc": "compra", "var_dia_%": "var_dia", "var_sem_%": "var_sem", "var_mes_%": "var_mes"}
+
+SERIES_SQL = ("SELECT [data],[produto],[uf],[praca],[compra_rs_sc],[var_dia_pct],[var_sem_pct],[var_mes_pct] "
+              "FROM {table}")
+
+Key = Tuple[str, str, str]
+
+
+def _num(v) -> float:
+    if v is None or v == "":
+        return np.nan
+    return float(v)
+
+
+def _shift_months(dates: np.ndarray, months: int) -> np.ndarray:
+    # mesmo dia N meses antes; dia inexistente (31/02) vira o último dia do mês
+    m = dates.astype("datetime64[M]")
+    day = (dates - m.astype("datetime64[D]")).astype(np.int64)
+    target = m - months
+    last = ((target + 1).astype("datetime64[D]") - target.astype("datetime64[D]")).astype(np.int64) - 1
+    return target.astype("datetime64[D]") + np.minimum(day, last)
+
+
+class PriceSeries:
+
+    def __init__(self, keys: List[Key], dates: np.ndarray, compra: np.ndarray, reported: Dict[str, np.ndarray]):
+        self.keys = keys
+        self.index = {k: i for i, k in enumerate(keys)}
+        self.dates = dates              # datetime64[D], ordenado, sem repetição
+        self.compra = compra            # float64 [praça x data], NaN = sem cotação
+        self.reported = reported        # var_* publicadas pelo site, mesmo formato
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def serie(self, produto: str, uf: str, praca: str) -> Tuple[np.ndarray, np.ndarray]:
+        # (datas, preços) de uma praça, só onde houve cotação
+        row = self.compra[self.index[(produto, uf, praca)]]
+        ok = ~np.isnan(row)
+        return self.dates[ok], row[ok]
+
+    # ----------- carga -----------
+    @classmethod
+    def from_records(cls, records: Iterable[Sequence]) -> "PriceSeries":
+        # registros (data, produto, uf, praca, compra, var_dia, var_sem, var_mes)
+        rows = [r for r in records if r[0] and r[3] and r[4] not in (None, "")]
+        if not rows:
+            return cls([], np.array([], dtype="datetime64[D]"), np.empty((0, 0)),
+                       {c: np.empty((0, 0)) for c in VAR_COLS})
+        cols = list(zip(*rows))
+        dates_all = np.array([str(d)[:10] for d in cols[0]], dtype="datetime64[D]")
+        dates, di = np.unique(dates_all, return_inverse=True)
+        keys: Dict[Key, int] = {}
+        ki = np.fromiter((keys.setdefault((p or "soja", u or "", pr), len(keys))
+                          for p, u, pr in zip(cols[1], cols[2], cols[3])), dtype=np.int64, count=len(rows))
+        shape = (len(keys), len(dates))
+
+        def matrix(values) -> np.ndarray:
+            m = np.full(shape, np.nan)
+            m[ki, di] = np.fromiter((_num(v) for v in values), dtype=np.float64, count=len(rows))
+            return m  # chave+data repetida: vale a última ocorrência
+
+        return cls(list(keys), dates, matrix(cols[4]),
+                   {c: matrix(cols[5 + i]) for i, c in enumerate(VAR_COLS)})
+
+    @classmethod
+    def from_csv(cls, paths: Sequence[str]) -> "PriceSeries":
+        # um ou mais CSVs do scrape_agrural_soja.py (CSVs antigos, sem produto, contam como soja)
+        records = []
+        for path in paths:
+            with open(path, "r", encoding="utf-8", newline="") as f:
+                for r in csv.DictReader(f):
+                    records.append((r.get("data"), r.get("produto") or "soja", r.get("uf"), r.get("praca"))
+                                   + tuple(r.get(c) for c in _CSV_COLS))
+        return cls.from_records(records)
+
+    @classmethod
+    def from_sink(cls, sink, produto: Optional[str] = None) -> "PriceSeries":
+        # dbo.PrecoSoja (SqlServerSink) ou o SQLite local (SQLiteSink)
+        table = "dbo.PrecoSoja" if sink.name == "sqlserver" else "PrecoSoja"
+        sql, params = SERIES_SQL.format(table=table), ()
+        if sink.name == "sqlite":
+            sql = sql.replace("[", "").replace("]", "")
+        if produto:
+            sql += " WHERE " + ("[produto]" if sink.name == "sqlserver" else "produto") + " = ?"
+            params = (produto,)
+        cur = sink.connection().cursor()
+        cur.execute(sql, params)
+        return cls.from_records(cur.fetchall())
+
+    # ----------- cálculo -----------
+    def _ffill(self) -> np.ndarray:
+        # última cotação conhecida até cada data, por praça (sem laço por praça)
+        ok = ~np.isnan(self.compra)
+        pos = np.where(ok, np.arange(self.compra.shape[1]), -1)
+        pos = np.maximum.accumulate(pos, axis=1)
+        out = np.take_along_axis(self.compra, np.maximum(pos, 0), axis=1)
+        out[pos < 0] = np.nan
+        return out
+
+    def _asof(self, filled: np.ndarray, targets: np.ndarray) -> np.ndarray:
+        # preço na última data <= alvo (uma coluna-alvo por data do índice)
+        j = np.searchsorted(self.dates, targets, side="right") - 1
+        out = filled[:, np.maximum(j, 0)]
+        out[:, j < 0] = np.nan
+        return out
+
+    def variations(self) -> Dict[str, np.ndarray]:
+        # % contra a cotação anterior da praça, a de 7 dias atrás e a de 1 mês atrás
+        filled = self._ffill()
+        prev = np.full_like(filled, np.nan)
+        prev[:, 1:] = filled[:, :-1]
+        refs = {
+            "var_dia": prev,
+            "var_sem": self._asof(filled, self.dates - np.timedelta64(7, "D")),
+            "var_mes": self._asof(filled, _shift_months(self.dates, 1)),
+        }
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return {c: np.round((self.compra / ref - 1.0) * 100.0, 2) for c, ref in refs.items()}
+
+    def rolling(self, window: int, min_periods: int = 1) -> Dict[str, np.ndarray]:
+        # média/desvio/mín/máx das últimas `window` datas do índice (NaN não conta)
+        pad = np.full((len(self), window - 1), np.nan)
+        win = np.lib.stride_tricks.sliding_window_view(np.hstack([pad, self.compra]), window, axis=1)
+        count = (~np.isnan(win)).sum(axis=2)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # janela só com NaN
+            stats = {"media": np.nanmean(win, axis=2), "desvio": np.nanstd(win, axis=2, ddof=1),
+                     "minimo": np.nanmin(win, axis=2), "maximo": np.nanmax(win, axis=2)}
+        for v in stats.values():
+            v[count < min_periods] = np.nan
+        return stats
+
+    def conferir(self, tolerance: float = 0.1) -> List[Dict]:
+        # linhas em que |publicada - recalculada| > tolerância (pontos percentuais)
+        out = []
+        for col, calc in self.variations().items():
+            rep = self.reported[col]
+            bad = np.abs(rep - calc) > tolerance  # NaN em qualquer lado => não compara
+            for k, d in zip(*np.nonzero(bad)):
+                produto, uf, praca = self.keys[k]
+                out.append({"data": str(self.dates[d]), "produto": produto, "uf": uf, "praca": praca,
+                            "coluna": col, "site": float(rep[k, d]), "recalculada": float(calc[k, d]),
+                            "diferenca": round(float(rep[k, d] - calc[k, d]), 2)})
+        out.sort(key=lambda r: (r["data"], r["produto"], r["uf"], r["praca"], r["coluna"]))
+        return out
+
+    def to_rows(self, window: Optional[int] = None) -> Tuple[List[str], List[List]]:
+        # formato longo (uma linha por praça+data com cotação), para CSV
+        var = self.variations()
+        stats = self.rolling(window) if window else {}
+        header = ["data", "produto", "uf", "praca", "compra"] + [f"{c}_calc" for c in VAR_COLS] \
+            + [f"{c}_site" for c in VAR_COLS] + [f"{s}_{window}" for s in stats]
+        rows = []
+        for k, d in zip(*np.nonzero(~np.isnan(self.compra))):
+            vals = [self.compra[k, d]] + [var[c][k, d] for c in VAR_COLS] \
+                + [self.reported[c][k, d] for c in VAR_COLS] + [s[k, d] for s in stats.values()]
+            rows.append([str(self.dates[d]), *self.keys[k]]
+                        + ["" if np.isnan(v) else round(float(v), 4) for v in vals])
+        rows.sort(key=lambda r: (r[1], r[2], r[3], r[0]))
+        return header, rows
+
+
+def _write(header: List[str], rows: List[List], output: Optional[str]) -> None:
+    f = open(output, "w", encoding="utf-8", newline="") if output else sys.stdout
+    try:
+        w = csv.writer(f, lineterminator="\n")
+        w.writerow(header)
+        w.writerows(rows)
+    finally:
+        if output:
+            f.close()
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Recalcula e confere as variações dia/semana/mês publicadas pelo site.")
+    p.add_argument("cmd", choices=["conferir", "variacoes"],
+                   help="conferir = lista divergências; variacoes = exporta as séries recalculadas.")
+    src = p.add_mutually_exclusive_group(required=True)
+    src.add_argument("--csv", nargs="+", help="CSVs gerados pelo scrape_agrural_soja.py.")
+    src.add_argument("--sqlite", help="Banco SQLite (--sink sqlite do coletor).")
+    src.add_argument("--conn-str", help="Connection string ODBC do SQL Server (lê dbo.PrecoSoja).")
+    p.add_argument("--produto", help="Filtra um produto (soja, milho).")
+    p.add_argument("--tolerancia", type=float, default=0.1, help="Diferença aceita, em pontos percentuais.")
+    p.add_argument("--janela", type=int, default=None, help="(variacoes) inclui estatísticas móveis de N datas.")
+    p.add_argument("-o", "--output", help="CSV de saída (padrão: tela).")
+    args = p.parse_args()
+
+    if args.csv:
+        series = PriceSeries.from_csv(args.csv)
+    else:
+        from agrural_sinks import make_sink
+        kind = "sqlite" if args.sqlite else "sqlserver"
+        with make_sink(kind, args.conn_str, sqlite_path=args.sqlite or "") as sink:
+            series = PriceSeries.from_sink(sink, args.produto)
+    if args.produto and args.csv:
+        keep = [i for i, k in enumerate(series.keys) if k[0] == args.produto]
+        series = PriceSeries([series.keys[i] for i in keep], series.dates, series.compra[keep],
+                             {c: m[keep] for c, m in series.reported.items()})
+    print(f"{len(series)} praças, {len(series.dates)} datas", file=sys.stderr)
+
+    if args.cmd == "variacoes":
+        _write(*series.to_rows(args.janela), args.output)
+        return 0
+    bad = series.conferir(args.tolerancia)
+    if bad:
+        _write(list(bad[0].keys()), [list(r.values()) for r in bad], args.output)
+    print(f"{len(bad)} divergências acima de {args.tolerancia} p.p.", file=sys.stderr)
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,892 @@
+from __future__ import annotations
+
+import os
+import csv
+import time
+import sqlite3
+import tempfile
+from collections import Counter
+from datetime import date as _date
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from agrural_metrics import METRICS
+from agrural_praca import PracaCanon, fold
+
+if TYPE_CHECKING:  # numpy só entra quando existe um lote para gravar
+    from agrural_batch import PriceBatch
+
+# fonte das cargas da AgRural (script principal, backfill, daemon); as outras fontes do
+# comando sources gravam o próprio nome (agrural_sources.Source.fonte)
+FONTE = "AgRural"
+
+# ----------- SQL Server -----------
+# Fato com chave compacta: (data, produto, praca_id smallint, fonte) no lugar de uf + praca
+# nvarchar(120). As praças ficam na dbo.DimPraca (uma linha por uf + chave dobrada, ver
+# agrural_praca) e a view dbo.PrecoSoja devolve o formato antigo (uf, praca) para consultas.
+# A fonte faz parte da chave: a mesma praça/dia vinda de duas fontes são duas linhas.
+CREATE_DIM_SQL = r"""
+IF OBJECT_ID('dbo.DimPraca','U') IS NULL
+  CREATE TABLE dbo.DimPraca(
+    [praca_id] smallint IDENTITY(1,1) NOT NULL CONSTRAINT PK_DimPraca PRIMARY KEY,
+    [uf] char(2) NOT NULL,
+    [praca] nvarchar(120) NOT NULL,
+    [chave] nvarchar(120) NOT NULL,
+    CONSTRAINT UQ_DimPraca_chave UNIQUE([uf],[chave])
+  );
+"""
+
+FACT_COLUMNS_SQL = r"""
+    [data] date NOT NULL,
+    [produto] varchar(20) NOT NULL CONSTRAINT DF_PrecoSojaFato_produto DEFAULT('soja'),
+    [praca_id] smallint NOT NULL CONSTRAINT FK_PrecoSojaFato_praca REFERENCES dbo.DimPraca([praca_id]),
+    [compra_rs_sc] decimal(10,2) NOT NULL,
+    [var_dia_pct]  decimal(6,2) NULL,
+    [var_sem_pct]  decimal(6,2) NULL,
+    [var_mes_pct]  decimal(6,2) NULL,
+    [fonte] nvarchar(100) NOT NULL CONSTRAINT DF_PrecoSojaFato_fonte DEFAULT(N'AgRural'),
+    [load_ts] datetime2(0) NOT NULL CONSTRAINT DF_PrecoSojaFato_load DEFAULT(SYSUTCDATETIME()),"""
+
+CREATE_TABLE_SQL = CREATE_DIM_SQL + f"""
+IF OBJECT_ID('dbo.PrecoSojaFato','U') IS NULL
+  CREATE TABLE dbo.PrecoSojaFato({FACT_COLUMNS_SQL}
+    CONSTRAINT PK_PrecoSojaFato PRIMARY KEY([data],[produto],[praca_id],[fonte])
+  );
+"""
+
+# Modo columnstore (--schema columnstore, SQL Server 2016 SP1+): fato particionado por mês
+# (RANGE RIGHT no 1o dia de cada mês) com índice columnstore clusterizado; a PK vira um
+# índice não clusterizado alinhado às partições (é ela que o MERGE usa). Consultas por
+# período leem só as partições do período, e agregações (média mensal por UF) rodam em
+# modo batch sobre colunas comprimidas. As fronteiras são criadas em Python
+# (_ensure_partitions) sempre um mês à frente da maior data: a partição do fim fica vazia e
+# o SPLIT não move dados (columnstore não aceita SPLIT de partição com linhas).
+PARTITION_FUNCTION = "pf_PrecoSojaFato_mes"
+PARTITION_SCHEME = "ps_PrecoSojaFato_mes"
+
+CREATE_FACT_COLUMNSTORE_SQL = f"""
+IF OBJECT_ID('dbo.PrecoSojaFato','U') IS NULL
+BEGIN
+  CREATE TABLE dbo.PrecoSojaFato({FACT_COLUMNS_SQL}
+    CONSTRAINT PK_PrecoSojaFato PRIMARY KEY NONCLUSTERED([data],[produto],[praca_id],[fonte])
+      ON {PARTITION_SCHEME}([data])
+  ) ON {PARTITION_SCHEME}([data]);
+  CREATE CLUSTERED COLUMNSTORE INDEX CCI_PrecoSojaFato ON dbo.PrecoSojaFato ON {PARTITION_SCHEME}([data]);
+END
+"""
+
+# fato já existente em rowstore (PK clusterizada): troca pela organização columnstore
+CONVERT_COLUMNSTORE_SQL = f"""
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE object_id = OBJECT_ID('dbo.PrecoSojaFato') AND type = 5)
+BEGIN
+  ALTER TABLE dbo.PrecoSojaFato DROP CONSTRAINT PK_PrecoSojaFato;
+  CREATE CLUSTERED COLUMNSTORE INDEX CCI_PrecoSojaFato ON dbo.PrecoSojaFato ON {PARTITION_SCHEME}([data]);
+  ALTER TABLE dbo.PrecoSojaFato ADD CONSTRAINT PK_PrecoSojaFato
+    PRIMARY KEY NONCLUSTERED([data],[produto],[praca_id],[fonte]) ON {PARTITION_SCHEME}([data]);
+END
+"""
+
+# Fato criado antes da fonte na chave: refaz a PK com [fonte] (mesma organização de antes,
+# clusterizada no rowstore ou alinhada às partições no columnstore). O resumo e as views
+# que dependem dele são recriados por produto + praça + fonte (CREATE_SUMMARY_SQL, logo depois).
+MIGRATE_FONTE_SQL = f"""
+IF NOT EXISTS (
+  SELECT 1 FROM sys.indexes AS I
+  JOIN sys.index_columns AS IC ON IC.object_id = I.object_id AND IC.index_id = I.index_id
+  WHERE I.object_id = OBJECT_ID('dbo.PrecoSojaFato') AND I.is_primary_key = 1
+    AND COL_NAME(IC.object_id, IC.column_id) = 'fonte')
+BEGIN
+  ALTER TABLE dbo.PrecoSojaFato DROP CONSTRAINT PK_PrecoSojaFato;
+  IF EXISTS (SELECT 1 FROM sys.indexes WHERE object_id = OBJECT_ID('dbo.PrecoSojaFato') AND type = 5)
+    EXEC(N'ALTER TABLE dbo.PrecoSojaFato ADD CONSTRAINT PK_PrecoSojaFato
+           PRIMARY KEY NONCLUSTERED([data],[produto],[praca_id],[fonte]) ON {PARTITION_SCHEME}([data]);');
+  ELSE
+    ALTER TABLE dbo.PrecoSojaFato ADD CONSTRAINT PK_PrecoSojaFato PRIMARY KEY([data],[produto],[praca_id],[fonte]);
+END
+IF OBJECT_ID('dbo.PrecoSojaUltimo','U') IS NOT NULL AND COL_LENGTH('dbo.PrecoSojaUltimo', 'fonte') IS NULL
+BEGIN
+  IF OBJECT_ID('dbo.PrecoUltimo') IS NOT NULL DROP VIEW dbo.PrecoUltimo;
+  DROP TABLE dbo.PrecoSojaUltimo;
+END
+IF OBJECT_ID('dbo.PrecoMensalUF') IS NOT NULL AND COL_LENGTH('dbo.PrecoMensalUF', 'fonte') IS NULL
+  DROP VIEW dbo.PrecoMensalUF;
+"""
+
+PARTITION_BOUNDS_SQL = (
+    "SELECT CAST(MAX(V.[value]) AS date) FROM sys.partition_range_values AS V "
+    "JOIN sys.partition_functions AS F ON F.function_id = V.function_id WHERE F.name = ?"
+)
+
+# Última cotação de cada praça (produto + praca_id + fonte), mantida pela carga: os painéis leem
+# dbo.PrecoUltimo sem varrer o histórico. Indexed view não serve (não aceita MAX/TOP/
+# ROW_NUMBER), então é uma tabela atualizada a partir do #stg no mesmo lote/transação do
+# MERGE do fato: linha do #stg com data >= a guardada substitui a guardada.
+CREATE_SUMMARY_SQL = r"""
+IF OBJECT_ID('dbo.PrecoSojaUltimo','U') IS NULL
+BEGIN
+  CREATE TABLE dbo.PrecoSojaUltimo(
+    [produto] varchar(20) NOT NULL,
+    [praca_id] smallint NOT NULL CONSTRAINT FK_PrecoSojaUltimo_praca REFERENCES dbo.DimPraca([praca_id]),
+    [data] date NOT NULL,
+    [compra_rs_sc] decimal(10,2) NOT NULL,
+    [var_dia_pct]  decimal(6,2) NULL,
+    [var_sem_pct]  decimal(6,2) NULL,
+    [var_mes_pct]  decimal(6,2) NULL,
+    [fonte] nvarchar(100) NOT NULL,
+    [load_ts] datetime2(0) NOT NULL CONSTRAINT DF_PrecoSojaUltimo_load DEFAULT(SYSUTCDATETIME()),
+    CONSTRAINT PK_PrecoSojaUltimo PRIMARY KEY([produto],[praca_id],[fonte])
+  );
+  -- banco com histórico: uma varredura só, na criação
+  INSERT INTO dbo.PrecoSojaUltimo([produto],[praca_id],[data],[compra_rs_sc],[var_dia_pct],[var_sem_pct],[var_mes_pct],
+                                  [fonte])
+  SELECT [produto],[praca_id],[data],[compra_rs_sc],[var_dia_pct],[var_sem_pct],[var_mes_pct],[fonte]
+  FROM (SELECT F.*, ROW_NUMBER() OVER (PARTITION BY F.[produto], F.[praca_id], F.[fonte] ORDER BY F.[data] DESC) AS rn
+        FROM dbo.PrecoSojaFato AS F) AS X
+  WHERE X.rn = 1;
+END
+IF OBJECT_ID('dbo.PrecoUltimo') IS NULL
+  EXEC(N'CREATE VIEW dbo.PrecoUltimo AS
+    SELECT U.[produto], D.[uf], D.[praca], U.[data], U.[compra_rs_sc], U.[var_dia_pct], U.[var_sem_pct],
+           U.[var_mes_pct], U.[fonte], U.[load_ts], U.[praca_id]
+    FROM dbo.PrecoSojaUltimo AS U JOIN dbo.DimPraca AS D ON D.[praca_id] = U.[praca_id];');
+IF OBJECT_ID('dbo.PrecoMensalUF') IS NULL
+  EXEC(N'CREATE VIEW dbo.PrecoMensalUF AS
+    SELECT DATEFROMPARTS(YEAR(F.[data]), MONTH(F.[data]), 1) AS [mes], F.[produto], D.[uf], F.[fonte],
+           AVG(F.[compra_rs_sc]) AS [compra_media], MIN(F.[compra_rs_sc]) AS [compra_min],
+           MAX(F.[compra_rs_sc]) AS [compra_max], COUNT_BIG(*) AS [cotacoes]
+    FROM dbo.PrecoSojaFato AS F JOIN dbo.DimPraca AS D ON D.[praca_id] = F.[praca_id]
+    GROUP BY DATEFROMPARTS(YEAR(F.[data]), MONTH(F.[data]), 1), F.[produto], D.[uf], F.[fonte];');
+"""
+
+# roda depois do MERGE_SQL, com o mesmo #stg (a DimPraca já tem todas as praças do lote)
+SUMMARY_MERGE_SQL = r"""
+MERGE dbo.PrecoSojaUltimo AS T
+USING (
+  SELECT [produto],[praca_id],[data],[compra_rs_sc],[var_dia_pct],[var_sem_pct],[var_mes_pct],[fonte]
+  FROM (SELECT S.*, D.[praca_id],
+               ROW_NUMBER() OVER (PARTITION BY S.[produto], D.[praca_id], S.[fonte] ORDER BY S.[data] DESC) AS rn
+        FROM #stg AS S JOIN dbo.DimPraca AS D ON D.[uf]=S.[uf] AND D.[chave]=S.[chave]) AS X
+  WHERE X.rn = 1
+) AS S
+  ON T.[produto]=S.[produto] AND T.[praca_id]=S.[praca_id] AND T.[fonte]=S.[fonte]
+WHEN MATCHED AND S.[data] >= T.[data] AND (
+  S.[data]<>T.[data] OR
+  T.[compra_rs_sc]<>S.[compra_rs_sc] OR
+  ISNULL(T.[var_dia_pct],-999)<>ISNULL(S.[var_dia_pct],-999) OR
+  ISNULL(T.[var_sem_pct],-999)<>ISNULL(S.[var_sem_pct],-999) OR
+  ISNULL(T.[var_mes_pct],-999)<>ISNULL(S.[var_mes_pct],-999)
+) THEN UPDATE SET
+  T.[data]=S.[data],
+  T.[compra_rs_sc]=S.[compra_rs_sc],
+  T.[var_dia_pct]=S.[var_dia_pct],
+  T.[var_sem_pct]=S.[var_sem_pct],
+  T.[var_mes_pct]=S.[var_mes_pct],
+  T.[load_ts]=SYSUTCDATETIME()
+WHEN NOT MATCHED BY TARGET THEN
+  INSERT([produto],[praca_id],[data],[compra_rs_sc],[var_dia_pct],[var_sem_pct],[var_mes_pct],[fonte])
+  VALUES(S.[produto],S.[praca_id],S.[data],S.[compra_rs_sc],S.[var_dia_pct],S.[var_sem_pct],S.[var_mes_pct],S.[fonte]);
+"""
+
+SCHEMAS = ("rowstore", "columnstore")
+
+# Depois da migração (ou num banco novo) dbo.PrecoSoja é esta view
+CREATE_VIEW_SQL = r"""
+IF OBJECT_ID('dbo.PrecoSoja') IS NULL
+  EXEC(N'CREATE VIEW dbo.PrecoSoja AS
+    SELECT F.[data], F.[produto], D.[uf], D.[praca], F.[compra_rs_sc], F.[var_dia_pct], F.[var_sem_pct],
+           F.[var_mes_pct], F.[fonte], F.[load_ts], F.[praca_id]
+    FROM dbo.PrecoSojaFato AS F JOIN dbo.DimPraca AS D ON D.[praca_id] = F.[praca_id];');
+"""
+
+# Tabelas criadas antes da coleta multi-commodity: adiciona [produto] (linhas antigas = soja)
+# e refaz a PK com o produto na chave. EXEC() porque a coluna ainda não existe na compilação.
+MIGRATE_PRODUTO_SQL = r"""
+IF OBJECT_ID('dbo.PrecoSoja','U') IS NOT NULL AND COL_LENGTH('dbo.PrecoSoja', 'produto') IS NULL
+BEGIN
+  ALTER TABLE dbo.PrecoSoja ADD [produto] varchar(20) NOT NULL
+    CONSTRAINT DF_PrecoSoja_produto DEFAULT('soja');
+  ALTER TABLE dbo.PrecoSoja DROP CONSTRAINT PK_PrecoSoja;
+  EXEC(N'ALTER TABLE dbo.PrecoSoja ADD CONSTRAINT PK_PrecoSoja PRIMARY KEY([data],[produto],[uf],[praca]);');
+END
+"""
+
+# dbo.PrecoSoja ainda tabela (uf + praca na PK) -> DimPraca + PrecoSojaFato. O #mapa
+# (grafia antiga -> nome/chave canônicos) é montado em Python com a mesma regra da carga.
+# Grafias que caem na mesma praça no mesmo dia: fica a linha carregada por último.
+# A tabela antiga é renomeada (não apagada) para PrecoSoja_pre_dim.
+CREATE_MAP_SQL = r"""
+IF OBJECT_ID('tempdb..#mapa') IS NOT NULL DROP TABLE #mapa;
+CREATE TABLE #mapa(
+  [uf] char(2) COLLATE DATABASE_DEFAULT NOT NULL,
+  [praca] nvarchar(120) COLLATE DATABASE_DEFAULT NOT NULL,
+  [nome] nvarchar(120) COLLATE DATABASE_DEFAULT NOT NULL,
+  [chave] nvarchar(120) COLLATE DATABASE_DEFAULT NOT NULL
+);
+"""
+
+MIGRATE_PRACA_SQL = r"""
+INSERT INTO dbo.DimPraca([uf],[praca],[chave])
+SELECT M.[uf], MIN(M.[nome]), M.[chave] FROM #mapa AS M
+WHERE NOT EXISTS (SELECT 1 FROM dbo.DimPraca AS D WHERE D.[uf]=M.[uf] AND D.[chave]=M.[chave])
+GROUP BY M.[uf], M.[chave];
+
+INSERT INTO dbo.PrecoSojaFato([data],[produto],[praca_id],[compra_rs_sc],[var_dia_pct],[var_sem_pct],
+                              [var_mes_pct],[fonte],[load_ts])
+SELECT [data],[produto],[praca_id],[compra_rs_sc],[var_dia_pct],[var_sem_pct],[var_mes_pct],[fonte],[load_ts]
+FROM (
+  SELECT P.[data], P.[produto], D.[praca_id], P.[compra_rs_sc], P.[var_dia_pct], P.[var_sem_pct],
+         P.[var_mes_pct], P.[fonte], P.[load_ts],
+         ROW_NUMBER() OVER (PARTITION BY P.[data], P.[produto], D.[praca_id] ORDER BY P.[load_ts] DESC) AS rn
+  FROM dbo.PrecoSoja AS P
+  JOIN #mapa AS M ON M.[uf]=P.[uf] AND M.[praca]=P.[praca]
+  JOIN dbo.DimPraca AS D ON D.[uf]=M.[uf] AND D.[chave]=M.[chave]
+) AS X
+WHERE X.rn = 1;
+"""
+
+# linhas antigas, linhas no fato, grafias, praças
+MIGRATE_COUNT_SQL = (
+    "SELECT (SELECT COUNT(*) FROM dbo.PrecoSoja), (SELECT COUNT(*) FROM dbo.PrecoSojaFato), "
+    "(SELECT COUNT(*) FROM #mapa), (SELECT COUNT(*) FROM dbo.DimPraca)"
+)
+
+RENAME_OLD_SQL = "EXEC sp_rename 'dbo.PrecoSoja', 'PrecoSoja_pre_dim';"
+
+# [chave] = agrural_praca.fold(praca), calculada em Python; o #stg fica no tempdb, daí o COLLATE
+STG_COLUMNS_SQL = r"""
+    [data] date NOT NULL,
+    [produto] varchar(20) COLLATE DATABASE_DEFAULT NOT NULL,
+    [uf]   char(2) COLLATE DATABASE_DEFAULT NOT NULL,
+    [praca] nvarchar(120) COLLATE DATABASE_DEFAULT NOT NULL,
+    [chave] nvarchar(120) COLLATE DATABASE_DEFAULT NOT NULL,
+    [compra_rs_sc] decimal(10,2) NOT NULL,
+    [var_dia_pct]  decimal(6,2) NULL,
+    [var_sem_pct]  decimal(6,2) NULL,
+    [var_mes_pct]  decimal(6,2) NULL,
+    [fonte] nvarchar(100) COLLATE DATABASE_DEFAULT NOT NULL
+"""
+
+CREATE_STG_SQL = f"""
+IF OBJECT_ID('tempdb..#stg') IS NOT NULL DROP TABLE #stg;
+CREATE TABLE #stg ({STG_COLUMNS_SQL});
+"""
+
+STG_INSERT_SQL = (
+    "INSERT INTO #stg ([data],[produto],[uf],[praca],[chave],[compra_rs_sc],[var_dia_pct],[var_sem_pct],"
+    "[var_mes_pct],[fonte]) VALUES (?,?,?,?,?,?,?,?,?,?)"
+)
+
+# Table-valued parameter: o lote inteiro vai em um único parâmetro (uma ida ao servidor).
+# A procedure só copia o TVP para o #stg da sessão; o MERGE é o mesmo das outras estratégias.
+# Tipo de versões anteriores (sem [chave] ou sem [fonte]) é recriado junto com a procedure.
+CREATE_TVP_SQL = f"""
+IF TYPE_ID('dbo.PrecoSojaTipo') IS NOT NULL AND NOT EXISTS (
+  SELECT 1 FROM sys.table_types AS TT JOIN sys.columns AS C ON C.object_id = TT.type_table_object_id
+  WHERE TT.name = 'PrecoSojaTipo' AND C.name = 'fonte')
+BEGIN
+  IF OBJECT_ID('dbo.usp_PrecoSoja_Stage', 'P') IS NOT NULL DROP PROCEDURE dbo.usp_PrecoSoja_Stage;
+  DROP TYPE dbo.PrecoSojaTipo;
+END
+IF TYPE_ID('dbo.PrecoSojaTipo') IS NULL
+  CREATE TYPE dbo.PrecoSojaTipo AS TABLE ({STG_COLUMNS_SQL});
+IF OBJECT_ID('dbo.usp_PrecoSoja_Stage', 'P') IS NULL
+  EXEC(N'CREATE PROCEDURE dbo.usp_PrecoSoja_Stage @linhas dbo.PrecoSojaTipo READONLY AS
+         INSERT INTO #stg SELECT * FROM @linhas;');
+"""
+
+# Praça nova entra na DimPraca (com a grafia do lote) e o MERGE compara só (data, produto, praca_id, fonte):
+# uma fonte nunca sobrescreve o preço de outra
+MERGE_SQL = r"""
+INSERT INTO dbo.DimPraca([uf],[praca],[chave])
+SELECT S.[uf], MIN(S.[praca]), S.[chave] FROM #stg AS S
+WHERE NOT EXISTS (SELECT 1 FROM dbo.DimPraca AS D WITH (UPDLOCK, HOLDLOCK)
+                  WHERE D.[uf]=S.[uf] AND D.[chave]=S.[chave])
+GROUP BY S.[uf], S.[chave];
+
+MERGE dbo.PrecoSojaFato AS T
+USING (SELECT S.*, D.[praca_id] FROM #stg AS S
+       JOIN dbo.DimPraca AS D ON D.[uf]=S.[uf] AND D.[chave]=S.[chave]) AS S
+  ON T.[data]=S.[data] AND T.[produto]=S.[produto] AND T.[praca_id]=S.[praca_id] AND T.[fonte]=S.[fonte]
+WHEN MATCHED AND (
+  ISNULL(T.[compra_rs_sc],-1)<>ISNULL(S.[compra_rs_sc],-1) OR
+  ISNULL(T.[var_dia_pct],-999)<>ISNULL(S.[var_dia_pct],-999) OR
+  ISNULL(T.[var_sem_pct],-999)<>ISNULL(S.[var_sem_pct],-999) OR
+  ISNULL(T.[var_mes_pct],-999)<>ISNULL(S.[var_mes_pct],-999)
+) THEN UPDATE SET
+  T.[compra_rs_sc]=S.[compra_rs_sc],
+  T.[var_dia_pct]=S.[var_dia_pct],
+  T.[var_sem_pct]=S.[var_sem_pct],
+  T.[var_mes_pct]=S.[var_mes_pct],
+  T.[load_ts]=SYSUTCDATETIME()
+WHEN NOT MATCHED BY TARGET THEN
+  INSERT([data],[produto],[praca_id],[compra_rs_sc],[var_dia_pct],[var_sem_pct],[var_mes_pct],[fonte])
+  VALUES(S.[data],S.[produto],S.[praca_id],S.[compra_rs_sc],S.[var_dia_pct],S.[var_sem_pct],S.[var_mes_pct],
+         S.[fonte]);
+"""
+
+MAX_DATE_SQL = (
+    "IF OBJECT_ID('dbo.PrecoSojaFato','U') IS NOT NULL SELECT MAX([data]) FROM dbo.PrecoSojaFato "
+    "ELSE IF OBJECT_ID('dbo.PrecoSoja','U') IS NOT NULL SELECT MAX([data]) FROM dbo.PrecoSoja "
+    "ELSE SELECT NULL"
+)
+
+# Marca d'água da carga (uma linha por fonte): maior data da fonte no banco e o snapshot (hash do
+# conjunto de fingerprints) da última carga incremental. Atualizada na mesma transação do
+# MERGE; carga sem snapshot (backfill) grava NULL e invalida o fingerprint local.
+CREATE_WATERMARK_SQL = r"""
+IF OBJECT_ID('dbo.PrecoSojaCarga','U') IS NULL
+  CREATE TABLE dbo.PrecoSojaCarga(
+    [fonte] nvarchar(100) NOT NULL CONSTRAINT PK_PrecoSojaCarga PRIMARY KEY,
+    [max_data] date NULL,
+    [snapshot] char(32) NULL,
+    [linhas] int NOT NULL,
+    [load_ts] datetime2(0) NOT NULL CONSTRAINT DF_PrecoSojaCarga_load DEFAULT(SYSUTCDATETIME())
+  );
+"""
+
+WATERMARK_SQL = (
+    "IF OBJECT_ID('dbo.PrecoSojaCarga','U') IS NOT NULL "
+    "SELECT [max_data],[snapshot] FROM dbo.PrecoSojaCarga WHERE [fonte]=? "
+    "ELSE SELECT TOP 0 NULL, NULL"
+)
+
+# linha da fonte lida na transação da carga, antes e depois do WATERMARK_UPSERT_SQL (vai no
+# aviso à API: LoadResult.watermark); UPDLOCK segura a linha até o commit
+WATERMARK_ROW_SQL = (
+    "SELECT [max_data],[snapshot],[linhas],[load_ts] FROM dbo.PrecoSojaCarga WITH (UPDLOCK, HOLDLOCK) "
+    "WHERE [fonte]=?"
+)
+
+# parâmetros: fonte, snapshot, linhas. MAX([data]) da fonte lê a PK de trás para frente
+# (data é a 1a coluna) até a 1a linha da fonte, não o fato inteiro
+WATERMARK_UPSERT_SQL = r"""
+MERGE dbo.PrecoSojaCarga AS T
+USING (SELECT P.[fonte], (SELECT MAX(F.[data]) FROM dbo.PrecoSojaFato AS F WHERE F.[fonte]=P.[fonte]) AS [max_data],
+              P.[snapshot], P.[linhas]
+       FROM (SELECT CAST(? AS nvarchar(100)) AS [fonte], CAST(? AS char(32)) AS [snapshot],
+                    CAST(? AS int) AS [linhas]) AS P) AS S
+  ON T.[fonte]=S.[fonte]
+WHEN MATCHED THEN UPDATE SET
+  T.[max_data]=S.[max_data], T.[snapshot]=S.[snapshot], T.[linhas]=S.[linhas], T.[load_ts]=SYSUTCDATETIME()
+WHEN NOT MATCHED THEN
+  INSERT([fonte],[max_data],[snapshot],[linhas]) VALUES(S.[fonte],S.[max_data],S.[snapshot],S.[linhas]);
+"""
+
+# ----------- SQLite (stand-in local) -----------
+# mesmo desenho do SQL Server: DimPraca + PrecoSojaFato e a view PrecoSoja
+SQLITE_CREATE_SQL = """
+CREATE TABLE IF NOT EXISTS DimPraca(
+  praca_id INTEGER PRIMARY KEY,
+  uf char(2) NOT NULL,
+  praca nvarchar(120) NOT NULL,
+  chave nvarchar(120) NOT NULL,
+  UNIQUE(uf, chave)
+);
+CREATE TABLE IF NOT EXISTS PrecoSojaFato(
+  data date NOT NULL,
+  produto varchar(20) NOT NULL DEFAULT 'soja',
+  praca_id smallint NOT NULL REFERENCES DimPraca(praca_id),
+  compra_rs_sc decimal(10,2) NOT NULL,
+  var_dia_pct decimal(6,2),
+  var_sem_pct decimal(6,2),
+  var_mes_pct decimal(6,2),
+  fonte nvarchar(100) NOT NULL DEFAULT 'AgRural',
+  load_ts datetime NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY(data, produto, praca_id, fonte)
+);
+"""
+
+SQLITE_VIEW_SQL = """
+CREATE VIEW IF NOT EXISTS PrecoSoja AS
+SELECT F.data, F.produto, D.uf, D.praca, F.compra_rs_sc, F.var_dia_pct, F.var_sem_pct, F.var_mes_pct,
+       F.fonte, F.load_ts, F.praca_id
+FROM PrecoSojaFato AS F JOIN DimPraca AS D ON D.praca_id = F.praca_id;
+"""
+
+# PrecoSoja ainda tabela (versões anteriores): mesma migração do SQL Server, via temp.mapa
+SQLITE_MIGRATE_PRACA_SQL = """
+INSERT INTO PrecoSojaFato(data, produto, praca_id, compra_rs_sc, var_dia_pct, var_sem_pct, var_mes_pct, fonte,
+                          load_ts)
+SELECT data, produto, praca_id, compra_rs_sc, var_dia_pct, var_sem_pct, var_mes_pct, fonte, load_ts
+FROM (
+  SELECT P.*, M.praca_id AS praca_id,
+         ROW_NUMBER() OVER (PARTITION BY P.data, P.produto, M.praca_id ORDER BY P.load_ts DESC) AS rn
+  FROM PrecoSoja AS P JOIN temp.mapa AS M ON M.uf = P.uf AND M.praca = P.praca
+)
+WHERE rn = 1
+"""
+
+# PrecoSojaFato criado antes da fonte na chave: SQLite não altera PK, então a tabela é
+# refeita (as views e o resumo que dependem dela são recriados em connection())
+SQLITE_MIGRATE_FONTE_SQL = f"""
+BEGIN;
+DROP VIEW IF EXISTS PrecoSoja;
+DROP VIEW IF EXISTS PrecoUltimo;
+DROP VIEW IF EXISTS PrecoMensalUF;
+DROP TABLE IF EXISTS PrecoSojaUltimo;
+ALTER TABLE PrecoSojaFato RENAME TO PrecoSojaFato_pre_fonte;
+{SQLITE_CREATE_SQL}
+INSERT INTO PrecoSojaFato SELECT * FROM PrecoSojaFato_pre_fonte;
+DROP TABLE PrecoSojaFato_pre_fonte;
+COMMIT;
+"""
+
+# mesma semântica do MERGE: insere o novo, atualiza (e renova load_ts) só o que mudou
+SQLITE_UPSERT_SQL = """
+INSERT INTO PrecoSojaFato(data, produto, praca_id, compra_rs_sc, var_dia_pct, var_sem_pct, var_mes_pct, fonte)
+VALUES (?,?,?,?,?,?,?,?)
+ON CONFLICT(data, produto, praca_id, fonte) DO UPDATE SET
+  compra_rs_sc=excluded.compra_rs_sc,
+  var_dia_pct=excluded.var_dia_pct,
+  var_sem_pct=excluded.var_sem_pct,
+  var_mes_pct=excluded.var_mes_pct,
+  load_ts=CURRENT_TIMESTAMP
+WHERE compra_rs_sc IS NOT excluded.compra_rs_sc
+   OR var_dia_pct IS NOT excluded.var_dia_pct
+   OR var_sem_pct IS NOT excluded.var_sem_pct
+   OR var_mes_pct IS NOT excluded.var_mes_pct;
+"""
+
+# última cotação por praça, como dbo.PrecoSojaUltimo
+SQLITE_SUMMARY_CREATE_SQL = """
+CREATE TABLE IF NOT EXISTS PrecoSojaUltimo(
+  produto varchar(20) NOT NULL,
+  praca_id smallint NOT NULL REFERENCES DimPraca(praca_id),
+  data date NOT NULL,
+  compra_rs_sc decimal(10,2) NOT NULL,
+  var_dia_pct decimal(6,2),
+  var_sem_pct decimal(6,2),
+  var_mes_pct decimal(6,2),
+  fonte nvarchar(100) NOT NULL,
+  load_ts datetime NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY(produto, praca_id, fonte)
+);
+CREATE VIEW IF NOT EXISTS PrecoUltimo AS
+SELECT U.produto, D.uf, D.praca, U.data, U.compra_rs_sc, U.var_dia_pct, U.var_sem_pct, U.var_mes_pct,
+       U.fonte, U.load_ts, U.praca_id
+FROM PrecoSojaUltimo AS U JOIN DimPraca AS D ON D.praca_id = U.praca_id;
+CREATE VIEW IF NOT EXISTS PrecoMensalUF AS
+SELECT date(F.data, 'start of month') AS mes, F.produto, D.uf, F.fonte, AVG(F.compra_rs_sc) AS compra_media,
+       MIN(F.compra_rs_sc) AS compra_min, MAX(F.compra_rs_sc) AS compra_max, COUNT(*) AS cotacoes
+FROM PrecoSojaFato AS F JOIN DimPraca AS D ON D.praca_id = F.praca_id
+GROUP BY 1, F.produto, D.uf, F.fonte;
+"""
+
+SQLITE_SUMMARY_FILL_SQL = """
+INSERT INTO PrecoSojaUltimo(produto, praca_id, data, compra_rs_sc, var_dia_pct, var_sem_pct, var_mes_pct, fonte)
+SELECT produto, praca_id, data, compra_rs_sc, var_dia_pct, var_sem_pct, var_mes_pct, fonte
+FROM (SELECT F.*, ROW_NUMBER() OVER (PARTITION BY produto, praca_id, fonte ORDER BY data DESC) AS rn
+      FROM PrecoSojaFato AS F)
+WHERE rn = 1
+"""
+
+# mesmos parâmetros do SQLITE_UPSERT_SQL; linha mais antiga que a guardada não muda nada
+SQLITE_SUMMARY_UPSERT_SQL = """
+INSERT INTO PrecoSojaUltimo(data, produto, praca_id, compra_rs_sc, var_dia_pct, var_sem_pct, var_mes_pct, fonte)
+VALUES (?,?,?,?,?,?,?,?)
+ON CONFLICT(produto, praca_id, fonte) DO UPDATE SET
+  data=excluded.data,
+  compra_rs_sc=excluded.compra_rs_sc,
+  var_dia_pct=excluded.var_dia_pct,
+  var_sem_pct=excluded.var_sem_pct,
+  var_mes_pct=excluded.var_mes_pct,
+  load_ts=CURRENT_TIMESTAMP
+WHERE excluded.data >= data
+  AND (excluded.data > data
+       OR compra_rs_sc IS NOT excluded.compra_rs_sc
+       OR var_dia_pct IS NOT excluded.var_dia_pct
+       OR var_sem_pct IS NOT excluded.var_sem_pct
+       OR var_mes_pct IS NOT excluded.var_mes_pct);
+"""
+
+SQLITE_WATERMARK_CREATE_SQL = """
+CREATE TABLE IF NOT EXISTS PrecoSojaCarga(
+  fonte nvarchar(100) NOT NULL PRIMARY KEY,
+  max_data date,
+  snapshot char(32),
+  linhas int NOT NULL,
+  load_ts datetime NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+SQLITE_WATERMARK_ROW_SQL = "SELECT max_data, snapshot, linhas, load_ts FROM PrecoSojaCarga WHERE fonte=?"
+
+# parâmetros: fonte, fonte, snapshot, linhas
+SQLITE_WATERMARK_UPSERT_SQL = """
+INSERT INTO PrecoSojaCarga(fonte, max_data, snapshot, linhas)
+VALUES (?, (SELECT MAX(data) FROM PrecoSojaFato WHERE fonte = ?), ?, ?)
+ON CONFLICT(fonte) DO UPDATE SET
+  max_data=excluded.max_data, snapshot=excluded.snapshot, linhas=excluded.linhas, load_ts=CURRENT_TIMESTAMP;
+"""
+
+SINKS = ("sqlserver", "sqlite")
+SQLSERVER_STRATEGIES = ("executemany", "tvp", "bulk")
+
+
+class LoadResult:
+
+    def __init__(self, sink: str, strategy: str, rows: int, seconds: float, por_produto: Counter,
+                 watermark: Optional[Tuple[Optional[Tuple], Optional[Tuple]]] = None):
+        self.sink = sink
+        self.strategy = strategy
+        self.rows = rows
+        self.seconds = seconds
+        self.por_produto = por_produto
+        # (antes, depois): linha da PrecoSojaCarga (max_data, snapshot, linhas, load_ts) lida
+        # na transação da carga; a API de leitura usa para saber se outra carga passou no meio
+        self.watermark = watermark
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else float("inf")
+
+    def __str__(self) -> str:
+        resumo = ", ".join(f"{k}={v}" for k, v in self.por_produto.items())
+        return (f"Upsert concluído ({self.sink}/{self.strategy}): {self.rows} linhas processadas ({resumo}) "
+                f"em {self.seconds:.2f}s, {self.rows_per_sec:,.0f} linhas/s.")
+
+
+# Destino de carga: max_date() para o "sem novidades" e load() para o upsert idempotente.
+# A conexão é aberta na 1a chamada e reaproveitada até close().
+class Sink:
+    name = "base"
+    strategy = "-"
+    canon = PracaCanon()  # nome canônico das praças (apelidos: make_sink(aliases=...))
+
+    def watermark(self, fonte: str = FONTE) -> Optional[Tuple[Optional[str], Optional[str]]]:
+        # (maior data da fonte, snapshot da última carga incremental) ou None se ainda não existe
+        raise NotImplementedError
+
+    def _scan_max_date(self) -> Optional[str]:
+        raise NotImplementedError
+
+    def max_date(self) -> Optional[str]:
+        wm = self.watermark()
+        if wm and wm[0]:
+            return wm[0]
+        # bancos carregados antes da marca d'água
+        return self._scan_max_date()
+
+    def _load(self, batch: PriceBatch, batch_size: Optional[int], snapshot: Optional[str],
+              fonte: str) -> Tuple[Optional[Tuple], Optional[Tuple]]:
+        # grava e devolve a marca d'água da fonte (antes, depois), lida na transação da carga
+        raise NotImplementedError
+
+    def load(self, batch: PriceBatch, batch_size: Optional[int] = None,
+             snapshot: Optional[str] = None, fonte: str = FONTE) -> Optional[LoadResult]:
+        if not len(batch):
+            print("Nenhuma linha para inserir/atualizar.")
+            return None
+        t0 = time.perf_counter()
+        batch, merged = self.canon.apply(batch)
+        if merged:
+            print(f"Praças: {merged} linhas com outra grafia da mesma praça no lote descartadas (vale a 1a).")
+        METRICS.count("rows_praca_merged", merged)
+        watermark = self._load(batch, batch_size, snapshot, fonte)
+        result = LoadResult(self.name, self.strategy, len(batch), time.perf_counter() - t0,
+                            Counter(batch.text["produto"].tolist()), watermark)
+        print(result)
+        return result
+
+    def validate(self) -> None:
+        # processos longos (daemon): confere a conexão antes de cada ciclo
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def month_bounds(lo: str, hi: str) -> List[str]:
+    # 1o dia de cada mês, do mês de `lo` até o mês seguinte ao de `hi` ("AAAA-MM-DD")
+    y, m = int(lo[:4]), int(lo[5:7])
+    ey, em = int(hi[:4]), int(hi[5:7])
+    end = (ey + 1, 1) if em == 12 else (ey, em + 1)
+    out = []
+    while (y, m) <= end:
+        out.append(f"{y:04d}-{m:02d}-01")
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return out
+
+
+class SqlServerSink(Sink):
+    name = "sqlserver"
+
+    def __init__(self, conn_str: str, strategy: str = "executemany", bulk_dir: Optional[str] = None,
+                 canon: Optional[PracaCanon] = None, schema: str = "rowstore"):
+        if strategy not in SQLSERVER_STRATEGIES:
+            raise ValueError(f"Estratégia desconhecida: {strategy} (opções: {', '.join(SQLSERVER_STRATEGIES)})")
+        if schema not in SCHEMAS:
+            raise ValueError(f"Esquema desconhecido: {schema} (opções: {', '.join(SCHEMAS)})")
+        self.conn_str = conn_str
+        self.strategy = strategy
+        self.schema = schema
+        # BULK INSERT lê o arquivo do lado do servidor: com SQL Server remoto, use um
+        # compartilhamento (UNC) visível pelos dois lados
+        self.bulk_dir = bulk_dir
+        self.canon = canon or self.canon
+        self._cn = None
+
+    def connection(self):
+        if self._cn is None:
+            import pyodbc
+            # execute/executemany contam como ida ao banco nas métricas
+            self._cn = METRICS.counted(pyodbc.connect(self.conn_str))
+        return self._cn
+
+    def close(self) -> None:
+        if self._cn is not None:
+            try:
+                self._cn.close()
+            finally:
+                self._cn = None
+
+    def validate(self) -> None:
+        # conexão caída (restart do SQL Server, rede, timeout ocioso): descarta e
+        # deixa connection() reabrir na próxima chamada
+        if self._cn is None:
+            return
+        try:
+            self._cn.cursor().execute("SELECT 1").fetchone()
+        except Exception as e:
+            print(f"Conexão com o banco inválida ({type(e).__name__}); reconectando.")
+            try:
+                self._cn.close()
+            except Exception:
+                pass
+            self._cn = None
+
+    def watermark(self, fonte: str = FONTE) -> Optional[Tuple[Optional[str], Optional[str]]]:
+        cur = self.connection().cursor()
+        cur.execute(WATERMARK_SQL, fonte)
+        row = cur.fetchone()
+        if not row:
+            return None
+        return (row[0].isoformat() if row[0] else None), (row[1] or None)
+
+    def _scan_max_date(self) -> Optional[str]:
+        cur = self.connection().cursor()
+        cur.execute(MAX_DATE_SQL)
+        row = cur.fetchone()
+        return row[0].isoformat() if row and row[0] else None
+
+    def _load(self, batch: PriceBatch, batch_size: Optional[int], snapshot: Optional[str],
+              fonte: str) -> Tuple[Optional[Tuple], Optional[Tuple]]:
+        cn = self.connection()
+        try:
+            cn.autocommit = False
+            cur = cn.cursor()
+
+            # Decimal exato direto do lote colunar (centésimos), sem passar por float;
+            # a chave da praça e a fonte vão junto para o #stg (lookup na DimPraca do lado do servidor)
+            params = [p[:4] + (fold(p[3]),) + p[4:] + (fonte,) for p in batch.sql_params()]
+
+            cur.execute(MIGRATE_PRODUTO_SQL)
+            if self.schema == "columnstore":
+                dates = [p[0] for p in params]
+                self._ensure_partitions(cur, min(dates), max(dates))
+                cur.execute(CREATE_DIM_SQL)
+                cur.execute(CREATE_FACT_COLUMNSTORE_SQL)
+                cur.execute(CONVERT_COLUMNSTORE_SQL)
+            else:
+                cur.execute(CREATE_TABLE_SQL)
+            cur.execute("SELECT OBJECT_ID('dbo.PrecoSoja','U')")
+            if cur.fetchone()[0] is not None:
+                self._migrate_praca(cur)
+            cur.execute(MIGRATE_FONTE_SQL)
+            cur.execute(CREATE_VIEW_SQL)
+            cur.execute(CREATE_SUMMARY_SQL)
+            cur.execute(CREATE_WATERMARK_SQL)
+            cur.execute(CREATE_STG_SQL)
+            if self.strategy == "tvp":
+                cur.execute(CREATE_TVP_SQL)
+
+            # MERGE (todas as commodities no mesmo lote/transação) e, com o mesmo #stg, a
+            # última cotação por praça. Cargas grandes (backfill) vão em lotes de batch_size:
+            # stage -> MERGE -> commit -> TRUNCATE, um MERGE por lote.
+            step = batch_size or len(params)
+            for i in range(0, len(params), step):
+                self._stage(cur, params[i:i + step])
+                cur.execute(MERGE_SQL)
+                cur.execute(SUMMARY_MERGE_SQL)
+                if i + step >= len(params):
+                    before = cur.execute(WATERMARK_ROW_SQL, fonte).fetchone()
+                    cur.execute(WATERMARK_UPSERT_SQL, fonte, snapshot, len(params))
+                    after = cur.execute(WATERMARK_ROW_SQL, fonte).fetchone()
+                cn.commit()
+                if i + step < len(params):
+                    cur.execute("TRUNCATE TABLE #stg;")
+        except Exception:
+            cn.rollback()
+            raise
+        return (tuple(before) if before else None), (tuple(after) if after else None)
+
+    def _ensure_partitions(self, cur, lo: str, hi: str) -> None:
+        # fronteiras mensais até o mês seguinte ao da maior data do lote (partição do fim vazia)
+        cur.execute(PARTITION_BOUNDS_SQL, PARTITION_FUNCTION)
+        last = cur.fetchone()[0]
+        if last is None:
+            # 1a vez: cobre também o que já está gravado (fato em rowstore ou tabela antiga)
+            for table in ("dbo.PrecoSojaFato", "dbo.PrecoSoja"):
+                cur.execute(f"SELECT OBJECT_ID('{table}','U')")
+                if cur.fetchone()[0] is None:
+                    continue
+                cur.execute(f"SELECT MIN([data]), MAX([data]) FROM {table}")
+                a, b = cur.fetchone()
+                if a is not None:
+                    lo, hi = min(lo, a.isoformat()), max(hi, b.isoformat())
+            values = ", ".join(f"'{d}'" for d in month_bounds(lo, hi))
+            cur.execute(f"CREATE PARTITION FUNCTION {PARTITION_FUNCTION}(date) AS RANGE RIGHT FOR VALUES ({values});")
+            cur.execute(f"CREATE PARTITION SCHEME {PARTITION_SCHEME} AS PARTITION {PARTITION_FUNCTION} ALL TO ([PRIMARY]);")
+            return
+        for d in month_bounds(last.isoformat(), hi)[1:]:
+            cur.execute(f"ALTER PARTITION SCHEME {PARTITION_SCHEME} NEXT USED [PRIMARY];")
+            cur.execute(f"ALTER PARTITION FUNCTION {PARTITION_FUNCTION}() SPLIT RANGE ('{d}');")
+
+    def _migrate_praca(self, cur) -> None:
+        # dbo.PrecoSoja de versões anteriores -> DimPraca + PrecoSojaFato, na transação da carga
+        cur.execute("SELECT DISTINCT [uf],[praca] FROM dbo.PrecoSoja")
+        mapa = []
+        for uf, praca in cur.fetchall():
+            nome = self.canon.name(uf, praca)
+            mapa.append((uf, praca, nome, fold(nome)))
+        cur.execute(CREATE_MAP_SQL)
+        if mapa:
+            cur.executemany("INSERT INTO #mapa ([uf],[praca],[nome],[chave]) VALUES (?,?,?,?)", mapa)
+        cur.execute(MIGRATE_PRACA_SQL)
+        cur.execute(MIGRATE_COUNT_SQL)
+        antigas, novas, grafias, pracas = cur.fetchone()
+        cur.execute(RENAME_OLD_SQL)
+        cur.execute("DROP TABLE #mapa;")
+        print(f"Migração: {antigas} linhas de dbo.PrecoSoja -> dbo.PrecoSojaFato ({novas} linhas; "
+              f"{grafias} grafias -> {pracas} praças na dbo.DimPraca). Tabela antiga: dbo.PrecoSoja_pre_dim.")
+
+    def _stage(self, cur, params: List[Tuple]) -> None:
+        if self.strategy == "executemany":
+            try:
+                cur.fast_executemany = True
+            except AttributeError:
+                print("ATENCAO: driver sem fast_executemany; INSERT linha a linha.")
+            cur.executemany(STG_INSERT_SQL, params)
+        elif self.strategy == "tvp":
+            tvp = [(_date.fromisoformat(p[0]),) + tuple(p[1:]) for p in params]
+            cur.execute("{CALL dbo.usp_PrecoSoja_Stage (?)}", (tvp,))
+        else:
+            self._bulk_insert(cur, params)
+
+    def _bulk_insert(self, cur, params: List[Tuple]) -> None:
+        fd, path = tempfile.mkstemp(prefix="precosoja_", suffix=".csv", dir=self.bulk_dir)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+                w = csv.writer(f, lineterminator="\n")
+                w.writerows(["" if v is None else v for v in p] for p in params)
+            # FORMAT='CSV' exige SQL Server 2017+; campo vazio vira NULL com KEEPNULLS
+            cur.execute(
+                "BULK INSERT #stg FROM '{}' WITH (FORMAT='CSV', CODEPAGE='65001', "
+                "FIELDTERMINATOR=',', ROWTERMINATOR='0x0a', KEEPNULLS, TABLOCK);".format(path.replace("'", "''"))
+            )
+        finally:
+            os.remove(path)
+
+
+class SQLiteSink(Sink):
+    name = "sqlite"
+    strategy = "upsert"
+
+    def __init__(self, path: str = "soja_agrural.db", canon: Optional[PracaCanon] = None):
+        self.path = path
+        self.canon = canon or self.canon
+        self._cn = None
+
+    def connection(self) -> sqlite3.Connection:
+        if self._cn is None:
+            # o daemon reusa o sink e cada ciclo entrega o lote numa thread nova (agrural_fanout);
+            # uma thread por vez usa a conexão
+            self._cn = METRICS.counted(sqlite3.connect(self.path, check_same_thread=False))
+            self._cn.executescript(SQLITE_CREATE_SQL)
+            self._cn.execute(SQLITE_WATERMARK_CREATE_SQL)
+            if self._cn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='PrecoSoja'").fetchone():
+                self._migrate_praca(self._cn)
+            if not any(c[1] == "fonte" and c[5] for c in self._cn.execute("PRAGMA table_info(PrecoSojaFato)")):
+                self._cn.executescript(SQLITE_MIGRATE_FONTE_SQL)
+            self._cn.execute(SQLITE_VIEW_SQL)
+            novo = not self._cn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='PrecoSojaUltimo'").fetchone()
+            self._cn.executescript(SQLITE_SUMMARY_CREATE_SQL)
+            if novo:
+                with self._cn:
+                    self._cn.execute(SQLITE_SUMMARY_FILL_SQL)
+        return self._cn
+
+    def _praca_ids(self, cn, pracas: List[Tuple[str, str, str]]) -> dict:
+        # (uf, nome, chave) -> praca_id; praça nova entra com a grafia dada
+        cn.executemany("INSERT OR IGNORE INTO DimPraca(uf, praca, chave) VALUES (?,?,?)", pracas)
+        return {(uf, chave): i for i, uf, chave in cn.execute("SELECT praca_id, uf, chave FROM DimPraca")}
+
+    def _migrate_praca(self, cn) -> None:
+        pares = cn.execute("SELECT DISTINCT uf, praca FROM PrecoSoja").fetchall()
+        nomes = [self.canon.name(uf, praca) for uf, praca in pares]
+        with cn:
+            ids = self._praca_ids(cn, [(uf, n, fold(n)) for (uf, _), n in zip(pares, nomes)])
+            cn.execute("CREATE TEMP TABLE mapa(uf, praca, praca_id)")
+            cn.executemany("INSERT INTO temp.mapa VALUES (?,?,?)",
+                           [(uf, praca, ids[(uf, fold(n))]) for (uf, praca), n in zip(pares, nomes)])
+            cn.execute(SQLITE_MIGRATE_PRACA_SQL)
+            antigas = cn.execute("SELECT COUNT(*) FROM PrecoSoja").fetchone()[0]
+            novas = cn.execute("SELECT COUNT(*) FROM PrecoSojaFato").fetchone()[0]
+            cn.execute("ALTER TABLE PrecoSoja RENAME TO PrecoSoja_pre_dim")
+            cn.execute("DROP TABLE temp.mapa")
+        print(f"Migração: {antigas} linhas de PrecoSoja -> PrecoSojaFato ({novas} linhas; {len(pares)} grafias -> "
+              f"{len(set(ids.values()))} praças na DimPraca). Tabela antiga: PrecoSoja_pre_dim.")
+
+    def close(self) -> None:
+        if self._cn is not None:
+            self._cn.close()
+            self._cn = None
+
+    def watermark(self, fonte: str = FONTE) -> Optional[Tuple[Optional[str], Optional[str]]]:
+        row = self.connection().execute(
+            "SELECT max_data, snapshot FROM PrecoSojaCarga WHERE fonte=?", (fonte,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def _scan_max_date(self) -> Optional[str]:
+        row = self.connection().execute("SELECT MAX(data) FROM PrecoSoja").fetchone()
+        return row[0] if row and row[0] else None
+
+    def _load(self, batch: PriceBatch, batch_size: Optional[int], snapshot: Optional[str],
+              fonte: str) -> Tuple[Optional[Tuple], Optional[Tuple]]:
+        # sqlite não tem decimal: o texto exato ("140.00") vai com afinidade NUMERIC
+        rows = batch.sql_params()
+        cn = self.connection()
+        pracas = list(dict.fromkeys((p[2], p[3], fold(p[3])) for p in rows))
+        with cn:
+            ids = self._praca_ids(cn, pracas)
+        params = [(p[0], p[1], ids[(p[2], fold(p[3]))]) + tuple(None if v is None else str(v) for v in p[4:])
+                  + (fonte,) for p in rows]
+        step = batch_size or len(params)
+        for i in range(0, len(params), step):
+            with cn:
+                cn.executemany(SQLITE_UPSERT_SQL, params[i:i + step])
+                cn.executemany(SQLITE_SUMMARY_UPSERT_SQL, params[i:i + step])
+                if i + step >= len(params):
+                    # a transação já tem a trava de escrita (upserts acima): nenhuma outra carga no meio
+                    before = cn.execute(SQLITE_WATERMARK_ROW_SQL, (fonte,)).fetchone()
+                    cn.execute(SQLITE_WATERMARK_UPSERT_SQL, (fonte, fonte, snapshot, len(params)))
+                    after = cn.execute(SQLITE_WATERMARK_ROW_SQL, (fonte,)).fetchone()
+        return before, after
+
+
+def make_sink(kind: str, conn_str: Optional[str] = None, strategy: str = "executemany",
+              sqlite_path: str = "soja_agrural.db", bulk_dir: Optional[str] = None,
+              aliases: Optional[str] = None, schema: str = "rowstore") -> Sink:
+    # aliases: JSON de apelidos das praças (agrural_praca); None ou arquivo ausente = sem apelidos
+    canon = PracaCanon.load(aliases)
+    if kind == "sqlite":
+        return SQLiteSink(sqlite_path, canon=canon)
+    if kind == "sqlserver":
+        return SqlServerSink(conn_str, strategy=strategy, bulk_dir=bulk_dir, canon=canon, schema=schema)
+    raise ValueError(f"Destino desconhecido: {kind} (opções: {', '.join(SINKS)})")
@@ -1,271 +1,48 @@
-import re, sys, math, argparse
-from datetime import datetime, date as _date
-from typing import List, Dict, Optional
-
-import requests
-from bs4 import BeautifulSoup
-import pandas as pd
-import pyodbc
-
-URL = "https://agrural.com.br/precossojaemilho/"
-HEADERS = {"User-Agent": "Mozilla/5.0", "Accept-Language": "pt-BR,pt;q=0.9,en;q=0.8"}
-
-# ----------- util -----------
-def normalize(s: str) -> str:
-    return (s or "").strip().replace("\xa0", " ")
-
-def br_to_float(text: str) -> float:
-    if text is None:
-        return float("nan")
-    t = text.strip().replace("\xa0", " ").replace("−", "-").replace("\u2212", "-")
-    t = t.replace(".", "").replace(",", ".").replace("%", "").strip()
-    if t in {"", "-", "—"}:
-        return float("nan")
-    try:
-        return float(t)
-    except ValueError:
-        return float("nan")
-
-def find_soja_table(soup: BeautifulSoup) -> Optional[BeautifulSoup]:
-    for h in soup.find_all(["h2", "h3", "h4", "strong", "p"]):
-        if "soja" in h.get_text(" ", strip=True).lower():
-            t = h.find_next("table")
-            if t:
-                return t
-    for t in soup.find_all("table"):
-        txt = t.get_text(" ", strip=True).lower()
-        if all(x in txt for x in ["estado", "praça", "compra"]):
-            return t
-    return None
-
-def parse_date_near(table: BeautifulSoup) -> Optional[str]:
-    prev = []
-    node = table
-    for _ in range(8):
-        node = node.find_previous(string=True)
-        if not node:
-            break
-        prev.append(str(node))
-    blob = " ".join(prev)
-    m = re.search(r"(\d{2}-[A-Za-z]{3}-\d{2,4})", blob)
-    if not m:
-        return None
-    raw = m.group(1)
-    for fmt in ("%d-%b-%y", "%d-%b-%Y"):
-        try:
-            return datetime.strptime(raw, fmt).date().isoformat()
-        except ValueError:
-            pass
-    pt2en = {
-        "jan": "Jan", "fev": "Feb", "mar": "Mar", "abr": "Apr", "mai": "May", "jun": "Jun",
-        "jul": "Jul", "ago": "Aug", "set": "Sep", "out": "Oct", "nov": "Nov", "dez": "Dec",
-    }
-    m2 = re.search(r"(\d{2})-([A-Za-z]{3})-(\d{2,4})", raw, flags=re.IGNORECASE)
-    if m2:
-        d, mon, y = m2.groups()
-        mon = pt2en.get(mon.lower(), mon.title())
-        for fmt in ("%d-%b-%y", "%d-%b-%Y"):
-            try:
-                return datetime.strptime(f"{d}-{mon}-{y}", fmt).date().isoformat()
-            except ValueError:
-                pass
-    return None
-
-def expand_html_table(table: BeautifulSoup) -> List[List[str]]:
-    body = table.find("tbody") or table
-    rows_raw = body.find_all("tr")
-    grid, carry = [], {}  # col -> {"val": str, "left": int}
-    for tr in rows_raw:
-        cells = tr.find_all(["td", "th"])
-        cur, col = [], 0
-        while col in carry and carry[col]["left"] > 0:
-            cur.append(carry[col]["val"])
-            carry[col]["left"] -= 1
-            if carry[col]["left"] == 0:
-                del carry[col]
-            col += 1
-        for c in cells:
-            while col in carry and carry[col]["left"] > 0:
-                cur.append(carry[col]["val"])
-                carry[col]["left"] -= 1
-                if carry[col]["left"] == 0:
-                    del carry[col]
-                col += 1
-            txt = normalize(c.get_text(" ", strip=True))
-            rs = int(c.get("rowspan") or 1)
-            cur.append(txt)
-            if rs > 1:
-                carry[col] = {"val": txt, "left": rs - 1}
-            col += 1
-        grid.append([x if x is not None else "" for x in cur])
-    return grid
-
-def fetch_rows() -> List[Dict]:
-    soup = BeautifulSoup(requests.get(URL, headers=HEADERS, timeout=30).text, "html.parser")
-    table = find_soja_table(soup)
-    if table is None:
-        raise RuntimeError("Tabela de Soja não encontrada.")
-    date_iso = parse_date_near(table)
-    # Fallback: se não achar a data no HTML, usa a data de hoje (YYYY-MM-DD)
-    if not date_iso:
-        date_iso = _date.today().isoformat()
-
-    grid = expand_html_table(table)
-    if not grid:
-        return []
-
-    # header
-    hdr_i = None
-    for i, row in enumerate(grid[:3]):
-        low = [c.lower() for c in row]
-        if "estado" in " ".join(low) and "praça" in " ".join(low) and "compra" in " ".join(low):
-            hdr_i = i
-            break
-    header = grid[hdr_i] if hdr_i is not None else grid[0]
-    lower = [h.lower() for h in header]
-
-    def idx_of(*names):
-        for i, h in enumerate(lower):
-            if any(n in h for n in names):
-                return i
-        return None
-
-    i_estado = idx_of("estado")
-    i_praca  = idx_of("praça", "praca")
-    i_compra = idx_of("compra")
-    i_var_d  = idx_of("variação hoje", "variacao hoje", "variação do dia", "var hoje")
-    i_var_w  = idx_of("1 semana", "semana")
-    i_var_m  = idx_of("1 mês", "1 mes", "mês", "mes")
-
-    start = (hdr_i + 1) if hdr_i is not None else 1
-    data_rows = grid[start:]
-
-    rows, last_uf = [], None
-    for r in data_rows:
-        if "agrural" in " ".join([c.lower() for c in r]):
-            continue
-        uf_cell = r[i_estado] if (i_estado is not None and i_estado < len(r)) else (r[0] if r else "")
-        uf = uf_cell if re.fullmatch(r"[A-Z]{2}", (uf_cell or "").strip()) else last_uf
-        if re.fullmatch(r"[A-Z]{2}", (uf_cell or "").strip()):
-            last_uf = uf
-
-        if None in (i_praca, i_compra, i_var_d, i_var_w, i_var_m):
-            if len(r) < 5:
-                continue
-            praca, compra, var_d, var_w, var_m = r[-5:]
-        else:
-            praca = r[i_praca] if i_praca is not None and i_praca < len(r) else ""
-            compra = r[i_compra] if i_compra is not None and i_compra < len(r) else ""
-            var_d = r[i_var_d] if i_var_d is not None and i_var_d < len(r) else ""
-            var_w = r[i_var_w] if i_var_w is not None and i_var_w < len(r) else ""
-            var_m = r[i_var_m] if i_var_m is not None and i_var_m < len(r) else ""
-
-        compra_f, var_d_f, var_w_f, var_m_f = map(br_to_float, [compra, var_d, var_w, var_m])
-        if not praca or math.isnan(compra_f) or praca.lower() in {"praça", "praca"}:
-            continue
-
-        rows.append({
-            "data": date_iso, "uf": uf, "praca": praca,
-            "compra_R$/sc": compra_f, "var_dia_%": var_d_f,
-            "var_sem_%": var_w_f, "var_mes_%": var_m_f
-        })
-    return rows
+from __future__ import annotations
+
+import os, sys, argparse
+from typing import TYPE_CHECKING, List, Dict, Optional
+
+from agrural_sinks import (
+    SCHEMAS, SINKS, SQLSERVER_STRATEGIES, LoadResult, SqlServerSink, make_sink,
+    CREATE_TABLE_SQL, MERGE_SQL,  # noqa: F401 (reexportados: nomes históricos deste script)
+)
+from agrural_cache import (
+    ResponseCache, RowFingerprints, TableLocator, PendingBatches, DEFAULT_CACHE_DIR, response_cache_name,
+)
+from agrural_core import (
+    COMMODITIES, HEADERS, extract,
+    # reexportados: nomes históricos deste script
+    URL,  # noqa: F401
+    GRID_COLUMNS, batch_from_grid, batch_from_html, batch_from_stream, batch_from_table, br_to_float,  # noqa: F401
+    date_from_text, expand_html_table, expand_rows, fetch_batch, fetch_batch_stream, fetch_html,  # noqa: F401
+    find_commodity_tables, find_soja_table, normalize, parse_date_near,  # noqa: F401
+)
+from agrural_fanout import DESTINOS, CsvDestino, DbDestino, Destino, ParquetDestino, fan_out
+from agrural_parsers import PARSERS
+from agrural_metrics import METRICS, DEFAULT_METRICS_FILE
+from agrural_http import RETRIES, DEADLINE_S, make_session
+from agrural_praca import DEFAULT_ALIAS_FILE
+
+# requests, bs4 e numpy são importados só no caminho que os usa: "sem novidades" pelo cache
+# não carrega bs4/numpy, --from-html não carrega requests (ver --profile-startup)
+if TYPE_CHECKING:
+    import requests
+    from agrural_batch import PriceBatch
 
 # ----------- SQL -----------
-CREATE_TABLE_SQL = r"""
-IF NOT EXISTS (SELECT 1 FROM sys.tables WHERE name = 'PrecoSoja' AND schema_id = SCHEMA_ID('dbo'))
-BEGIN
-  CREATE TABLE dbo.PrecoSoja(
-    [data] date NOT NULL,
-    [uf] char(2) NOT NULL,
-    [praca] nvarchar(120) NOT NULL,
-    [compra_rs_sc] decimal(10,2) NOT NULL,
-    [var_dia_pct]  decimal(6,2) NULL,
-    [var_sem_pct]  decimal(6,2) NULL,
-    [var_mes_pct]  decimal(6,2) NULL,
-    [fonte] nvarchar(100) NOT NULL CONSTRAINT DF_PrecoSoja_fonte DEFAULT(N'AgRural'),
-    [load_ts] datetime2(0) NOT NULL CONSTRAINT DF_PrecoSoja_load DEFAULT(SYSUTCDATETIME()),
-    CONSTRAINT PK_PrecoSoja PRIMARY KEY([data],[uf],[praca])
-  );
-END
-"""
-
-MERGE_SQL = r"""
-MERGE dbo.PrecoSoja AS T
-USING #stg AS S
-  ON T.[data]=S.[data] AND T.[uf]=S.[uf] AND T.[praca]=S.[praca]
-WHEN MATCHED AND (
-  ISNULL(T.[compra_rs_sc],-1)<>ISNULL(S.[compra_rs_sc],-1) OR
-  ISNULL(T.[var_dia_pct],-999)<>ISNULL(S.[var_dia_pct],-999) OR
-  ISNULL(T.[var_sem_pct],-999)<>ISNULL(S.[var_sem_pct],-999) OR
-  ISNULL(T.[var_mes_pct],-999)<>ISNULL(S.[var_mes_pct],-999)
-) THEN UPDATE SET
-  T.[compra_rs_sc]=S.[compra_rs_sc],
-  T.[var_dia_pct]=S.[var_dia_pct],
-  T.[var_sem_pct]=S.[var_sem_pct],
-  T.[var_mes_pct]=S.[var_mes_pct],
-  T.[load_ts]=SYSUTCDATETIME()
-WHEN NOT MATCHED BY TARGET THEN
-  INSERT([data],[uf],[praca],[compra_rs_sc],[var_dia_pct],[var_sem_pct],[var_mes_pct])
-  VALUES(S.[data],S.[uf],S.[praca],S.[compra_rs_sc],S.[var_dia_pct],S.[var_sem_pct],S.[var_mes_pct]);
-"""
-
-def upsert_to_sqlserver(rows: List[Dict], conn_str: str):
-    if not rows:
-        print("Nenhuma linha para inserir/atualizar.")
-        return
-
-    cn = pyodbc.connect(conn_str)
-    try:
-        cn.autocommit = False
-        cur = cn.cursor()
-
-        try:
-            cur.fast_executemany = True
-        except Exception:
-            pass
-
-
-        cur.execute(CREATE_TABLE_SQL)
-
-
-        cur.execute("""
-            IF OBJECT_ID('tempdb..#stg') IS NOT NULL DROP TABLE #stg;
-            CREATE TABLE #stg (
-                [data] date NOT NULL,
-                [uf]   char(2) NOT NULL,
-                [praca] nvarchar(120) NOT NULL,
-                [compra_rs_sc] decimal(10,2) NOT NULL,
-                [var_dia_pct]  decimal(6,2) NULL,
-                [var_sem_pct]  decimal(6,2) NULL,
-                [var_mes_pct]  decimal(6,2) NULL
-            );
-        """)
-
-        params = [
-            (
-                r["data"], r["uf"], r["praca"],
-                float(r["compra_R$/sc"]) if pd.notna(r["compra_R$/sc"]) else None,
-                float(r["var_dia_%"])    if pd.notna(r["var_dia_%"])    else None,
-                float(r["var_sem_%"])    if pd.notna(r["var_sem_%"])    else None,
-                float(r["var_mes_%"])    if pd.notna(r["var_mes_%"])    else None,
-            )
-            for r in rows
-        ]
-
-        cur.executemany(
-            "INSERT INTO #stg ([data],[uf],[praca],[compra_rs_sc],[var_dia_pct],[var_sem_pct],[var_mes_pct]) "
-            "VALUES (?,?,?,?,?,?,?)",
-            params
-        )
-
-        # 3) MERGE
-        cur.execute(MERGE_SQL)
-
-        cn.commit()
-        print(f"Upsert concluído: {len(rows)} linhas processadas.")
-    finally:
-        cn.close()
+# DDL/MERGE e as estratégias de carga ficam em agrural_sinks (SQL Server e SQLite)
+def upsert_to_sqlserver(batch: PriceBatch, conn_str: str, batch_size: Optional[int] = None,
+                        strategy: str = "executemany", schema: str = "rowstore",
+                        api_url: Optional[str] = None) -> Optional[LoadResult]:
+    # fato + última cotação por praça (dbo.PrecoSojaUltimo) na mesma transação;
+    # api_url: depois do commit o lote vai para a API de leitura (agrural_api)
+    with SqlServerSink(conn_str, strategy=strategy, schema=schema) as sink:
+        result = sink.load(batch, batch_size=batch_size)
+    if api_url and result is not None:
+        from agrural_api import notify
+        notify(api_url, batch, result.watermark)
+    return result
 
 # ----------- helpers -----------
 def build_conn_str(args) -> str:
@@ -276,22 +53,33 @@ def build_conn_str(args) -> str:
         return base + f"Uid={args.user};Pwd={args.password};Encrypt={args.encrypt};TrustServerCertificate={args.trust};"
 
 def get_max_date_from_db(conn_str: str) -> Optional[str]:
-    cn = pyodbc.connect(conn_str)
-    try:
-        cur = cn.cursor()
-        cur.execute(
-            "IF OBJECT_ID('dbo.PrecoSoja','U') IS NOT NULL "
-            "SELECT MAX([data]) FROM dbo.PrecoSoja ELSE SELECT NULL"
-        )
-        row = cur.fetchone()
-        return row[0].isoformat() if row and row[0] else None
-    finally:
-        cn.close()
+    with SqlServerSink(conn_str) as sink:
+        return sink.max_date()
+
+
+def run_collect(destinos: List[Destino], cache: Optional[ResponseCache], parser: str, restrict: bool,
+                produtos: Optional[List[str]], from_html: Optional[str] = None,
+                session: Optional[requests.Session] = None, stream: bool = False,
+                locator: Optional[TableLocator] = None, pending: Optional[PendingBatches] = None) -> Dict:
+    # Uma coleta completa: página -> lote (uma vez) -> destinos em paralelo. Usada pela
+    # execução avulsa e por cada ciclo do daemon; devolve um resumo para o arquivo de status.
+    batch = extract(cache, parser, restrict, produtos, from_html=from_html, session=session, stream=stream,
+                    locator=locator)
+    if batch is None:
+        print("Cache: pagina sem alteracoes desde a ultima carga. Nada a fazer.")
+    result = fan_out(batch, destinos, pending)
+    # destino que falhou ficou com o lote na fila de pendentes: a página não precisa ser baixada de novo
+    if batch is not None and cache is not None:
+        cache.commit()
+    return result
 
 
 def main() -> int:
     p = argparse.ArgumentParser(description="Scrape AgRural (Soja) e upsert no SQL Server (Windows/SQL Auth).")
-    p.add_argument("--server", required=True, help=r'Ex.: BS-NOT-BS01Q1\SQLEXPRESS ou localhost\SQLEXPRESS')
+    p.add_argument("command", nargs="?", default="run", choices=["run", "backfill", "sources"],
+                   help="run = coleta do site (padrão); backfill = recarga a partir de snapshots HTML salvos; "
+                        "sources = várias fontes em paralelo (--sources).")
+    p.add_argument("--server", help=r'Ex.: BS-NOT-BS01Q1\SQLEXPRESS ou localhost\SQLEXPRESS')
     p.add_argument("--database", default="CotacaoSoja")
     p.add_argument("--auth", choices=["windows", "sql"], default="windows")
     p.add_argument("--user", help="(se auth=sql)")
@@ -300,31 +88,192 @@ def main() -> int:
     # Para SQL Express local, se criptografia der erro, use: --encrypt yes --trust yes OU --encrypt no
     p.add_argument("--encrypt", default="yes", choices=["yes", "no"])
     p.add_argument("--trust", default="yes", choices=["yes", "no"])
+    # Cache local (ETag/Last-Modified + hash da tabela): pula parse e banco se nada mudou
+    p.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Pasta do cache de resposta HTTP.")
+    p.add_argument("--no-cache", action="store_true", help="Ignora o cache e processa sempre.")
+    p.add_argument("--parser", default="html.parser", choices=PARSERS, help="Backend de parse do HTML.")
+    p.add_argument("--restrict-parse", action="store_true",
+                   help="Monta o DOM só com títulos e tabelas (SoupStrainer).")
+    p.add_argument("--retries", type=int, default=RETRIES,
+                   help="Novas tentativas em erro transitório do site (5xx, 429, timeout), com backoff.")
+    p.add_argument("--http-deadline", type=float, default=DEADLINE_S,
+                   help="Prazo total (s) para baixar a página, somando tentativas e esperas.")
+    p.add_argument("--stream", action="store_true",
+                   help="Lê a página em pedaços, sem DOM, e fecha a conexão ao fim da última tabela.")
+    p.add_argument("--produtos", default=",".join(COMMODITIES),
+                   help=f"Commodities a gravar, separadas por vírgula (padrão: {','.join(COMMODITIES)}).")
+    p.add_argument("--from-html", metavar="FILE", help="Lê a página de um arquivo salvo em vez do site.")
+    # destinos da carga: a página é baixada e lida uma vez e o lote vai para todos, em paralelo
+    p.add_argument("--destinos", default="db",
+                   help=f"Destinos do lote, separados por vírgula ({','.join(DESTINOS)}; padrão: db). "
+                        "db = o banco de --sink. Um destino que falhar não afeta os outros e recebe o lote "
+                        "de novo na próxima execução, sem nova coleta.")
+    p.add_argument("-o", "--output", default="soja_agrural.csv", help="(csv) caminho do CSV de saída.")
+    p.add_argument("--history", metavar="DIR",
+                   help="(parquet) pasta do histórico Parquet por data (requer pyarrow; padrão: historico ao "
+                        "lado do script).")
+    p.add_argument("--sink", default="sqlserver", choices=SINKS,
+                   help="(db) sqlserver (padrão) ou sqlite (stand-in local, sem servidor).")
+    p.add_argument("--load-strategy", default="executemany", choices=SQLSERVER_STRATEGIES,
+                   help="(sqlserver) executemany, tvp (table-valued parameter) ou bulk (BULK INSERT).")
+    p.add_argument("--bulk-dir", help="(bulk) pasta do arquivo temporário, visível pelo SQL Server.")
+    p.add_argument("--sqlite-path", default="soja_agrural.db", help="(sqlite) arquivo do banco.")
+    p.add_argument("--schema", default="rowstore", choices=SCHEMAS,
+                   help="(sqlserver) organização do fato: rowstore (PK clusterizada) ou columnstore "
+                        "(particionado por mês + columnstore clusterizado; SQL Server 2016 SP1+). "
+                        "Um fato rowstore existente é convertido na 1a carga com columnstore.")
+    p.add_argument("--api-url", metavar="URL",
+                   help="(db) API de leitura (agrural_api, ex.: http://127.0.0.1:8780) avisada com o lote "
+                        "depois de cada carga confirmada.")
+    p.add_argument("--pracas-alias", default=DEFAULT_ALIAS_FILE,
+                   help="JSON com apelidos das praças (UF -> nome canônico -> grafias); sem o arquivo, "
+                        "só acento/caixa/espaço são unificados.")
+    # backfill
+    p.add_argument("--snapshots", help="(backfill) pasta ou .tar/.tar.gz com páginas HTML salvas.")
+    p.add_argument("--workers", type=int, default=None, help="(backfill) processos de parse (padrão: nº de CPUs).")
+    p.add_argument("--batch-size", type=int, default=50000, help="(backfill) linhas por MERGE.")
+    p.add_argument("--dry-run", action="store_true", help="(backfill/sources) só faz o parse e o relatório, sem gravar.")
+    p.add_argument("--sources", metavar="JSON", help="(sources) fontes e limites por host (padrão: só a AgRural).")
+    p.add_argument("--concurrency", type=int, default=2, help="(sources) requisições simultâneas por host.")
+    p.add_argument("--rate", type=float, default=1.0, help="(sources) requisições por segundo por host.")
+    # daemon: processo residente no lugar de um disparo do Task Scheduler por coleta
+    p.add_argument("--daemon", action="store_true", help="Fica residente e agenda as coletas sozinho.")
+    p.add_argument("--interval-min", type=float, default=240, help="(daemon) intervalo entre coletas, em minutos.")
+    p.add_argument("--jitter-min", type=float, default=15, help="(daemon) variação aleatória (+/-) do intervalo.")
+    p.add_argument("--max-requests-per-day", type=int, default=3, help="(daemon) limite diário de acessos ao site.")
+    p.add_argument("--status-file", default=os.path.join(DEFAULT_CACHE_DIR, "daemon_status.json"),
+                   help="(daemon) JSON com saúde/última execução.")
+    # métricas estruturadas (tempo por estágio, bytes, linhas, idas ao banco)
+    p.add_argument("--metrics-file", default=DEFAULT_METRICS_FILE,
+                   help='JSON-lines com um evento por estágio + resumo da execução ("" desliga).')
+    p.add_argument("--prom-file", help="Textfile do Prometheus (node_exporter) regravado a cada execução.")
+    p.add_argument("--profile-startup", action="store_true",
+                   help="Mostra o custo de import de cada caminho (com as opções dadas) e sai.")
+    p.add_argument("--startup-target-ms", type=float, default=None,
+                   help="(profile-startup) meta de import do caminho mais comum; sai com 1 se passar.")
     args = p.parse_args()
+    produtos = [x.strip().lower() for x in args.produtos.split(",") if x.strip()]
+    destinos = [x.strip().lower() for x in args.destinos.split(",") if x.strip()]
+    unknown = sorted(set(destinos) - set(DESTINOS))
+    if unknown or not destinos:
+        p.error(f"--destinos: use {', '.join(DESTINOS)} (recebido: {args.destinos})")
+
+    if args.profile_startup:
+        from agrural_startup import STARTUP_TARGET_MS, profile_startup, scenarios
+        return profile_startup("agrural_soja_to_sqlserver_windows",
+                               scenarios(args.parser, bool(args.from_html), args.sink, args.stream),
+                               target_ms=args.startup_target_ms or STARTUP_TARGET_MS,
+                               cache_hit_args=None if args.from_html else
+                               ["--parser", args.parser] + (["--stream"] if args.stream else []))
+
+    needs_server = args.sink == "sqlserver" and not (args.command in ("backfill", "sources") and args.dry_run)
+    if args.command == "run" and "db" not in destinos:
+        needs_server = False
+    if needs_server and not args.server:
+        p.error("--server é obrigatório com --sink sqlserver")
+
+    def open_sink():
+        conn_str = build_conn_str(args) if args.sink == "sqlserver" else None
+        return make_sink(args.sink, conn_str, strategy=args.load_strategy,
+                         sqlite_path=args.sqlite_path, bulk_dir=args.bulk_dir, aliases=args.pracas_alias,
+                         schema=args.schema)
+
+    def measured(fn, *a, **kw):
+        # uma execução (ou um ciclo do daemon) = um evento "run" no JSONL/Prometheus
+        METRICS.reset()
+        try:
+            result = fn(*a, **kw)
+        except Exception as e:
+            METRICS.emit("erro", args.metrics_file, args.prom_file, command=args.command,
+                         error=f"{type(e).__name__}: {e}")
+            raise
+        status = result["status"] if isinstance(result, dict) else ("ok" if result == 0 else "falhas")
+        METRICS.emit(status, args.metrics_file, args.prom_file, command=args.command)
+        return result
+
+    if args.command == "backfill":
+        if not args.snapshots:
+            p.error("backfill exige --snapshots")
+        from agrural_backfill import run_backfill
+        sink = None if args.dry_run else open_sink()
+        try:
+            return measured(run_backfill, args.snapshots, sink, workers=args.workers, batch_size=args.batch_size,
+                                parser=args.parser, restrict=args.restrict_parse, produtos=produtos)
+        finally:
+            if sink is not None:
+                sink.close()
+    if args.command == "sources":
+        from agrural_sources import AGRURAL, load_sources, run_sources
+        sources, limits = load_sources(args.sources) if args.sources else ([AGRURAL], {})
+        sink = None if args.dry_run else open_sink()
+        try:
+            result = measured(run_sources, sink, sources, limits, concurrency=args.concurrency, rate=args.rate,
+                              parser=args.parser)
+        finally:
+            if sink is not None:
+                sink.close()
+        return 1 if result["failed"] else 0
+    cache = None if (args.no_cache or args.from_html) else \
+        ResponseCache(args.cache_dir, response_cache_name("agrural_http", destinos, produtos))
+    # --no-cache também desliga o envio incremental (todas as linhas vão para o MERGE)
+    fingerprints = None if args.no_cache else RowFingerprints(args.cache_dir)
+    locator = None if args.no_cache else TableLocator(args.cache_dir)
+    pending = None if args.no_cache else PendingBatches(args.cache_dir)
+
+    notify = None
+    if args.api_url:
+        from agrural_api import notify as api_notify
+
+        def notify(b: PriceBatch, r: LoadResult) -> None:
+            api_notify(args.api_url, b, r.watermark)
+
+    def open_destinos() -> List[Destino]:
+        # uma conexão só (por destino db) para a checagem de data e para a carga
+        out: List[Destino] = []
+        for name in destinos:
+            if name == "db":
+                out.append(DbDestino(open_sink(), fingerprints, notify=notify))
+            elif name == "csv":
+                out.append(CsvDestino(args.output))
+            elif name == "parquet":
+                out.append(ParquetDestino(args.history))
+        return out
+
+    def close_destinos(ds: List[Destino]) -> None:
+        for d in ds:
+            d.close()
+
+    if args.daemon:
+        from agrural_daemon import run_daemon
+        session = make_session(HEADERS, retries=args.retries, deadline_s=args.http_deadline)
+        ds = open_destinos()
+
+        def cycle() -> Dict:
+            for d in ds:
+                if isinstance(d, DbDestino):
+                    d.sink.validate()
+            return measured(run_collect, ds, cache, args.parser, args.restrict_parse, produtos,
+                            session=session, stream=args.stream, locator=locator, pending=pending)
 
-    conn_str = build_conn_str(args)
-
-    rows = fetch_rows()
-    # ffill UF (linhas sob rowspan)
-    for i in range(1, len(rows)):
-        if not rows[i]["uf"]:
-            rows[i]["uf"] = rows[i - 1]["uf"]
-
-    scrape_date = next((r.get("data") for r in rows if r.get("data")), None)
-    if not scrape_date:
-        print("ATENCAO: Data do site nao encontrada. Nada gravado (evitando data incorreta).")
-        return 0
-
-    last = get_max_date_from_db(conn_str)
-    if last and scrape_date < last:  # só bloqueia se a data do site for MAIS ANTIGA
-        print(f"Sem novidades: site={scrape_date} < banco={last}. Nada a fazer.")
-        return 0
-
-    # data igual ou maior -> executa MERGE (idempotente; atualiza se valores mudaram)
-    upsert_to_sqlserver(rows, conn_str)
-    return 0
-
-
+        try:
+            return run_daemon(cycle, interval_min=args.interval_min, jitter_min=args.jitter_min,
+                              max_per_day=args.max_requests_per_day, status_path=args.status_file,
+                              on_error=lambda: close_destinos(ds))
+        finally:
+            close_destinos(ds)
+            session.close()
+
+    session = None if args.from_html else make_session(HEADERS, retries=args.retries, deadline_s=args.http_deadline)
+    ds = open_destinos()
+    try:
+        result = measured(run_collect, ds, cache, args.parser, args.restrict_parse, produtos,
+                          from_html=args.from_html, session=session, stream=args.stream, locator=locator,
+                          pending=pending)
+    finally:
+        close_destinos(ds)
+        if session is not None:
+            session.close()
+    return 1 if result["status"] == "falhas" else 0
 
 
 if __name__ == "__main__":
@@ -0,0 +1,230 @@
+import json
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import date as _date
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from agrural_batch import PriceBatch
+from agrural_http import get as http_get, make_session
+from agrural_metrics import METRICS
+from agrural_parsers import make_soup
+from agrural_sinks import FONTE, Sink
+from agrural_core import (
+    GRID_COLUMNS, HEADERS, URL, batch_from_grid, date_from_text, expand_html_table, expand_rows,
+    find_commodity_tables, parse_date_near,
+)
+
+# Coleta de várias fontes de preço ao mesmo tempo. Cada fonte é um Source (URL, onde estão
+# as tabelas e como se chamam as colunas) e todas viram o mesmo PriceBatch
+# (data/produto/uf/praca/compra/var_*), carregado com o nome da fonte em [fonte] (uma carga
+# por fonte: uma não sobrescreve o preço da outra). O download roda em threads
+# (requests) coordenadas por asyncio, com limite de concorrência e de ritmo por host.
+
+HEADING_TAGS = ["h2", "h3", "h4", "strong", "p"]
+DEFAULT_CONCURRENCY = 2     # requisições simultâneas por host
+DEFAULT_RATE = 1.0          # requisições por segundo por host
+
+
+class Source:
+
+    def __init__(self, name: str, url: str, tables: Optional[Dict[str, Dict]] = None,
+                 columns: Optional[Dict[str, List[str]]] = None, date_css: Optional[str] = None,
+                 headers: Optional[Dict[str, str]] = None, fonte: Optional[str] = None):
+        self.name = name
+        self.url = url
+        # valor gravado em [fonte] (chave do fato e da marca d'água); padrão: o nome.
+        # Sources com a mesma fonte (páginas do mesmo site) viram uma carga só
+        self.fonte = fonte or name
+        # produto -> {"heading": "texto do título"} ou {"css": "seletor da tabela"};
+        # None = heurística da AgRural (find_commodity_tables)
+        self.tables = tables
+        self.columns = dict(GRID_COLUMNS, **{k: tuple(v) for k, v in (columns or {}).items()})
+        self.date_css = date_css
+        self.headers = dict(HEADERS, **(headers or {}))
+
+    @property
+    def host(self) -> str:
+        return urlsplit(self.url).netloc.lower()
+
+    @classmethod
+    def from_dict(cls, cfg: Dict) -> "Source":
+        return cls(cfg["name"], cfg["url"], cfg.get("tables"), cfg.get("columns"), cfg.get("date_css"),
+                   cfg.get("headers"), cfg.get("fonte"))
+
+    def locate(self, soup) -> Dict[str, object]:
+        if self.tables is None:
+            return find_commodity_tables(soup)
+        found, taken = {}, set()
+        for produto, rule in self.tables.items():
+            if "css" in rule:
+                t = soup.select_one(rule["css"])
+            else:
+                key = rule.get("heading", produto).lower()
+                h = soup.find(lambda el: el.name in HEADING_TAGS and key in el.get_text(" ", strip=True).lower())
+                t = h.find_next("table") if h is not None else None
+            if t is not None and t.name == "table" and id(t) not in taken:
+                found[produto] = t
+                taken.add(id(t))
+        return found
+
+    def date(self, soup, table) -> Optional[str]:
+        if self.date_css:
+            el = soup.select_one(self.date_css)
+            if el is not None:
+                return date_from_text(el.get_text(" "))
+        return parse_date_near(table)
+
+    def grid(self, table) -> List[List[str]]:
+        if self.tables is None:
+            return expand_html_table(table)  # mesmo caminho do coletor da AgRural
+        # demais fontes: todas as linhas, inclusive o cabeçalho em <thead>
+        return expand_rows([[(c.get_text(" ", strip=True), c.get("rowspan"), c.get("colspan"))
+                             for c in tr.find_all(["td", "th"])]
+                            for tr in table.find_all("tr")])
+
+    def parse(self, html: str, parser: str = "html.parser", fallback_today: bool = True) -> PriceBatch:
+        soup = make_soup(html, parser)
+        tables = self.locate(soup)
+        if not tables:
+            raise RuntimeError(f"{self.name}: nenhuma tabela encontrada.")
+        batches = []
+        for produto, table in tables.items():
+            date_iso = self.date(soup, table)
+            if not date_iso and fallback_today:
+                METRICS.count("date_fallbacks")
+                date_iso = _date.today().isoformat()
+            batches.append(batch_from_grid(self.grid(table), date_iso, produto, self.columns))
+        return PriceBatch.concat(batches)
+
+
+AGRURAL = Source("agrural", URL, fonte=FONTE)
+
+
+def load_sources(path: str) -> Tuple[List[Source], Dict]:
+    # {"limits": {"default": {...}, "hosts": {"host": {"concurrency": 1, "rate": 0.2}}},
+    #  "sources": [{"name": ..., "url": ..., "fonte": ..., "tables": ..., "columns": ..., "date_css": ...}]}
+    with open(path, "r", encoding="utf-8") as f:
+        cfg = json.load(f)
+    sources = [Source.from_dict(s) for s in cfg.get("sources", [])]
+    names = [s.name for s in sources]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Nomes de fonte repetidos em {path}.")
+    return sources, cfg.get("limits") or {}
+
+
+class HostLimiter:
+
+    # por host: no máximo `concurrency` requisições em voo e início espaçado de 1/rate segundos
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY, rate: float = DEFAULT_RATE,
+                 hosts: Optional[Dict[str, Dict]] = None):
+        self.default = {"concurrency": concurrency, "rate": rate}
+        self.hosts = hosts or {}
+        self._sem: Dict[str, asyncio.Semaphore] = {}
+        self._lock: Dict[str, asyncio.Lock] = {}
+        self._next: Dict[str, float] = {}
+
+    def limits(self, host: str) -> Dict:
+        return dict(self.default, **self.hosts.get(host, {}))
+
+    @asynccontextmanager
+    async def slot(self, host: str):
+        lim = self.limits(host)
+        sem = self._sem.setdefault(host, asyncio.Semaphore(max(1, int(lim["concurrency"]))))
+        async with sem:
+            async with self._lock.setdefault(host, asyncio.Lock()):
+                loop = asyncio.get_running_loop()
+                start = max(loop.time(), self._next.get(host, 0.0))
+                if lim["rate"] > 0:
+                    self._next[host] = start + 1.0 / lim["rate"]
+                await asyncio.sleep(max(0.0, start - loop.time()))
+            yield
+
+
+async def _collect_one(src: Source, limiter: HostLimiter, session, timeout: float, parser: str) -> Dict:
+    t0 = time.perf_counter()
+    try:
+        async with limiter.slot(src.host):
+            t_fetch = time.perf_counter()
+            resp = await asyncio.to_thread(http_get, src.url, session, headers=src.headers, timeout_s=timeout)
+            fetch_ms = (time.perf_counter() - t_fetch) * 1000
+        batch = await asyncio.to_thread(src.parse, resp.text, parser)
+    except Exception as e:  # uma fonte com erro não derruba as outras
+        return {"name": src.name, "fonte": src.fonte, "batch": None, "error": f"{type(e).__name__}: {e}",
+                "ms": (time.perf_counter() - t0) * 1000}
+    return {"name": src.name, "fonte": src.fonte, "batch": batch, "error": None, "bytes": len(resp.content),
+            "fetch_ms": fetch_ms, "ms": (time.perf_counter() - t0) * 1000}
+
+
+async def collect(sources: List[Source], limiter: HostLimiter, timeout: float = 30,
+                  parser: str = "html.parser") -> List[Dict]:
+    # uma sessão (pool de conexões) por host, do tamanho do limite de concorrência dele
+    sessions = {h: make_session(pool_size=max(1, int(limiter.limits(h)["concurrency"])))
+                for h in {s.host for s in sources}}
+    try:
+        return await asyncio.gather(*(_collect_one(s, limiter, sessions[s.host], timeout, parser)
+                                      for s in sources))
+    finally:
+        for s in sessions.values():
+            s.close()
+
+
+def combine(results: List[Dict]) -> Tuple[Dict[str, PriceBatch], int]:
+    # um lote por fonte; chave (data, produto, uf, praca) repetida entre Sources da mesma
+    # fonte fica com o 1o. Fontes diferentes não se descartam: cada uma tem a sua linha no fato
+    import numpy as np
+    por_fonte: Dict[str, List[PriceBatch]] = {}
+    for r in results:
+        if r["batch"] is not None:
+            por_fonte.setdefault(r["fonte"], []).append(r["batch"])
+    out, dup = {}, 0
+    for fonte, batches in por_fonte.items():
+        batch = PriceBatch.concat(batches)
+        batch = batch.take(batch.has_uf())
+        if not len(batch):
+            continue
+        _, first = np.unique(np.array(batch.keys(), dtype=object), return_index=True)
+        keep = np.sort(first)
+        out[fonte] = batch.take(keep)
+        dup += len(batch) - len(keep)
+    return out, dup
+
+
+def run_sources(sink: Optional[Sink], sources: List[Source], limits: Optional[Dict] = None,
+                concurrency: int = DEFAULT_CONCURRENCY, rate: float = DEFAULT_RATE,
+                parser: str = "html.parser", timeout: float = 30) -> Dict:
+    limits = limits or {}
+    default = limits.get("default") or {}
+    limiter = HostLimiter(default.get("concurrency", concurrency), default.get("rate", rate), limits.get("hosts"))
+    with METRICS.timer("fetch_sources", sources=len(sources)):
+        results = asyncio.run(collect(sources, limiter, timeout, parser))
+
+    failed = 0
+    for r in results:
+        if r["error"]:
+            failed += 1
+            print(f"  {r['name']:<20} ERRO: {r['error']}")
+            METRICS.event("source", source=r["name"], ms=round(r["ms"], 3), error=r["error"])
+            continue
+        print(f"  {r['name']:<20} {len(r['batch']):>6} linhas  {r['bytes'] / 1024:>8.0f} KB  {r['ms']:>8.0f} ms")
+        METRICS.event("source", source=r["name"], ms=round(r["ms"], 3), fetch_ms=round(r["fetch_ms"], 3),
+                      bytes=r["bytes"], rows=len(r["batch"]))
+        METRICS.count("http_requests")
+        METRICS.count("http_bytes", r["bytes"])
+    METRICS.count("source_failures", failed)
+
+    batches, dup = combine(results)
+    rows = sum(len(b) for b in batches.values())
+    if dup:
+        print(f"ATENCAO: {dup} linhas repetidas na mesma fonte descartadas (vale o primeiro Source do JSON).")
+    resumo = ", ".join(f"{f}={len(b)}" for f, b in batches.items())
+    print(f"{len(results) - failed}/{len(results)} fontes ok, {rows} linhas ({resumo or 'nenhuma'}).")
+    if sink is None or not rows:
+        return {"status": "falhas" if failed else "ok", "rows": rows, "failed": failed}
+    # uma carga (transação e marca d'água) por fonte, com o nome dela em [fonte]
+    with METRICS.timer("load"):
+        for fonte, batch in batches.items():
+            sink.load(batch, fonte=fonte)
+    METRICS.count("rows_loaded", rows)
+    return {"status": "falhas" if failed else "carregado", "rows": rows, "failed": failed}
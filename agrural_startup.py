@@ -0,0 +1,192 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import subprocess
+import importlib.util
+from typing import Dict, List, Optional, Tuple
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+
+# Custo de import aceitável (ms, sem contar o interpretador) no caminho mais comum do job
+# agendado: página sem mudança pelo cache (na prática, só o requests). Com pandas + bs4 + numpy no import do
+# módulo passava de 300 ms.
+STARTUP_TARGET_MS = 150.0
+
+# Módulos que nunca devem ser carregados só por importar os scripts
+HEAVY_MODULES = ("pandas", "numpy", "bs4", "lxml", "selectolax", "requests", "pyodbc")
+# ... nem numa execução "sem mudança" de verdade (o requests ela usa)
+CACHE_HIT_FORBIDDEN = ("pandas", "numpy", "bs4", "lxml", "selectolax", "pyodbc")
+
+CACHE_SCENARIO = "sem mudança (cache)"
+
+_BACKEND_MODULES = {"html.parser": [], "lxml": ["lxml.etree"], "selectolax": ["selectolax"]}
+
+# argumentos de cada script na execução repetida: SQLite no lugar do SQL Server (o caminho
+# "sem mudança" não abre o banco; a 1a execução, que aquece o cache, precisa gravar)
+_REPLAY_ARGS = {
+    "agrural_soja_to_sqlserver_windows": lambda tmp: ["--sink", "sqlite", "--sqlite-path",
+                                                      os.path.join(tmp, "soja.db")],
+    "scrape_agrural_soja": lambda tmp: ["-o", os.path.join(tmp, "soja.csv")],
+}
+
+# processo filho: aponta a URL do site para o servidor local e roda o script como __main__;
+# no fim imprime os módulos carregados e se a execução terminou pelo cache
+_CHILD = r"""
+import sys, json, runpy, io, contextlib
+import agrural_core
+agrural_core.URL = {url!r}
+sys.argv = [{script!r}] + {argv!r}
+out = io.StringIO()
+rc = 0
+with contextlib.redirect_stdout(out):
+    try:
+        runpy.run_path({script!r}, run_name="__main__")
+    except SystemExit as e:
+        rc = e.code or 0
+print(json.dumps({{"rc": rc, "modules": sorted(sys.modules), "cache_hit": "sem alteracoes" in out.getvalue()}}))
+"""
+
+
+def scenarios(parser: str = "html.parser", from_html: bool = False,
+              sink: Optional[str] = None, stream: bool = False) -> Dict[str, List[str]]:
+    # módulos que cada caminho de execução acaba importando, além do próprio script (só para
+    # o detalhamento por pacote; a meta é conferida numa execução de verdade, cache_hit_run)
+    if stream:  # --stream: tokenizador da stdlib, sem bs4
+        parse = ["agrural_stream", "agrural_batch"]
+    else:
+        parse = ["bs4", "agrural_batch"] + _BACKEND_MODULES.get(parser, [])
+    load = ["pyodbc"] if sink == "sqlserver" else []
+    if from_html:
+        return {"replay (--from-html)": parse + load}
+    return {"carga completa": ["requests"] + parse + load}
+
+
+def _installed(module: str) -> bool:
+    try:
+        return importlib.util.find_spec(module.split(".")[0]) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def _parse_importtime(stderr: str) -> List[Tuple[int, str, float]]:
+    out = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        try:
+            us = int(cumulative.strip())
+        except ValueError:  # cabeçalho
+            continue
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        out.append((depth, name.strip(), us / 1000))
+    return out
+
+
+def _importtime(modules: List[str]) -> List[Tuple[int, str, float]]:
+    # (nível, módulo, ms acumulados) a partir da saída de -X importtime de um interpretador novo
+    code = "; ".join(f"import {m}" for m in modules)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          cwd=BASE, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    return _parse_importtime(proc.stderr)
+
+
+def _run_child(entry: str, url: str, argv: List[str]) -> Tuple[Dict, List[Tuple[int, str, float]], float]:
+    code = _CHILD.format(url=url, script=os.path.join(BASE, entry + ".py"), argv=argv)
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=BASE, capture_output=True,
+                          text=True)
+    wall = (time.perf_counter() - t0) * 1000
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode != 0 or not lines:
+        raise RuntimeError(f"{entry} falhou na execução repetida: {proc.stderr.strip().splitlines()[-1:]}")
+    return json.loads(lines[-1]), _parse_importtime(proc.stderr), wall
+
+
+def cache_hit_run(entry: str, extra_args: Optional[List[str]] = None) -> Dict:
+    # Execução "sem mudança" de verdade: servidor local com a página de bench/fixtures,
+    # execuções que aquecem o cache e mais uma, num processo novo, que deve parar pelo cache.
+    # Devolve o custo de import dessa última execução e os módulos que ela carregou.
+    sys.path.insert(0, os.path.join(BASE, "bench"))
+    from fixture_server import FixtureServer
+    srv = FixtureServer().start()
+    url = f"http://127.0.0.1:{srv.port}/agrural_precos.html"
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            argv = _REPLAY_ARGS[entry](tmp) + ["--cache-dir", os.path.join(tmp, "cache"), "--metrics-file", ""]
+            argv += extra_args or []
+            # duas execuções de aquecimento: o scrape ignora o cache enquanto o CSV não existe
+            for _ in range(2):
+                _run_child(entry, url, argv)
+            result, times, wall = _run_child(entry, url, argv)
+    finally:
+        srv.shutdown()
+        srv.server_close()
+    preloaded = {name for _, name, _ in _importtime([])}
+    rows = [(name, ms) for depth, name, ms in times if depth == 0 and name not in preloaded]
+    return {"cache_hit": result["cache_hit"], "rc": result["rc"], "imports_ms": sum(ms for _, ms in rows),
+            "wall_ms": wall, "top": sorted(rows, key=lambda r: -r[1]),
+            "heavy": sorted({m.split(".")[0] for m in result["modules"]} & set(CACHE_HIT_FORBIDDEN))}
+
+
+def _wall_ms(modules: List[str], repeat: int = 5) -> float:
+    code = "; ".join(f"import {m}" for m in modules) or "pass"
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=BASE, check=True)
+        best = min(best, (time.perf_counter() - t0) * 1000)
+    return best
+
+
+def profile_startup(entry: str, modules: Dict[str, List[str]], target_ms: float = STARTUP_TARGET_MS,
+                    top: int = 8, cache_hit_args: Optional[List[str]] = None) -> int:
+    # Imprime o custo de import por pacote de topo em cada cenário e confere a meta numa
+    # execução "sem mudança" de verdade (o caminho mais comum no agendamento; cache_hit_args
+    # None = não roda). Sai com 1 se a meta estourar, se essa execução carregar numpy/bs4/
+    # pandas/pyodbc ou se o import do script puxar algum módulo pesado.
+    interp = _wall_ms([])
+    print(f"Interpretador (python -c pass): {interp:.0f} ms")
+    status = 0
+    # o que o interpretador já importa sozinho (site, encodings...) não entra na conta
+    preloaded = {name for _, name, _ in _importtime([])}
+
+    base = _importtime([entry])
+    heavy = sorted({name.split(".")[0] for _, name, _ in base} & set(HEAVY_MODULES))
+    if heavy:
+        print(f"ERRO: importar {entry} carrega {', '.join(heavy)} (deveria ser sob demanda)")
+        status = 1
+
+    if cache_hit_args is not None:
+        r = cache_hit_run(entry, cache_hit_args)
+        print(f"\n{CACHE_SCENARIO}, execução real contra o servidor local: imports {r['imports_ms']:.0f} ms, "
+              f"processo {r['wall_ms']:.0f} ms")
+        for name, ms in r["top"][:top]:
+            print(f"  {name:<40}{ms:>9.1f} ms")
+        if not r["cache_hit"] or r["rc"] != 0:
+            print(f"ERRO: a execução repetida não terminou pelo cache (saída {r['rc']})")
+            status = 1
+        if r["heavy"]:
+            print(f"ERRO: a execução sem mudança carregou {', '.join(r['heavy'])}")
+            status = 1
+        if r["imports_ms"] > target_ms:
+            print(f"META ESTOURADA: {r['imports_ms']:.0f} ms > {target_ms:.0f} ms")
+            status = 1
+
+    for label, extra in modules.items():
+        missing = [m for m in extra if not _installed(m)]
+        mods = [entry] + [m for m in extra if m not in missing]
+        rows = [(name, ms) for depth, name, ms in _importtime(mods) if depth == 0 and name not in preloaded]
+        total = sum(ms for _, ms in rows)
+        wall = _wall_ms(mods)
+        print(f"\n{label}: imports {total:.0f} ms, processo {wall:.0f} ms"
+              + (f" (não instalados: {', '.join(missing)})" if missing else ""))
+        for name, ms in sorted(rows, key=lambda r: -r[1])[:top]:
+            print(f"  {name:<40}{ms:>9.1f} ms")
+    if status == 0 and cache_hit_args is not None:
+        print(f"\nOK: dentro da meta de {target_ms:.0f} ms, sem módulos pesados no caminho sem mudança.")
+    return status
@@ -0,0 +1,284 @@
+import codecs
+from collections import deque
+from html.parser import HTMLParser
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from agrural_core import COMMODITIES
+
+# Extração em fluxo: o corpo HTTP é lido em pedaços e tokenizado à medida que chega, sem
+# montar DOM. Guarda só o texto perto de cada tabela (para a data) e as células das tabelas
+# de commodity; quando a última tabela pedida fecha, a leitura para e a conexão é fechada.
+#
+# Reproduz o que o caminho com BeautifulSoup (html.parser) faz em find_commodity_tables,
+# parse_date_near e expand_html_table, inclusive o fechamento de tags do html.parser (sem
+# fechamento implícito: </x> fecha tudo até o último <x> aberto). O que foge do formato
+# esperado (tabela dentro de tabela, <td> dentro de <td>, tabela dentro de um título) faz o
+# chamador cair no caminho com DOM, com a página inteira.
+
+HEADING_TAGS = {"h2", "h3", "h4", "strong", "p"}
+# elementos vazios do html.parser do bs4 (fecham na hora)
+VOID_TAGS = {"area", "base", "basefont", "bgsound", "br", "col", "command", "embed", "frame", "hr",
+             "image", "img", "input", "isindex", "keygen", "link", "menuitem", "meta", "nextid",
+             "param", "source", "spacer", "track", "wbr"}
+# texto que get_text() ignora (find_previous(string=True) não)
+_HIDDEN_TEXT = {"script", "style", "template"}
+
+CHUNK_SIZE = 16 * 1024
+# strings antes da tabela olhadas por parse_date_near
+DATE_CONTEXT = 8
+
+# linhas cruas: (texto de get_text(" ", strip=True), atributos rowspan e colspan) por célula
+RawRows = List[List[Tuple[str, str, str]]]
+
+
+class _Unsupported(Exception):
+    pass
+
+
+class _Table:
+
+    def __init__(self, depth: int, blob: str, claims: List[str]):
+        self.depth = depth            # posição de <table> na pilha de tags
+        self.blob = blob              # strings anteriores, da mais próxima para a mais longe
+        self.claims = claims          # produtos cujo título aponta para esta tabela
+        self.text: List[str] = []
+        self.rows: List[Tuple[bool, List[Tuple[str, str, str]]]] = []
+        self.tbodies = 0
+        self.in_first_tbody = False
+        self.row: Optional[List[Tuple[str, str, str]]] = None
+        self.row_in_tbody = False
+        self.cell: Optional[List[str]] = None
+        self.spans: Tuple[str, str] = ("", "")
+
+    def grid_rows(self) -> RawRows:
+        # table.find("tbody") or table: havendo tbody, só as linhas do primeiro
+        return [r for in_tbody, r in self.rows if in_tbody or not self.tbodies]
+
+
+class TableStream(HTMLParser):
+
+    def __init__(self, produtos: Optional[Iterable[str]] = None):
+        super().__init__(convert_charrefs=True)
+        # a tabela de soja é obrigatória; as demais só se pedidas
+        self.wanted = {"soja"} | set(produtos or COMMODITIES)
+        self.stack: List[str] = []
+        self.recent = deque(maxlen=DATE_CONTEXT)
+        self._data: List[str] = []
+        self._headings: List[List] = []     # [tag, posição na pilha, partes do texto, aberto?]
+        self._pending: List[str] = []       # produtos à espera da próxima <table>
+        self._claimed = set()
+        self._soja_heading = False          # algum título com "soja" já foi visto...
+        self._soja_anchor = False           # ...e tinha uma tabela depois dele
+        self._fallback: Optional[_Table] = None
+        self.table: Optional[_Table] = None
+        self.tables: Dict[str, Optional[Tuple[str, RawRows]]] = {}
+        self.done = False
+        self.unsupported: Optional[str] = None
+
+    # ----------- texto -----------
+    def handle_data(self, data: str) -> None:
+        self._data.append(data)
+
+    def _flush(self) -> None:
+        # o bs4 junta todo o texto entre duas tags em uma string só; aqui também
+        if not self._data:
+            return
+        s = "".join(self._data)
+        self._data = []
+        self.recent.append(s)
+        if _HIDDEN_TEXT & set(self.stack):
+            return
+        s = s.strip()
+        if not s:
+            return
+        for h in self._headings:
+            if h[3]:
+                h[2].append(s)
+        t = self.table
+        if t is not None:
+            t.text.append(s)
+            if t.cell is not None:
+                t.cell.append(s)
+
+    def handle_comment(self, data: str) -> None:
+        self._flush()
+        self.recent.append(data)
+
+    def handle_decl(self, decl: str) -> None:
+        self._flush()
+        if decl[:8].lower() == "doctype ":
+            decl = decl[8:]
+        self.recent.append(decl)
+
+    # ----------- tags -----------
+    def handle_starttag(self, tag: str, attrs) -> None:
+        if self.done:
+            return
+        self._flush()
+        t = self.table
+        if tag == "table":
+            if t is not None:
+                raise _Unsupported("tabela dentro de tabela")
+            if any(h[3] for h in self._headings):
+                raise _Unsupported("tabela dentro de um título")
+            self._start_table()
+        elif t is not None:
+            if tag == "tbody":
+                t.tbodies += 1
+                t.in_first_tbody = t.tbodies == 1
+            elif tag == "tr":
+                if t.row is not None:
+                    raise _Unsupported("<tr> dentro de <tr>")
+                t.row, t.row_in_tbody = [], t.in_first_tbody
+            elif tag in ("td", "th"):
+                if t.cell is not None:
+                    raise _Unsupported(f"<{tag}> dentro de célula")
+                if t.row is not None:
+                    t.cell = []
+                    a = dict(attrs)
+                    t.spans = (a.get("rowspan") or "", a.get("colspan") or "")
+        if tag in HEADING_TAGS:
+            self._headings.append([tag, len(self.stack), [], True])
+        if tag in VOID_TAGS:
+            return
+        self.stack.append(tag)
+
+    def handle_startendtag(self, tag: str, attrs) -> None:
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag: str) -> None:
+        if self.done:
+            return
+        self._flush()
+        if tag not in self.stack:
+            return
+        while self.stack:
+            name = self.stack.pop()
+            self._close(name, len(self.stack))
+            if name == tag:
+                break
+
+    def _close(self, tag: str, depth: int) -> None:
+        t = self.table
+        if t is not None:
+            if tag in ("td", "th") and t.cell is not None:
+                t.row.append((" ".join(t.cell), *t.spans))
+                t.cell = None
+            elif tag == "tr" and t.row is not None:
+                t.rows.append((t.row_in_tbody, t.row))
+                t.row = None
+            elif tag == "tbody":
+                t.in_first_tbody = False
+            elif tag == "table" and depth == t.depth:
+                self._end_table()
+        if tag in HEADING_TAGS:
+            for h in self._headings:
+                if h[3] and h[1] == depth:
+                    h[3] = False
+            if not any(h[3] for h in self._headings):
+                self._claim()
+
+    # ----------- títulos e tabelas -----------
+    def _claim(self) -> None:
+        # mesma ordem de find_all: títulos aninhados são avaliados na ordem em que abriram
+        for _, _, parts, _ in self._headings:
+            txt = " ".join(parts).lower()
+            if "soja" in txt:
+                self._soja_heading = True
+            for prod in COMMODITIES:
+                if prod in self._claimed or prod not in txt:
+                    continue
+                if self._pending:  # a próxima tabela já é de outro produto
+                    continue
+                self._pending.append(prod)
+                self._claimed.add(prod)
+                self.tables[prod] = None
+        self._headings = []
+
+    def _start_table(self) -> None:
+        blob = " ".join(reversed(self.recent))
+        if self._soja_heading:
+            self._soja_anchor = True
+        self.table = _Table(len(self.stack), blob, self._pending)
+        self._pending = []
+
+    def _end_table(self) -> None:
+        t, self.table = self.table, None
+        for prod in t.claims:
+            self.tables[prod] = (t.blob, t.grid_rows())
+        if self._fallback is None and "soja" not in self._claimed:
+            txt = " ".join(t.text).lower()
+            if all(x in txt for x in ["estado", "praça", "compra"]):
+                self._fallback = t
+        if all(self.tables.get(p) is not None for p in self.wanted):
+            self.done = True
+
+    def feed_safe(self, text: str, final: bool = False) -> None:
+        try:
+            self.feed(text)
+            if final:
+                self.close()
+                self._flush()
+                # fim do documento: o bs4 fecha o que ficou aberto (tabela sem </table> vale)
+                while self.stack and not self.done:
+                    name = self.stack.pop()
+                    self._close(name, len(self.stack))
+        except _Unsupported as e:
+            self.unsupported = str(e)
+            self.done = True
+
+    def result(self) -> Dict[str, Tuple[str, RawRows]]:
+        # produto -> (texto antes da tabela, linhas cruas), na ordem de find_commodity_tables
+        found = {p: v for p, v in self.tables.items() if v is not None}
+        t = self._fallback
+        if "soja" not in found and not self._soja_anchor and t is not None and not t.claims:
+            found["soja"] = (t.blob, t.grid_rows())
+        return found
+
+
+class StreamResult:
+
+    def __init__(self, tables: Optional[Dict[str, Tuple[str, RawRows]]], text: str, bytes_read: int,
+                 complete: bool, reason: Optional[str] = None):
+        self.tables = tables          # None => formato não suportado: use o DOM com `text`
+        self.text = text              # HTML lido (a página inteira se complete)
+        self.bytes_read = bytes_read
+        self.complete = complete      # leu até o fim do corpo
+        self.reason = reason
+
+
+def stream_tables(chunks: Iterable[bytes], encoding: Optional[str] = "utf-8",
+                  produtos: Optional[Iterable[str]] = None) -> StreamResult:
+    # Consome `chunks` (ex.: resp.iter_content()) até a última tabela pedida fechar.
+    # Se o formato não for suportado, lê o restante para o chamador usar o caminho com DOM.
+    try:
+        decoder = codecs.getincrementaldecoder(encoding or "utf-8")(errors="replace")
+    except LookupError:  # charset desconhecido no Content-Type (resp.text faz o mesmo)
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    parser = TableStream(produtos)
+    parts: List[str] = []
+    n = 0
+    complete = True
+    for chunk in chunks:
+        n += len(chunk)
+        parts.append(decoder.decode(chunk) if isinstance(chunk, bytes) else chunk)
+        if not parser.done:
+            parser.feed_safe(parts[-1])
+        if parser.done and parser.unsupported is None:
+            complete = False  # última tabela pedida já fechou: o resto do corpo não é lido
+            break
+    if complete:
+        parts.append(decoder.decode(b"", final=True))
+        if not parser.done:
+            parser.feed_safe(parts[-1], final=True)
+    tables = None if parser.unsupported else parser.result()
+    return StreamResult(tables, "".join(parts), n, complete, parser.unsupported)
+
+
+def iter_text(text: str, chunk_size: int = CHUNK_SIZE) -> Iterable[bytes]:
+    # página salva (--from-html, bench) servida em pedaços, como viria da rede
+    data = text.encode("utf-8")
+    for i in range(0, len(data), chunk_size):
+        yield data[i:i + chunk_size]
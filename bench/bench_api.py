@@ -0,0 +1,165 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import http.client
+from urllib.parse import urlencode
+from typing import Dict, List, Optional, Tuple
+
+BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from agrural_api import ApiServer, CsvSource, PriceApi, SqliteSource, notify  # noqa: E402
+from agrural_batch import PriceBatch  # noqa: E402
+from agrural_fanout import DbDestino  # noqa: E402
+from agrural_sinks import SQLiteSink  # noqa: E402
+from bench_summary import history  # noqa: E402
+
+# API de leitura (agrural_api) sobre o SQLite de teste: respostas iguais às consultas no
+# banco, 304 com If-None-Match, respostas guardadas até a próxima carga (aviso por /carga e
+# marca d'água) e tempo por requisição x consulta direta. Sai com 1 se algo divergir.
+
+ULTIMO_SQL = "SELECT data, produto, uf, praca, compra_rs_sc FROM PrecoUltimo"
+DIA_SQL = "SELECT data, produto, uf, praca, compra_rs_sc FROM PrecoSoja WHERE data = ?"
+
+
+class Client:
+    # keep-alive, como uma ferramenta que consulta a API em laço
+
+    def __init__(self, port: int):
+        self.cn = http.client.HTTPConnection("127.0.0.1", port)
+        self.etags: Dict[str, str] = {}
+
+    def get(self, path: str, conditional: bool = False) -> Tuple[int, Optional[Dict]]:
+        headers = {"If-None-Match": self.etags[path]} if conditional and path in self.etags else {}
+        self.cn.request("GET", path, headers=headers)
+        resp = self.cn.getresponse()
+        body = resp.read()
+        if resp.getheader("ETag"):
+            self.etags[path] = resp.getheader("ETag")
+        return resp.status, (json.loads(body) if body else None)
+
+
+def _rows(recs: List[Dict]) -> List[Tuple]:
+    return sorted((r["data"], r["produto"], r["uf"], r["praca"], round(r["compra_rs_sc"], 2)) for r in recs)
+
+
+def _sql(sink: SQLiteSink, sql: str, *params) -> List[Tuple]:
+    return sorted((d, p, uf, praca, round(float(v), 2)) for d, p, uf, praca, v in
+                  sink.connection().execute(sql, params))
+
+
+class CountingSource(SqliteSource):
+    # conta as leituras completas do histórico (rows) para conferir que o aviso evita a releitura
+
+    reads = 0
+
+    def rows(self):
+        self.reads += 1
+        return super().rows()
+
+
+def check(label: str, ok: bool) -> int:
+    print(f"{'ok' if ok else 'FALHOU':<8}{label}")
+    return 0 if ok else 1
+
+
+def _ms_per_call(fn, n: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) * 1000 / n
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="API de leitura: respostas, ETag/304, invalidação e tempo.")
+    p.add_argument("--pracas", type=int, default=200, help="Praças de soja na página sintética.")
+    p.add_argument("--days", type=int, default=120, help="Dias de histórico no SQLite.")
+    p.add_argument("--requests", type=int, default=2000, help="Requisições na medição de tempo.")
+    args = p.parse_args()
+
+    bad = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        days = list(history(args.pracas, args.days + 3))
+        days.sort(key=lambda b: b.first_date())
+        sink = SQLiteSink(os.path.join(tmp, "soja.db"))
+        sink.load(PriceBatch.concat(days[:args.days]))
+
+        api = PriceApi(CountingSource(sink.path))
+        api.reload()
+        server = ApiServer(api, port=0).start()
+        url = f"http://127.0.0.1:{server.port}"
+        c = Client(server.port)
+        first, last = days[0].first_date(), days[args.days - 1].first_date()
+        produto, uf, praca = _sql(sink, DIA_SQL, last)[0][1:4]
+        serie = "/precos?" + urlencode({"produto": produto, "uf": uf, "praca": praca.upper(), "de": first,
+                                        "ate": last})
+
+        _, ultimo = c.get("/precos/ultimo")
+        bad += check("/precos/ultimo = PrecoUltimo", _rows(ultimo["precos"]) == _sql(sink, ULTIMO_SQL))
+        _, dia = c.get("/precos")
+        bad += check(f"/precos (dia mais recente: {dia['data']}) = PrecoSoja do dia",
+                     dia["data"] == last and _rows(dia["precos"]) == _sql(sink, DIA_SQL, last))
+        _, s = c.get(serie)
+        bad += check(f"série de {praca}/{uf} (praça em outra caixa): {len(s['precos'])} dias",
+                     len(s["precos"]) == args.days and {r["praca"] for r in s["precos"]} == {praca})
+        bad += check("data inválida -> 400", c.get("/precos?data=18/09/2025")[0] == 400)
+        bad += check("If-None-Match igual -> 304", c.get("/precos/ultimo", conditional=True)[0] == 304)
+
+        # carga nova avisando a API: só as consultas que mudaram perdem o 304
+        gen, dia_antigo = api.generation, f"/precos?data={first}"
+        c.get(dia_antigo)
+        reads = api.source.reads
+        DbDestino(sink, notify=lambda b, r: notify(url, b, r.watermark)).deliver(days[args.days])
+        bad += check("aviso de carga (/carga) -> nova geração", api.generation == gen + 1)
+        status, ultimo = c.get("/precos/ultimo", conditional=True)
+        bad += check("consulta afetada -> 200 com a carga nova",
+                     status == 200 and _rows(ultimo["precos"]) == _sql(sink, ULTIMO_SQL))
+        bad += check("consulta não afetada (dia antigo) -> continua 304", c.get(dia_antigo, conditional=True)[0] == 304)
+        bad += check("aviso traz a marca d'água da carga -> a conferência seguinte não relê",
+                     not api.refresh() and api.source.reads == reads)
+
+        # carga por outro processo, sem aviso, e antes do poll uma carga que avisa: a marca
+        # d'água da primeira não pode ser tomada como vista pelo aviso da segunda
+        sink.load(days[args.days + 1])
+        DbDestino(sink, notify=lambda b, r: notify(url, b, r.watermark)).deliver(days[args.days + 2])
+        bad += check("carga sem aviso -> detectada pela marca d'água", api.refresh())
+        _, dia = c.get(f"/precos?data={days[args.days + 1].first_date()}")
+        bad += check("dia da carga sem aviso presente depois da releitura",
+                     _rows(dia["precos"]) == _sql(sink, DIA_SQL, days[args.days + 1].first_date()))
+        _, ultimo = c.get("/precos/ultimo", conditional=True)
+        bad += check("depois da releitura = PrecoUltimo", _rows(ultimo["precos"]) == _sql(sink, ULTIMO_SQL))
+        gen = api.generation
+        bad += check("sem carga nova -> respostas guardadas continuam", not api.refresh() and api.generation == gen)
+
+        # tempo: consulta direta no banco x API (resposta guardada, 200 e 304)
+        cur = sink.connection()
+        n = args.requests
+        direct = _ms_per_call(lambda: cur.execute(ULTIMO_SQL).fetchall(), n)
+        full = _ms_per_call(lambda: c.get("/precos/ultimo"), n)
+        cond = _ms_per_call(lambda: c.get("/precos/ultimo", conditional=True), n)
+        h = api.health()
+        print(f"\n{n} requisições de /precos/ultimo ({len(ultimo['precos'])} praças, {h['cotacoes']} cotações em "
+              f"memória): SQLite direto {direct:.3f} ms, API 200 {full:.3f} ms, API 304 {cond:.3f} ms por "
+              f"requisição; {h['acertos']} acertos / {h['faltas']} faltas no cache de respostas.")
+        server.shutdown()
+        sink.close()
+
+        # CSV do scrape como fonte
+        path = os.path.join(tmp, "soja.csv")
+        days[0].write_csv(path)
+        api = PriceApi(CsvSource(path))
+        api.reload()
+        bad += check("fonte CSV", len(json.loads(api.get("/precos", {})[1])["precos"]) == len(days[0]))
+        days[1].write_csv(path)
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 1))
+        bad += check("CSV regravado -> relido", api.refresh()
+                     and json.loads(api.get("/precos", {})[1])["data"] == days[1].first_date())
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
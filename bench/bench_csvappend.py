@@ -0,0 +1,138 @@
+import os
+import csv
+import sys
+import time
+import random
+import argparse
+import tempfile
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from agrural_batch import COLUMNS, PriceBatch  # noqa: E402
+from agrural_core import batch_from_html  # noqa: E402
+from agrural_csvappend import AppendCsv, _key  # noqa: E402
+from bench_pipeline import synth_page  # noqa: E402
+
+# CSV em modo acréscimo (agrural_csvappend): tempo de cada execução diária conforme o arquivo
+# cresce (deve ficar constante) x ler/deduplicar/regravar o arquivo inteiro, com revisões de
+# valores no meio (log de atualizações + compactação). No fim confere o conteúdo contra o
+# esperado e a recuperação depois de gravações interrompidas. Sai com 1 se algo divergir.
+
+
+def day_batch(base: PriceBatch, day: date, bump: int) -> PriceBatch:
+    b = base.take(np.arange(len(base)))
+    b.text["data"] = np.full(len(b), day.isoformat(), dtype=object)
+    b.cents["compra_R$/sc"] = b.cents["compra_R$/sc"] + (day.toordinal() * 7 + bump) % 300
+    return b
+
+
+def rewrite_all(path: str, batch: PriceBatch) -> None:
+    # o jeito sem índice: lê tudo, a linha nova vence, regrava tudo
+    rows: Dict[Tuple, Tuple] = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            r = csv.reader(f)
+            next(r)
+            for row in r:
+                rows[_key(row)] = tuple(row)
+    for row in batch.csv_rows():
+        rows[_key(row)] = row
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f, lineterminator=os.linesep)
+        w.writerow(COLUMNS)
+        w.writerows(rows.values())
+
+
+def check(label: str, ok: bool) -> int:
+    print(f"{'ok' if ok else 'FALHOU':<8}{label}")
+    return 0 if ok else 1
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="CSV em modo acréscimo: custo por execução, conteúdo e recuperação.")
+    p.add_argument("--pracas", type=int, default=60, help="Praças de soja na página sintética.")
+    p.add_argument("--days", type=int, default=1500, help="Dias (execuções) acumulados no CSV.")
+    p.add_argument("--revisions", type=float, default=0.3,
+                   help="Fração dos dias com uma 2a execução que muda parte dos valores.")
+    p.add_argument("--seed", type=int, default=20251017)
+    args = p.parse_args()
+
+    rng = random.Random(args.seed)
+    base = batch_from_html(synth_page(args.pracas))
+    start = date(2021, 1, 4)
+    marks = sorted({1, 10, 100, 500, 1000, args.days} & set(range(1, args.days + 1)))
+    expected: Dict[Tuple, List[str]] = {}
+    bad = 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path, naive = os.path.join(tmp, "soja.csv"), os.path.join(tmp, "ingenuo.csv")
+        print(f"{'dia':>6}{'linhas':>10}{'MB':>8}{'acréscimo ms':>15}{'regravar tudo ms':>18}")
+        for i in range(1, args.days + 1):
+            day = start + timedelta(days=i)
+            runs = [day_batch(base, day, 0)]
+            if rng.random() < args.revisions:
+                rev = day_batch(base, day, 0)
+                idx = rng.sample(range(len(rev)), max(1, len(rev) // 10))
+                rev.cents["compra_R$/sc"][idx] += 50
+                runs.append(rev)
+            t0 = time.perf_counter()
+            for b in runs:
+                AppendCsv(path).append(b)
+            ms = (time.perf_counter() - t0) * 1000 / len(runs)
+            for b in runs:
+                for row in b.csv_rows():
+                    expected.setdefault(_key(row), list(row))[4:] = list(row[4:])
+            if i in marks:
+                # o ingênuo só é medido nos pontos da tabela (reconstruído do zero até aqui)
+                with open(naive, "w", encoding="utf-8", newline="") as f:
+                    csv.writer(f, lineterminator=os.linesep).writerows([COLUMNS] + [tuple(r) for r in expected.values()])
+                t0 = time.perf_counter()
+                rewrite_all(naive, runs[-1])
+                naive_ms = (time.perf_counter() - t0) * 1000
+                print(f"{i:>6}{len(expected):>10}{os.path.getsize(path) / 2 ** 20:>8.1f}{ms:>15.2f}{naive_ms:>18.1f}")
+
+        store = AppendCsv(path)
+        got = {_key(r): r for r in store.rows()}
+        bad += check(f"conteúdo (CSV + log) = esperado: {len(got)} chaves, {store.meta['log_rows']} no log",
+                     got == expected)
+        bad += check("índice confere com o CSV", not store.check())
+        store.compact()
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            rows = list(csv.reader(f))[1:]
+        bad += check("depois de --compact o próprio CSV = esperado, sem chave repetida",
+                     len(rows) == len(expected) and {_key(r): r for r in rows} == expected
+                     and not AppendCsv(path).check())
+
+        # gravações interrompidas: linha pela metade no fim, índice à frente dos dados, sem meta.json
+        last = start + timedelta(days=args.days + 1)
+        with open(path, "ab") as f:
+            f.write(b"2099-01-01,soja,PR,Linha cort")
+        b = day_batch(base, last, 0)
+        bad += check("linha incompleta no fim -> índice reconstruído, acréscimo normal",
+                     AppendCsv(path).append(b)["inserted"] == len(b) and not AppendCsv(path).check())
+        store = AppendCsv(path)
+        store.meta["csv_size"] -= 10
+        store._write_meta()
+        bad += check("meta.json fora do disco -> reconstruído sem duplicar",
+                     AppendCsv(path).append(b)["unchanged"] == len(b) and not AppendCsv(path).check())
+        os.remove(store.meta_path)
+        rev = day_batch(base, last, 5)
+        r = AppendCsv(path).append(rev)
+        bad += check("sem meta.json -> reconstruído; revisão vai para o log",
+                     r["updated"] == len(rev) and not AppendCsv(path).check())
+        store = AppendCsv(path)
+        store.meta["compactando"] = True
+        store._write_meta()
+        store = AppendCsv(path)
+        bad += check("compactação interrompida -> reconstruído", not store.check() and store.compact() == len(rev))
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
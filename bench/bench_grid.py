@@ -0,0 +1,149 @@
+import os
+import sys
+import time
+import random
+import argparse
+from typing import Dict, List, Sequence, Tuple
+
+BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE)
+
+from agrural_core import normalize  # noqa: E402
+from agrural_grid import expand_grid  # noqa: E402
+
+# Motor de expansão rowspan+colspan (agrural_grid.expand_grid) contra uma implementação de
+# referência direta (dict por posição da grade, última escrita vence) em tabelas aleatórias
+# com spans tortos, e tempo em tabelas grandes com muitos spans. Sai com 1 se divergir.
+
+# valores de rowspan/colspan sorteados: válidos, 0, lixo, enormes e ausentes
+_SPANS = [None, "", "1", "2", "3", " 2", "2;", "2.9", "+2", "0", "-1", "x", "1e3", "٣", "99999", 2, 4]
+
+
+def _span_ref(value, limit: int) -> int:
+    # regra do HTML lida à mão (sem regex): espaços, "+" opcional, dígitos ASCII do começo
+    if value is None:
+        return 1
+    s = str(value).lstrip(" \t\n\f\r")
+    if s.startswith("+"):
+        s = s[1:]
+    digits = ""
+    for ch in s:
+        if "0" <= ch <= "9":
+            digits += ch
+        else:
+            break
+    if not digits:
+        return 1
+    return min(int(digits), limit)
+
+
+def reference_expand(rows_raw: Sequence[Sequence[Tuple]]) -> List[List[str]]:
+    n = len(rows_raw)
+    slots: List[Dict[int, str]] = [{} for _ in range(n)]
+    for r, cells in enumerate(rows_raw):
+        c = 0
+        for cell in cells:
+            while c in slots[r]:
+                c += 1
+            rs = _span_ref(cell[1], 65534)
+            rs = n - r if rs == 0 else rs
+            cs = max(_span_ref(cell[2] if len(cell) > 2 else None, 1000), 1)
+            for i in range(r, min(n, r + rs)):
+                for j in range(c, c + cs):
+                    slots[i][j] = normalize(cell[0])
+            c += cs
+    return [[m.get(j, "") for j in range(max(m) + 1)] if m else [] for m in slots]
+
+
+def random_table(rng: random.Random, rows: int, cols: int, tortos: bool) -> List[List[Tuple]]:
+    out = []
+    for r in range(rows):
+        cells = []
+        for j in range(rng.randint(0, cols)):
+            if tortos:
+                rs, cs = rng.choice(_SPANS), rng.choice(_SPANS)
+            else:
+                rs = str(rng.choice([1, 1, 1, 2, 3, 5])) if rng.random() < 0.3 else None
+                cs = str(rng.choice([2, 3])) if rng.random() < 0.1 else None
+            cells.append((f" r{r}c{j}\xa0", rs, cs))
+        out.append(cells)
+    return out
+
+
+def heavy_table(rows: int, rng: random.Random) -> List[List[Tuple]]:
+    # formato da AgRural (UF em rowspan longo) com cabeçalho em colspan, praças agrupadas em
+    # rowspan no meio da linha e notas em colspan
+    out = [[("Estado", None, None), ("Praça", None, None), ("Compra", None, None),
+            ("Variação", None, "3")]]
+    left_uf = left_grp = 0
+    for r in range(1, rows):
+        cells = []
+        if left_uf == 0:
+            left_uf = min(rng.randint(5, 200), rows - r)
+            cells.append((f"UF{r}", str(left_uf), None))
+        left_uf -= 1
+        if left_uf and rng.random() < 0.05:
+            cells.append((f"nota {r}", None, "5"))
+            out.append(cells)
+            continue
+        cells.append((f"Praça {r}", None, None))
+        if left_grp == 0:
+            left_grp = rng.randint(1, 8)
+            cells.append((f"{r},00", str(left_grp), None))
+        left_grp -= 1
+        cells += [("1,0%", None, None), ("2,0%", "2" if r % 7 == 0 else None, None), ("3,0%", None, None)]
+        out.append(cells)
+    return out
+
+
+def check(cases: int, seed: int) -> int:
+    rng = random.Random(seed)
+    for i in range(cases):
+        tortos = i % 2 == 1
+        rows_raw = random_table(rng, rng.randint(0, 12), 6, tortos)
+        got, ref = expand_grid(rows_raw, normalize), reference_expand(rows_raw)
+        if got != ref:
+            print(f"DIFERENTE no caso {i} (seed {seed}):")
+            for row in rows_raw:
+                print("  ", row)
+            print("motor:     ", got)
+            print("referência:", ref)
+            return 1
+    print(f"Equivalência: {cases} tabelas aleatórias (metade com spans inválidos/sobrepostos) iguais à referência.")
+    return 0
+
+
+def _best(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, (time.perf_counter() - t0) * 1000)
+    return best
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Motor de expansão rowspan+colspan: equivalência e tempo.")
+    p.add_argument("--cases", type=int, default=5000, help="Tabelas aleatórias comparadas com a referência.")
+    p.add_argument("--seed", type=int, default=20251017)
+    p.add_argument("--sizes", default="20000,50000,100000", help="Linhas das tabelas grandes.")
+    p.add_argument("--repeat", type=int, default=3)
+    args = p.parse_args()
+
+    bad = check(args.cases, args.seed)
+    print(f"\n{'linhas':>8}{'células':>10}{'motor ms':>11}{'ref ms':>10}{'células/s':>14}")
+    for n in [int(x) for x in args.sizes.split(",") if x]:
+        rows_raw = heavy_table(n, random.Random(n))
+        grid = expand_grid(rows_raw, normalize)
+        if grid != reference_expand(rows_raw):
+            print(f"DIFERENTE na tabela de {n} linhas")
+            bad = 1
+        cells = sum(len(r) for r in grid)
+        eng = _best(lambda: expand_grid(rows_raw, normalize), args.repeat)
+        ref = _best(lambda: reference_expand(rows_raw), 1)
+        print(f"{n:>8}{cells:>10}{eng:>11.1f}{ref:>10.1f}{cells / eng * 1000:>14,.0f}")
+    return bad
+
+
+if __name__ == "__main__":
+    sys.exit(main())
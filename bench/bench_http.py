@@ -0,0 +1,128 @@
+import os
+import sys
+import time
+import argparse
+
+BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE)
+
+from agrural_http import FetchError, get as http_get, iter_body, make_session  # noqa: E402
+from agrural_metrics import METRICS  # noqa: E402
+from fixture_server import FIXTURES, FixtureServer  # noqa: E402
+
+# Camada HTTP contra o servidor local com falhas sob encomenda: 503 seguidos de sucesso,
+# Retry-After, 404 sem nova tentativa, servidor pendurado ou mandando o corpo a conta-gotas
+# dentro do prazo, gzip e reuso das conexões do pool (keep-alive) comparado a uma conexão
+# nova por requisição.
+
+PAGE = "agrural_precos.html"
+
+
+def _attempts():
+    return [e for e in METRICS.events if e["event"] == "http_attempt"]
+
+
+def check(name: str, ok: bool, detail: str) -> int:
+    print(f"  {name:<34} {'ok' if ok else 'FALHOU'}  {detail}")
+    return 0 if ok else 1
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Novas tentativas, prazo, gzip e keep-alive contra um servidor local.")
+    p.add_argument("--requests", type=int, default=30, help="Requisições no teste de keep-alive.")
+    args = p.parse_args()
+
+    srv = FixtureServer().start()
+    base = f"http://127.0.0.1:{srv.port}/{PAGE}"
+    with open(os.path.join(FIXTURES, PAGE), "rb") as f:
+        page = f.read()
+    s = make_session(retries=3, deadline_s=10)
+    bad = 0
+
+    METRICS.reset()
+    t0 = time.perf_counter()
+    resp = http_get(base + "?fail=2", s, backoff_s=0.05)
+    st = [a["status"] for a in _attempts()]
+    bad += check("503, 503 e depois 200", resp.content == page and st == [503, 503, 200],
+                 f"status {st}, {METRICS.counters['http_retries']} novas tentativas, "
+                 f"{(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    METRICS.reset()
+    t0 = time.perf_counter()
+    http_get(base + "?fail=1&retry_after=0.3", s, backoff_s=0.01)
+    ms = (time.perf_counter() - t0) * 1000
+    bad += check("Retry-After respeitado", ms >= 300, f"{ms:.0f} ms (mínimo 300)")
+
+    METRICS.reset()
+    try:
+        http_get(base + "?fail=9", s, retries=2, backoff_s=0.01)
+        err = "nenhum"
+    except Exception as e:
+        err = type(e).__name__
+    bad += check("desiste após as novas tentativas", err == "HTTPError" and len(_attempts()) == 3,
+                 f"{len(_attempts())} tentativas, erro {err}")
+
+    METRICS.reset()
+    try:
+        http_get(base + "?status=404", s, backoff_s=0.01)
+        err = "nenhum"
+    except Exception as e:
+        err = type(e).__name__
+    bad += check("404 sem nova tentativa", err == "HTTPError" and len(_attempts()) == 1,
+                 f"{len(_attempts())} tentativa, erro {err}")
+
+    METRICS.reset()
+    t0 = time.perf_counter()
+    try:
+        http_get(base + "?stall=5", s, deadline_s=1.0, backoff_s=0.05)
+        err = "nenhum"
+    except (FetchError, Exception) as e:
+        err = type(e).__name__
+    ms = (time.perf_counter() - t0) * 1000
+    bad += check("servidor pendurado, prazo de 1 s", err in ("FetchError", "ReadTimeout") and ms < 1500,
+                 f"{ms:.0f} ms, {len(_attempts())} tentativa(s), erro {err}")
+
+    for label, stream in (("corpo a conta-gotas, prazo de 1 s", False), ("idem, leitura em fluxo", True)):
+        METRICS.reset()
+        t0 = time.perf_counter()
+        try:
+            resp = http_get(base + f"?trickle=0.2&s={int(stream)}", s, deadline_s=1.0, stream=stream)
+            if stream:
+                for _ in iter_body(resp):
+                    pass
+            err = "nenhum"
+        except Exception as e:
+            err = type(e).__name__
+        ms = (time.perf_counter() - t0) * 1000
+        bad += check(label, err == "FetchError" and ms < 1500, f"{ms:.0f} ms, erro {err}")
+
+    METRICS.reset()
+    resp = http_get(base + "?gz=1", s)
+    a = _attempts()[-1]
+    bad += check("gzip na rede", resp.content == page and a["wire_bytes"] < a["bytes"],
+                 f"{a['wire_bytes'] / 1024:.0f} KB na rede para {a['bytes'] / 1024:.0f} KB "
+                 f"({resp.headers.get('Content-Encoding')})")
+
+    import requests
+    conns = srv.connections
+    t0 = time.perf_counter()
+    for i in range(args.requests):
+        http_get(f"{base}?k={i}", s)
+    pooled_ms, pooled = (time.perf_counter() - t0) * 1000, srv.connections - conns
+    conns = srv.connections
+    t0 = time.perf_counter()
+    for i in range(args.requests):
+        requests.get(f"{base}?n={i}", timeout=30).content
+    fresh_ms, fresh = (time.perf_counter() - t0) * 1000, srv.connections - conns
+    bad += check("keep-alive (pool da sessão)", pooled <= 1 and fresh == args.requests,
+                 f"{args.requests} GETs: {pooled} conexão(ões) em {pooled_ms:.0f} ms; "
+                 f"sem sessão {fresh} conexões em {fresh_ms:.0f} ms")
+
+    s.close()
+    srv.shutdown()
+    print(f"{'Tudo certo.' if not bad else f'{bad} verificação(ões) falharam.'}")
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
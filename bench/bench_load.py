@@ -0,0 +1,48 @@
+import os
+import sys
+import argparse
+import tempfile
+from typing import List
+
+BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from agrural_sinks import SQLSERVER_STRATEGIES, Sink, SQLiteSink, SqlServerSink  # noqa: E402
+from bench_pipeline import synth_page  # noqa: E402
+from agrural_core import batch_from_html  # noqa: E402
+
+
+def bench_sink(make, sizes: List[int]) -> None:
+    for n in sizes:
+        batch = batch_from_html(synth_page(n))
+        with make() as sink:  # type: Sink
+            first = sink.load(batch)     # carga inicial (só INSERT)
+            again = sink.load(batch)     # recarga idêntica (MERGE sem mudanças)
+        print(f"  {n:>7} linhas: inicial {first.rows_per_sec:>12,.0f} linhas/s | "
+              f"recarga {again.rows_per_sec:>12,.0f} linhas/s")
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Benchmark das estratégias de carga (linhas/s).")
+    p.add_argument("--sizes", default="1000,10000,50000")
+    p.add_argument("--conn-str", help="Connection string ODBC de um banco de TESTE: mede também o SQL Server "
+                                      "(grava linhas sintéticas em dbo.PrecoSojaFato/DimPraca).")
+    p.add_argument("--bulk-dir", help="Pasta visível pelo SQL Server para a estratégia bulk.")
+    args = p.parse_args()
+    sizes = [int(x) for x in args.sizes.split(",") if x.strip()]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print("sqlite/upsert")
+        counter = iter(range(10 ** 6))
+        bench_sink(lambda: SQLiteSink(os.path.join(tmp, f"bench_{next(counter)}.db")), sizes)
+
+    if args.conn_str:
+        for strategy in SQLSERVER_STRATEGIES:
+            print(f"sqlserver/{strategy}")
+            bench_sink(lambda: SqlServerSink(args.conn_str, strategy=strategy, bulk_dir=args.bulk_dir), sizes)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE)
+
+from agrural_parsers import PARSERS, make_soup  # noqa: E402
+from agrural_core import (  # noqa: E402
+    find_commodity_tables, parse_date_near, expand_html_table, batch_from_grid, fetch_html,
+)
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+UFS = ["PR", "SC", "RS", "MT", "MS", "GO", "SP", "MG", "BA", "MA", "TO", "PI", "PA", "DF"]
+
+
+# Página sintética no formato da AgRural com n_rows linhas de soja (UF em rowspan de `span`
+# linhas) e uma tabela de milho de 1/4 do tamanho, cercadas de "ruído" de layout.
+def synth_page(n_rows: int, span: int = 6) -> str:
+    def table(n, base_price):
+        out = ['<table class="tabela"><tbody>',
+               "<tr><td>Estado</td><td>Praça</td><td>Compra (R$/sc)</td>"
+               "<td>Variação hoje</td><td>1 semana</td><td>1 mês</td></tr>"]
+        i = 0
+        while i < n:
+            k = min(span, n - i)
+            uf = UFS[(i // span) % len(UFS)]
+            for j in range(k):
+                first = f'<td rowspan="{k}">{uf}</td>' if j == 0 else ""
+                p = base_price + ((i + j) % 400) / 4
+                out.append(f"<tr>{first}<td>Praça {i + j:05d}</td><td>{p:.2f}".replace(".", ",")
+                           + f"</td><td>-{(i + j) % 3},50%</td><td>{(i + j) % 5},0%</td>"
+                             f"<td>-{(i + j) % 7},25%</td></tr>")
+            i += k
+        out.append('<tr><td colspan="6">Fonte: AgRural</td></tr></tbody></table>')
+        return "\n".join(out)
+
+    noise = "".join(f'<div class="item"><span>Notícia {i}</span><a href="#n{i}">ler</a></div>'
+                    for i in range(max(50, n_rows // 10)))
+    return (f"<!doctype html><html><head><title>Preços</title></head><body>"
+            f'<div class="menu">{noise}</div><div class="content">'
+            f"<h3>SOJA</h3><p>18-Sep-25</p>\n{table(n_rows, 110.0)}\n"
+            f"<h3>MILHO</h3><p>18-Sep-25</p>\n{table(max(1, n_rows // 4), 55.0)}\n"
+            f"</div></body></html>")
+
+
+def load_inputs(sizes: List[int]) -> List[Tuple[str, str]]:
+    inputs = []
+    for fn in sorted(os.listdir(FIXTURES)):
+        if fn.endswith(".html"):
+            with open(os.path.join(FIXTURES, fn), "r", encoding="utf-8") as f:
+                inputs.append((fn, f.read()))
+    for n in sizes:
+        inputs.append((f"sintetica_{n}", synth_page(n)))
+    return inputs
+
+
+# Cada estágio recebe o estado do anterior; assim dá para cronometrar um de cada vez
+def pipeline(html: str, parser: str, restrict: bool) -> List[Tuple[str, Callable]]:
+    st: Dict = {}
+
+    def soup():
+        st["soup"] = make_soup(html, parser, restrict)
+
+    def find_tables():
+        st["tables"] = find_commodity_tables(st["soup"])
+
+    def parse_date():
+        st["dates"] = {p: parse_date_near(t) for p, t in st["tables"].items()}
+
+    def expand():
+        st["grids"] = {p: expand_html_table(t) for p, t in st["tables"].items()}
+
+    def rows():
+        st["rows"] = [batch_from_grid(g, st["dates"][p], p) for p, g in st["grids"].items()]
+
+    return [("soup", soup), ("find_tables", find_tables), ("parse_date", parse_date),
+            ("expand", expand), ("rows", rows)]
+
+
+def run_stages(html: str, parser: str, restrict: bool, repeat: int) -> Dict[str, Dict[str, float]]:
+    result: Dict[str, Dict[str, float]] = {}
+    # tempo: melhor de `repeat` execuções, sem tracemalloc (ele distorce o tempo)
+    for _ in range(repeat):
+        for name, fn in pipeline(html, parser, restrict):
+            t0 = time.perf_counter()
+            fn()
+            ms = (time.perf_counter() - t0) * 1000
+            cur = result.setdefault(name, {"ms": ms})
+            cur["ms"] = min(cur["ms"], ms)
+    # memória: pico alocado dentro de cada estágio, numa passada separada
+    for name, fn in pipeline(html, parser, restrict):
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result[name]["peak_kb"] = peak / 1024
+    return result
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Benchmark por estágio do pipeline de scrape (offline).")
+    p.add_argument("--sizes", default="200,2000,20000", help="Linhas das tabelas sintéticas (vírgula).")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--parser", default="html.parser", choices=PARSERS)
+    p.add_argument("--restrict-parse", action="store_true")
+    p.add_argument("--live", action="store_true", help="Mede também o download real do site.")
+    p.add_argument("--baseline", default=DEFAULT_BASELINE, help="JSON com os tempos de referência.")
+    p.add_argument("--save-baseline", action="store_true", help="Grava os tempos atuais como referência.")
+    p.add_argument("--threshold", type=float, default=0.30, help="Regressão tolerada (0.30 = +30%%).")
+    p.add_argument("--min-ms", type=float, default=1.0, help="Ignora diferenças abaixo disso (ruído).")
+    p.add_argument("--mem-threshold", type=float, default=0.30,
+                   help="Aumento de pico de memória tolerado (0.30 = +30%%).")
+    p.add_argument("--min-kb", type=float, default=64.0, help="Ignora aumentos de pico abaixo disso (KB).")
+    args = p.parse_args()
+
+    sizes = [int(x) for x in args.sizes.split(",") if x.strip()]
+    results: Dict[str, Dict[str, float]] = {}
+
+    if args.live:
+        t0 = time.perf_counter()
+        html = fetch_html(None)
+        results["live/download"] = {"ms": (time.perf_counter() - t0) * 1000,
+                                    "bytes": len((html or "").encode("utf-8"))}
+
+    print(f"{'entrada':<28}{'estágio':<14}{'ms':>10}{'pico KB':>12}")
+    for name, html in load_inputs(sizes):
+        for stage, m in run_stages(html, args.parser, args.restrict_parse, args.repeat).items():
+            key = f"{name}/{stage}"
+            results[key] = m
+            print(f"{name:<28}{stage:<14}{m['ms']:>10.2f}{m['peak_kb']:>12.0f}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"parser": args.parser, "restrict": args.restrict_parse, "results": results}, f, indent=2)
+        print(f"Referência gravada em {args.baseline}")
+        return 0
+
+    # a referência é desta máquina (bench/baseline.json fica fora do git): sem ela o
+    # gate não tem com o que comparar, e passar calado esconderia qualquer regressão
+    if not os.path.exists(args.baseline):
+        print(f"Sem referência em {args.baseline}: grave uma com --save-baseline na máquina de medição "
+              "(antes da mudança) e rode de novo.")
+        return 2
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        saved = json.load(f)
+    # tempos de outro backend (ou com/sem SoupStrainer) não dizem nada sobre regressão
+    mode = (saved.get("parser", "html.parser"), bool(saved.get("restrict", False)))
+    if mode != (args.parser, args.restrict_parse):
+        print(f"Referência gravada com --parser {mode[0]}{' --restrict-parse' if mode[1] else ''}; "
+              f"esta execução usa --parser {args.parser}{' --restrict-parse' if args.restrict_parse else ''}. "
+              "Comparação recusada (grave outra com --save-baseline --baseline <arquivo>).")
+        return 2
+    base = saved["results"]
+    regressions = []
+    for key, m in results.items():
+        b = base.get(key)
+        if not b or key.startswith("live/"):
+            continue
+        if m["ms"] > b["ms"] * (1 + args.threshold) and m["ms"] - b["ms"] > args.min_ms:
+            regressions.append(f"{key}: {b['ms']:.2f} ms -> {m['ms']:.2f} ms")
+        # pico de memória (tracemalloc) quase não varia entre execuções: limite próprio
+        if ("peak_kb" in b and m["peak_kb"] > b["peak_kb"] * (1 + args.mem_threshold)
+                and m["peak_kb"] - b["peak_kb"] > args.min_kb):
+            regressions.append(f"{key}: pico {b['peak_kb']:.0f} KB -> {m['peak_kb']:.0f} KB")
+    for r in regressions:
+        print(f"REGRESSÃO {r}")
+    print("OK: nenhum estágio acima do limite." if not regressions else f"{len(regressions)} regressões.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
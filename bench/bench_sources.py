@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE)
+
+from agrural_sources import HostLimiter, Source, collect, combine, load_sources  # noqa: E402
+from agrural_sinks import FONTE  # noqa: E402
+from agrural_core import batch_from_html  # noqa: E402
+from fixture_server import FIXTURES, FixtureServer  # noqa: E402
+
+EXAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fontes_exemplo.json")
+
+# Coletor de várias fontes contra o servidor local de fixtures: confere os lotes por fonte
+# (as cópias da AgRural são a mesma fonte e se deduplicam; a cooperativa fica à parte),
+# o limite de concorrência e o espaçamento por host, e compara o tempo com a coleta em série.
+# 127.0.0.1 e localhost caem no mesmo servidor mas contam como hosts diferentes.
+
+
+def sources_for(port: int, copies: int):
+    coop = [s for s in load_sources(EXAMPLE)[0] if s.name == "cooperativa"][0]
+    out = []
+    for i in range(copies):
+        for host in ("127.0.0.1", "localhost"):
+            out.append(Source(f"agrural-{host}-{i}", f"http://{host}:{port}/agrural_precos.html?c={i}", fonte=FONTE))
+    coop.url = f"http://localhost:{port}/fontes/regional.html"
+    return out + [coop]
+
+
+def run(srv: FixtureServer, sources, limiter: HostLimiter):
+    srv.peak.clear()
+    srv.arrivals.clear()
+    t0 = time.perf_counter()
+    results = asyncio.run(collect(sources, limiter))
+    return results, (time.perf_counter() - t0) * 1000
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Coleta multi-fonte contra um servidor HTTP local.")
+    p.add_argument("--copies", type=int, default=4, help="Cópias da página da AgRural por host.")
+    p.add_argument("--delay", type=float, default=0.2, help="Atraso de cada resposta do servidor (s).")
+    p.add_argument("--concurrency", type=int, default=2)
+    p.add_argument("--rate", type=float, default=20.0)
+    args = p.parse_args()
+
+    srv = FixtureServer(delay=args.delay).start()
+    sources = sources_for(srv.port, args.copies)
+    status = 0
+
+    results, ms = run(srv, sources, HostLimiter(args.concurrency, args.rate))
+    errors = [f"{r['name']}: {r['error']}" for r in results if r["error"]]
+    for e in errors:
+        print(f"ERRO {e}")
+    batches, dup = combine(results)
+    with open(os.path.join(FIXTURES, "agrural_precos.html"), encoding="utf-8") as f:
+        agrural = batch_from_html(f.read())
+    got = {f: len(b) for f, b in batches.items()}
+    expected = {FONTE: len(agrural), "cooperativa": 5}
+    print(f"{len(sources)} fontes em {ms:.0f} ms: {got} (esperado {expected}), {dup} repetidas")
+    if errors or got != expected:
+        status = 1
+
+    for host, peak in sorted(srv.peak.items()):
+        arr = srv.arrivals[host]
+        gap = min((b - a for a, b in zip(arr, arr[1:])), default=0.0)
+        ok = peak <= args.concurrency and gap >= 1.0 / args.rate - 0.01
+        print(f"  {host:<22} pico {peak} em voo (limite {args.concurrency}), menor intervalo "
+              f"{gap * 1000:.0f} ms (mínimo {1000 / args.rate:.0f} ms) {'ok' if ok else 'FORA DO LIMITE'}")
+        status |= 0 if ok else 1
+
+    t0 = time.perf_counter()
+    for s in sources:
+        asyncio.run(collect([s], HostLimiter(1, 0)))
+    serial = (time.perf_counter() - t0) * 1000
+    print(f"Em série: {serial:.0f} ms; em paralelo: {ms:.0f} ms")
+    srv.shutdown()
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,35 @@
+import os
+import sys
+import argparse
+
+BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE)
+
+from agrural_startup import STARTUP_TARGET_MS, profile_startup, scenarios  # noqa: E402
+
+ENTRIES = {
+    "agrural_soja_to_sqlserver_windows": "sqlserver",
+    "scrape_agrural_soja": None,
+}
+
+
+def main() -> int:
+    # Meta de inicialização dos dois pontos de entrada (mesma checagem do --profile-startup),
+    # medida numa execução real "sem mudança" (servidor local + cache aquecido): sai com 1 se
+    # algum passar da meta, carregar numpy/bs4/pandas nesse caminho ou importar módulo pesado no topo.
+    p = argparse.ArgumentParser(description="Custo de import dos scripts (meta de inicialização).")
+    p.add_argument("--target-ms", type=float, default=STARTUP_TARGET_MS)
+    p.add_argument("--parser", default="html.parser")
+    args = p.parse_args()
+
+    status = 0
+    for entry, sink in ENTRIES.items():
+        print(f"=== {entry}")
+        status |= profile_startup(entry, scenarios(args.parser, sink=sink), target_ms=args.target_ms,
+                                  cache_hit_args=["--parser", args.parser])
+        print()
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
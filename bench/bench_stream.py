@@ -0,0 +1,104 @@
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+from typing import Callable, List, Tuple
+
+BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE)
+
+from agrural_stream import CHUNK_SIZE, iter_text, stream_tables  # noqa: E402
+from bench_pipeline import load_inputs  # noqa: E402
+from agrural_core import batch_from_html, batch_from_stream  # noqa: E402
+
+# Casos pequenos de HTML "torto" em que a leitura em fluxo precisa dar o mesmo resultado do
+# DOM (por conta própria ou caindo no DOM): títulos aninhados, tags sem fechar, thead+tbody,
+# comentário antes da tabela, página sem título de soja, tabela sem </table>...
+_T = ("<table>{head}<tr><td>Estado</td><td>Praça</td><td>Compra</td><td>Variação hoje</td>"
+      "<td>1 semana</td><td>1 mês</td></tr>"
+      '<tr><td rowspan="2">PR</td><td>Cascavel</td><td>{p},00</td><td>1%</td><td>2%</td><td>3%</td></tr>'
+      "<tr><td>Maringá &amp; região</td><td>{p},50</td><td>1%</td><td>2%</td><td>3%</td></tr>{tail}")
+EDGE_CASES = {
+    "titulos_aninhados": "<p>SOJA <strong>MILHO</strong></p><p>18-Sep-25</p>" + _T.format(head="", p=1, tail="</table>")
+                         + "<h3>MILHO</h3><p>17-Sep-25</p>" + _T.format(head="", p=2, tail="</table>"),
+    "mesmo_titulo": "<h3>SOJA E MILHO</h3>18-Sep-25" + _T.format(head="", p=1, tail="</table>"),
+    "thead_tbody": "<h3>SOJA</h3><!-- 01-Jan-20 --><p>18-set-25</p>"
+                   + _T.format(head="<thead><tr><td>x</td></tr></thead><tbody>", p=1, tail="</tbody></table>"),
+    "sem_titulo": "<div>Cotação 18-Sep-25</div>" + _T.format(head="", p=1, tail="</table>"),
+    "sem_fechar": "<h3>SOJA</h3><p>18-Sep-25" + _T.format(head="", p=1, tail=""),
+    "tr_sem_fechar": "<h3>SOJA</h3>18-Sep-25" + _T.format(head="", p=1, tail="</table>").replace("</tr>", ""),
+    "p_aberto": "<div><p>SOJA</div><script>var t='<table>';</script>18-Sep-25"
+                + _T.format(head="", p=1, tail="</table>"),
+    "colspan": "<h3>SOJA</h3>18-Sep-25" + _T.format(head="", p=1, tail="</table>").replace(
+        "<td>2%</td><td>3%</td></tr><tr>", '<td colspan="2;">2%</td></tr><tr>', 1),
+    "milho_primeiro": "<h3>MILHO</h3><h3>SOJA</h3>18-Sep-25" + _T.format(head="", p=1, tail="</table>")
+                      + "<h3>SOJA</h3>19-Sep-25" + _T.format(head="", p=3, tail="</table>"),
+}
+
+
+def _records(fn: Callable, *a):
+    try:
+        return fn(*a).to_records()
+    except RuntimeError as e:
+        return f"erro: {e}"
+
+
+def check_equal(inputs: List[Tuple[str, str]]) -> int:
+    bad = 0
+    for name, html in inputs:
+        for produtos in (None, ["soja"], ["milho"]):
+            dom = _records(batch_from_html, html, "html.parser", False, produtos)
+            res = stream_tables(iter_text(html, 512), produtos=produtos)
+            got = _records(batch_from_stream, res, produtos)
+            if got != dom:
+                bad += 1
+                print(f"DIFERENTE: {name} produtos={produtos}")
+    return bad
+
+
+def _measure(fn: Callable, repeat: int) -> Tuple[float, float]:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, (time.perf_counter() - t0) * 1000)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak / 1024
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Leitura em fluxo x DOM: mesmo resultado, tempo e pico de memória.")
+    p.add_argument("--sizes", default="200,2000,20000", help="Linhas das tabelas sintéticas (vírgula).")
+    p.add_argument("--trailer-kb", type=int, default=512,
+                   help="HTML extra depois das tabelas (comentários, rodapé) nas páginas sintéticas.")
+    p.add_argument("--repeat", type=int, default=3)
+    args = p.parse_args()
+
+    sizes = [int(x) for x in args.sizes.split(",") if x.strip()]
+    trailer = "".join(f'<div class="comentario"><p>Comentário {i}</p><span>ok</span></div>'
+                      for i in range(args.trailer_kb * 1024 // 60))
+    inputs = [(n, h.replace("</body>", trailer + "</body>") if n.startswith("sintetica") else h)
+              for n, h in load_inputs(sizes)]
+
+    bad = check_equal(inputs + list(EDGE_CASES.items()))
+    print(f"Equivalência: {len(inputs) + len(EDGE_CASES)} páginas x 3 filtros, {bad} diferenças.\n")
+
+    print(f"{'entrada':<22}{'KB':>8}{'lidos KB':>10}{'DOM ms':>10}{'fluxo ms':>10}{'DOM pico KB':>13}"
+          f"{'fluxo pico KB':>15}")
+    for name, html in inputs:
+        data = html.encode("utf-8")
+        # o caminho atual recebe o corpo inteiro (resp.text) antes de montar o DOM
+        dom = _measure(lambda: batch_from_html(b"".join(iter_text(html)).decode("utf-8")), args.repeat)
+        res = stream_tables(iter_text(html), produtos=None)
+        stream = _measure(lambda: batch_from_stream(stream_tables(iter_text(html, CHUNK_SIZE))), args.repeat)
+        print(f"{name:<22}{len(data) / 1024:>8.0f}{res.bytes_read / 1024:>10.0f}{dom[0]:>10.2f}{stream[0]:>10.2f}"
+              f"{dom[1]:>13.0f}{stream[1]:>15.0f}")
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
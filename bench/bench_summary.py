@@ -0,0 +1,96 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+from datetime import date, timedelta
+
+import numpy as np
+
+BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from agrural_batch import PriceBatch  # noqa: E402
+from agrural_sinks import SCHEMAS, SQLiteSink, SqlServerSink  # noqa: E402
+from bench_pipeline import synth_page  # noqa: E402
+from agrural_core import batch_from_html  # noqa: E402
+
+# "Última cotação por praça" lida da tabela mantida pela carga (PrecoUltimo) x calculada
+# sobre o histórico inteiro (ROW_NUMBER no fato). Confere que dão o mesmo resultado depois
+# de cargas fora de ordem e de uma 2a fonte com parte dos dias (cada fonte tem a sua última
+# cotação) e mede as duas consultas. --conn-str inclui o SQL Server.
+
+LATEST_FROM_HISTORY = """
+SELECT produto, praca_id, fonte, data, compra_rs_sc FROM (
+  SELECT F.produto, F.praca_id, F.fonte, F.data, F.compra_rs_sc,
+         ROW_NUMBER() OVER (PARTITION BY F.produto, F.praca_id, F.fonte ORDER BY F.data DESC) AS rn
+  FROM {fato} AS F) AS X
+WHERE rn = 1
+"""
+LATEST_FROM_SUMMARY = "SELECT produto, praca_id, fonte, data, compra_rs_sc FROM {ultimo}"
+
+
+def history(pracas: int, days: int):
+    # um lote por dia; os dias vão fora de ordem (backfill no meio das cargas diárias)
+    base = batch_from_html(synth_page(pracas))
+    start = date(2024, 1, 1)
+    order = list(range(days))
+    order = order[::2] + order[1::2]
+    for i in order:
+        b = base.take(np.arange(len(base)))
+        b.text["data"] = np.full(len(b), (start + timedelta(days=i)).isoformat(), dtype=object)
+        b.cents["compra_R$/sc"] = b.cents["compra_R$/sc"] + (i * 7) % 300
+        yield b
+
+
+def _query(sink, sql: str, repeat: int):
+    cur = sink.connection().cursor()
+    best, rows = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        cur.execute(sql)
+        rows = cur.fetchall()
+        best = min(best, (time.perf_counter() - t0) * 1000)
+    return best, sorted((str(r[0]), int(r[1]), str(r[2]), str(r[3]), float(r[4])) for r in rows)
+
+
+def bench(label: str, sink, pracas: int, days: int, repeat: int, fato: str, ultimo: str) -> int:
+    with sink:
+        t0 = time.perf_counter()
+        batches = list(history(pracas, days))
+        sink.load(PriceBatch.concat(batches), batch_size=len(batches[0]) * 30)
+        # 2a fonte com os dias pares (mais antigos que a última cotação da AgRural)
+        sink.load(PriceBatch.concat(batches[:len(batches) // 2]), fonte="cooperativa")
+        load_s = time.perf_counter() - t0
+        hist_ms, hist = _query(sink, LATEST_FROM_HISTORY.format(fato=fato), repeat)
+        summ_ms, summ = _query(sink, LATEST_FROM_SUMMARY.format(ultimo=ultimo), repeat)
+    ok = hist == summ
+    print(f"{label:<24} {len(hist):>6} praças/fonte  histórico {hist_ms:>9.2f} ms  resumo {summ_ms:>8.2f} ms  "
+          f"carga {load_s:>6.1f} s  {'ok' if ok else 'DIFERENTE'}")
+    return 0 if ok else 1
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Última cotação por praça: tabela de resumo x histórico.")
+    p.add_argument("--pracas", type=int, default=400, help="Praças de soja na página sintética.")
+    p.add_argument("--days", type=int, default=250, help="Dias de histórico.")
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--conn-str", help="Connection string ODBC de um banco de TESTE (cria/grava o fato, a "
+                                      "DimPraca e o resumo).")
+    args = p.parse_args()
+
+    bad = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        bad |= bench("sqlite", SQLiteSink(os.path.join(tmp, "resumo.db")), args.pracas, args.days, args.repeat,
+                     "PrecoSojaFato", "PrecoSojaUltimo")
+    if args.conn_str:
+        for schema in SCHEMAS:
+            # mesmo banco: a 2a passada converte o fato rowstore em columnstore (e recarrega)
+            bad |= bench(f"sqlserver/{schema}", SqlServerSink(args.conn_str, strategy="tvp", schema=schema),
+                         args.pracas, args.days, args.repeat, "dbo.PrecoSojaFato", "dbo.PrecoSojaUltimo")
+    return bad
+
+
+if __name__ == "__main__":
+    sys.exit(main())
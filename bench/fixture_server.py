@@ -0,0 +1,148 @@
+import os
+import sys
+import gzip
+import time
+import argparse
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Servidor HTTP local com as páginas de bench/fixtures, para testar coletores sem tocar no
+# site. Cada resposta pode atrasar (--delay) e o servidor registra, por Host, quantas
+# requisições ficaram em voo ao mesmo tempo (pico) e os instantes de chegada.
+# HTTP/1.1 com keep-alive (conta as conexões abertas), gzip se o cliente aceitar e falhas
+# sob encomenda pela query string, para testar novas tentativas e prazo:
+#   ?fail=N          as N primeiras requisições desta URL respondem 503
+#   ?retry_after=S   junto com fail, manda Retry-After: S
+#   ?status=404      responde sempre este status
+#   ?stall=S         segura a resposta por S segundos (servidor pendurado)
+#   ?trickle=S       manda o corpo (sem gzip) 256 bytes por vez, com S segundos entre eles
+
+
+class FixtureServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, root: str = FIXTURES, delay: float = 0.0, gzip: bool = True):
+        self.root = root
+        self.delay = delay
+        self.gzip = gzip
+        self.connections = 0
+        self.hits: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.in_flight: Dict[str, int] = {}
+        self.peak: Dict[str, int] = {}
+        self.arrivals: Dict[str, list] = {}
+        super().__init__(("127.0.0.1", port), _Handler)
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self) -> "FixtureServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _Handler(SimpleHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # cabeçalho e corpo em escritas separadas + keep-alive
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, directory=args[2].root, **kwargs)
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        srv = self.server
+        host = (self.headers.get("Host") or "").lower()
+        with srv.lock:
+            srv.in_flight[host] = srv.in_flight.get(host, 0) + 1
+            srv.peak[host] = max(srv.peak.get(host, 0), srv.in_flight[host])
+            srv.arrivals.setdefault(host, []).append(time.monotonic())
+            srv.hits[self.path] = hit = srv.hits.get(self.path, 0) + 1
+        try:
+            if srv.delay:
+                time.sleep(srv.delay)
+            q = {k: v[0] for k, v in parse_qs(urlsplit(self.path).query).items()}
+            if "stall" in q:
+                time.sleep(float(q["stall"]))
+            if "status" in q:
+                self.send_error(int(q["status"]))
+            elif hit <= int(q.get("fail", 0)):
+                self.send_response(503)
+                if "retry_after" in q:
+                    self.send_header("Retry-After", q["retry_after"])
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            elif "trickle" in q:
+                self._send_trickle(float(q["trickle"]))
+            elif srv.gzip and "gzip" in (self.headers.get("Accept-Encoding") or ""):
+                self._send_gzip()
+            else:
+                super().do_GET()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # cliente desistiu (timeout)
+        finally:
+            with srv.lock:
+                srv.in_flight[host] -= 1
+
+    def _send_gzip(self):
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        with open(path, "rb") as f:
+            body = gzip.compress(f.read())
+        self.send_response(200)
+        self.send_header("Content-Type", self.guess_type(path))
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_trickle(self, interval: float):
+        # cada pedaço chega bem antes do timeout de leitura do cliente; só o prazo total pega
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        with open(path, "rb") as f:
+            body = f.read()
+        self.send_response(200)
+        self.send_header("Content-Type", self.guess_type(path))
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        for i in range(0, len(body), 256):
+            self.wfile.write(body[i:i + 256])
+            self.wfile.flush()
+            time.sleep(interval)
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Serve bench/fixtures por HTTP (teste local de coletores).")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--delay", type=float, default=0.0, help="Atraso de cada resposta, em segundos.")
+    p.add_argument("--no-gzip", action="store_true", help="Não comprime as respostas.")
+    args = p.parse_args()
+    srv = FixtureServer(args.port, delay=args.delay, gzip=not args.no_gzip)
+    print(f"Servindo {FIXTURES} em http://127.0.0.1:{srv.port}/ (Ctrl+C encerra)")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
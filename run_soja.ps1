@@ -27,6 +27,8 @@ $argsList = @(
     '--driver', $DRIVER,
     '--encrypt', $ENCRYPT,
     '--trust', $TRUST
+    # métricas estruturadas vão para logs\metrics.jsonl; para o Prometheus acrescente:
+    # '--prom-file', 'C:\Program Files\windows_exporter\textfile_inputs\agrural.prom'
 )
 
 "[INICIO] $(Get-Date)" | Tee-Object -FilePath $LOG -Append
@@ -1,262 +1,111 @@
 
-import re
+from __future__ import annotations
+
+import os
 import sys
-import math
 import argparse
-from datetime import datetime
-from typing import List, Dict, Optional
-
-import requests
-from bs4 import BeautifulSoup
-import pandas as pd
-
-URL = "https://agrural.com.br/precossojaemilho/"
-HEADERS = {
-    "User-Agent": (
-        "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
-        "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
-    ),
-    "Accept-Language": "pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7",
-}
-
-# ------------ utilidades ------------
-def normalize(s: str) -> str:
-    return (s or "").strip().replace("\xa0", " ")
-
-def br_to_float(text: str) -> float:
-
-    if text is None:
-        return float("nan")
-    t = text.strip().replace("\xa0", " ")
-    t = t.replace("−", "-").replace("\u2212", "-")
-    t = t.replace(".", "").replace(",", ".").replace("%", "").strip()
-    if t in {"", "-", "—"}:
-        return float("nan")
-    try:
-        return float(t)
-    except ValueError:
-        return float("nan")
-
-def find_soja_table(soup: BeautifulSoup) -> Optional[BeautifulSoup]:
-
-    for h in soup.find_all(["h2", "h3", "h4", "strong", "p"]):
-        if "soja" in h.get_text(" ", strip=True).lower():
-            tbl = h.find_next("table")
-            if tbl:
-                return tbl
-
-    for tbl in soup.find_all("table"):
-        text = tbl.get_text(" ", strip=True).lower()
-        if all(x in text for x in ["estado", "praça", "compra"]):
-            return tbl
-    return None
-
-def parse_date_near(table: BeautifulSoup) -> Optional[str]:
-
-    prev_txt = []
-    node = table
-    for _ in range(8):
-        node = node.find_previous(string=True)
-        if not node:
-            break
-        prev_txt.append(str(node))
-    blob = " ".join(prev_txt)
-    m = re.search(r"(\d{2}-[A-Za-z]{3}-\d{2,4})", blob)
-    if not m:
-        return None
-    raw = m.group(1)
-    for fmt in ("%d-%b-%y", "%d-%b-%Y"):
-        try:
-            return datetime.strptime(raw, fmt).date().isoformat()
-        except ValueError:
-            pass
-    pt_to_en = {"jan":"Jan","fev":"Feb","mar":"Mar","abr":"Apr","mai":"May","jun":"Jun",
-                "jul":"Jul","ago":"Aug","set":"Sep","out":"Oct","nov":"Nov","dez":"Dec"}
-    m2 = re.search(r"(\d{2})-([A-Za-z]{3})-(\d{2,4})", raw, flags=re.IGNORECASE)
-    if m2:
-        d, mon, y = m2.groups()
-        mon_en = pt_to_en.get(mon.lower(), mon.title())
-        for fmt in ("%d-%b-%y", "%d-%b-%Y"):
-            try:
-                return datetime.strptime(f"{d}-{mon_en}-{y}", fmt).date().isoformat()
-            except ValueError:
-                pass
-    return None
-
-
-def expand_html_table(table: BeautifulSoup) -> List[List[str]]:
-
-    body = table.find("tbody") or table
-    rows_raw = body.find_all("tr")
-    grid: List[List[str]] = []
-    # mapa: col_index -> (valor, restantes) para células que continuam nas próximas linhas
-    carry: Dict[int, Dict[str, object]] = {}
-
-    for tr in rows_raw:
-        cells = tr.find_all(["td", "th"])
-        # linha atual começando com valores "carregados" de rowspans anteriores
-        current: List[Optional[str]] = []
-        col_idx = 0
-
-
-        while True:
-            if col_idx in carry and carry[col_idx]["left"] > 0:
-                current.append(carry[col_idx]["val"])
-                carry[col_idx]["left"] -= 1
-                if carry[col_idx]["left"] == 0:
-                    del carry[col_idx]
-                col_idx += 1
-            else:
-                break
-
-
-        for cell in cells:
-            # avança col_idx até a próxima coluna livre (pode ter múltiplos carregados)
-            while col_idx in carry and carry[col_idx]["left"] > 0:
-                current.append(carry[col_idx]["val"])
-                carry[col_idx]["left"] -= 1
-                if carry[col_idx]["left"] == 0:
-                    del carry[col_idx]
-                col_idx += 1
-
-            text = normalize(cell.get_text(" ", strip=True))
-            rs = cell.get("rowspan")
-            try:
-                rs = int(rs) if rs else 1
-            except Exception:
-                rs = 1
-
-            current.append(text)
-
-            if rs > 1:
-                carry[col_idx] = {"val": text, "left": rs - 1}
-
-            col_idx += 1
-
-
-        grid.append([c if c is not None else "" for c in current])
-
-    return grid
-
-
-def fetch_rows() -> List[Dict]:
-    resp = requests.get(URL, headers=HEADERS, timeout=30)
-    resp.raise_for_status()
-    soup = BeautifulSoup(resp.text, "html.parser")
-
-    table = find_soja_table(soup)
-    if table is None:
-        raise RuntimeError("Tabela de Soja não encontrada (layout pode ter mudado).")
-
-    date_iso = parse_date_near(table)
-    grid = expand_html_table(table)
-    if not grid:
-        return []
-
-
-    header_row = None
-    for i, row in enumerate(grid[:3]):  # primeiras linhas costumam ter o header
-        low = [cell.lower() for cell in row]
-        if "estado" in " ".join(low) and "praça" in " ".join(low) and "compra" in " ".join(low):
-            header_row = i
-            break
-
-    if header_row is None:
-        header = [r for r in grid[0] if r]
-    else:
-        header = grid[header_row]
-
-    lower = [h.lower() for h in header]
-    def idx_of(*names):
-        for i, h in enumerate(lower):
-            for nm in names:
-                if nm in h:
-                    return i
-        return None
-
-    i_estado = idx_of("estado")
-    i_praca  = idx_of("praça", "praca")
-    i_compra = idx_of("compra")
-    i_var_d  = idx_of("variação hoje", "variacao hoje", "variação do dia", "var hoje")
-    i_var_w  = idx_of("1 semana", "semana")
-    i_var_m  = idx_of("1 mês", "1 mes", "mês", "mes")
-
-
-    start_idx = (header_row + 1) if header_row is not None else 1
-    data_rows = grid[start_idx:]
-
-    rows: List[Dict] = []
-    last_uf: Optional[str] = None
-
-    for r in data_rows:
-        joined_lower = " ".join([c.lower() for c in r])
-        if "agrural" in joined_lower:
-            continue
-
-        if None in (i_praca, i_compra, i_var_d, i_var_w, i_var_m):
-            if len(r) < 5:
-                continue
-            praca, compra, var_dia, var_sem, var_mes = r[-5:]
-            uf_cell = r[0] if r else ""
-        else:
-            uf_cell = r[i_estado] if (i_estado is not None and i_estado < len(r)) else ""
-            praca   = r[i_praca]  if (i_praca  is not None and i_praca  < len(r)) else ""
-            compra  = r[i_compra] if (i_compra is not None and i_compra < len(r)) else ""
-            var_dia = r[i_var_d]  if (i_var_d  is not None and i_var_d  < len(r)) else ""
-            var_sem = r[i_var_w]  if (i_var_w  is not None and i_var_w  < len(r)) else ""
-            var_mes = r[i_var_m]  if (i_var_m  is not None and i_var_m  < len(r)) else ""
-
-        # UF: pega da célula ou carrega da anterior
-        uf = None
-        if re.fullmatch(r"[A-Z]{2}", (uf_cell or "").strip()):
-            uf = uf_cell.strip()
-            last_uf = uf
-        else:
-            uf = last_uf
-
-        # números
-        compra_f = br_to_float(compra)
-        var_dia_f = br_to_float(var_dia)
-        var_sem_f = br_to_float(var_sem)
-        var_mes_f = br_to_float(var_mes)
-
-        # filtros mínimos
-        if not praca or math.isnan(compra_f):
-            continue
-        if praca.lower() in {"praça", "praca"}:
-            continue
-
-        rows.append({
-            "data": date_iso,
-            "uf": uf,
-            "praca": praca,
-            "compra_R$/sc": compra_f,
-            "var_dia_%": var_dia_f,
-            "var_sem_%": var_sem_f,
-            "var_mes_%": var_mes_f,
-        })
-
-    return rows
-
-def main(output_csv: str = "soja_agrural.csv"):
-    rows = fetch_rows()
-    if not rows:
+from typing import List, Optional
+
+from agrural_cache import ResponseCache, TableLocator, PendingBatches, DEFAULT_CACHE_DIR, response_cache_name
+from agrural_core import (
+    COMMODITIES, HEADERS, extract,
+    # reexportados: nomes históricos deste script
+    URL,  # noqa: F401
+    batch_from_grid, batch_from_html, batch_from_stream, batch_from_table, br_to_float,  # noqa: F401
+    date_from_text, expand_html_table, expand_rows, fetch_batch, fetch_batch_stream, fetch_html,  # noqa: F401
+    find_commodity_tables, find_soja_table, normalize, parse_date_near, read_html_file, rows_from_html,  # noqa: F401
+)
+from agrural_fanout import CsvDestino, Destino, ParquetDestino, fan_out
+from agrural_parsers import PARSERS
+from agrural_metrics import METRICS, DEFAULT_METRICS_FILE
+from agrural_http import RETRIES, DEADLINE_S, make_session
+
+# Extração em agrural_core (a mesma do script do SQL Server); aqui o lote vai para o CSV e,
+# com --history, para o histórico Parquet (agrural_fanout, um destino por thread).
+
+
+def main(output_csv: str = "soja_agrural.csv", cache: Optional[ResponseCache] = None,
+         parser: str = "html.parser", restrict: bool = False, produtos: Optional[List[str]] = None,
+         from_html: Optional[str] = None, history: Optional[str] = None, stream: bool = False,
+         locator: Optional[TableLocator] = None, session=None, pending: Optional[PendingBatches] = None,
+         append: bool = False):
+    # sem o CSV anterior em disco, o cache não tem o que preservar
+    if cache is not None and not os.path.exists(output_csv):
+        cache = None
+    if from_html:
+        cache = None  # replay offline de uma página salva: sem rede e sem cache
+    # CSV sem data de fallback: a coluna fica vazia se a página não trouxer a data
+    batch = extract(cache, parser, restrict, produtos, from_html=from_html, session=session, stream=stream,
+                    locator=locator, fallback_today=False)
+    if batch is None:
+        print("Cache: pagina sem alteracoes desde a ultima execucao. CSV mantido.")
+    elif not len(batch):
         print("Nenhuma linha capturada. O layout pode ter mudado.", file=sys.stderr)
         return 2
 
-    df = pd.DataFrame(rows, columns=[
-        "data", "uf", "praca", "compra_R$/sc", "var_dia_%", "var_sem_%", "var_mes_%"
-    ])
-
-    df["uf"] = df["uf"].ffill()
-    df = df.dropna(subset=["uf", "praca"]).reset_index(drop=True)
-
-    df.to_csv(output_csv, index=False, encoding="utf-8")
-    print(f"OK! {len(df)} linhas salvas em {output_csv}")
-    return 0
+    destinos: List[Destino] = [CsvDestino(output_csv, append=append)]
+    if history is not None:
+        # o CSV é sobrescrito a cada execução (sem --append); o histórico em Parquet acumula.
+        # "" = pasta padrão (agrural_history.DEFAULT_HISTORY_DIR)
+        destinos.append(ParquetDestino(history or None))
+    result = fan_out(batch, destinos, pending)
+    if batch is not None and cache is not None:
+        cache.commit()
+    return 1 if result["status"] == "falhas" else 0
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Scraper de preços de Soja (AgRural) — v4 (rowspan robusto).")
     parser.add_argument("-o", "--output", default="soja_agrural.csv", help="Caminho do CSV de saída.")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Pasta do cache de resposta HTTP.")
+    parser.add_argument("--no-cache", action="store_true", help="Ignora o cache e gera o CSV sempre.")
+    parser.add_argument("--parser", default="html.parser", choices=PARSERS, help="Backend de parse do HTML.")
+    parser.add_argument("--restrict-parse", action="store_true",
+                        help="Monta o DOM só com títulos e tabelas (SoupStrainer).")
+    parser.add_argument("--retries", type=int, default=RETRIES,
+                        help="Novas tentativas em erro transitório do site (5xx, 429, timeout), com backoff.")
+    parser.add_argument("--http-deadline", type=float, default=DEADLINE_S,
+                        help="Prazo total (s) para baixar a página, somando tentativas e esperas.")
+    parser.add_argument("--stream", action="store_true",
+                        help="Lê a página em pedaços, sem DOM, e fecha a conexão ao fim da última tabela.")
+    parser.add_argument("--produtos", default=",".join(COMMODITIES),
+                        help=f"Commodities no CSV, separadas por vírgula (padrão: {','.join(COMMODITIES)}).")
+    parser.add_argument("--from-html", metavar="FILE", help="Lê a página de um arquivo salvo em vez do site.")
+    parser.add_argument("--history", metavar="DIR", nargs="?", const="",
+                        help="Acrescenta as linhas ao histórico Parquet por data (requer pyarrow); "
+                             "sem DIR, a pasta historico ao lado do script.")
+    parser.add_argument("--append", action="store_true",
+                        help="Acumula no CSV em vez de sobrescrever: só chaves novas (data+produto+uf+praça) "
+                             "vão para o fim e valores alterados para o log de atualizações, com índice ao lado "
+                             "(agrural_csvappend). Linhas sem data ficam de fora.")
+    parser.add_argument("--metrics-file", default=DEFAULT_METRICS_FILE,
+                        help='JSON-lines com um evento por estágio + resumo da execução ("" desliga).')
+    parser.add_argument("--prom-file", help="Textfile do Prometheus (node_exporter) regravado a cada execução.")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Mostra o custo de import de cada caminho (com as opções dadas) e sai.")
+    parser.add_argument("--startup-target-ms", type=float, default=None,
+                        help="(profile-startup) meta de import do caminho mais comum; sai com 1 se passar.")
     args = parser.parse_args()
-    sys.exit(main(args.output))
+    if args.profile_startup:
+        from agrural_startup import STARTUP_TARGET_MS, profile_startup, scenarios
+        sys.exit(profile_startup("scrape_agrural_soja", scenarios(args.parser, bool(args.from_html), stream=args.stream),
+                                 target_ms=args.startup_target_ms or STARTUP_TARGET_MS,
+                                 cache_hit_args=None if args.from_html else
+                                 ["--parser", args.parser] + (["--stream"] if args.stream else [])))
+    produtos = [x.strip().lower() for x in args.produtos.split(",") if x.strip()]
+    # com --history o histórico Parquet também é destino: outra chave de cache
+    destinos = ["csv"] + (["parquet"] if args.history is not None else [])
+    cache = None if args.no_cache else \
+        ResponseCache(args.cache_dir, response_cache_name("scrape_http", destinos, produtos))
+    locator = None if args.no_cache else TableLocator(args.cache_dir, "scrape_locator.json")
+    pending = None if args.no_cache else PendingBatches(args.cache_dir, "scrape_pendente")
+    session = None if args.from_html else make_session(HEADERS, retries=args.retries, deadline_s=args.http_deadline)
+    try:
+        rc = main(args.output, cache, parser=args.parser, restrict=args.restrict_parse, produtos=produtos,
+                  from_html=args.from_html, history=args.history, stream=args.stream, locator=locator,
+                  session=session, pending=pending, append=args.append)
+    except Exception as e:
+        METRICS.emit("erro", args.metrics_file, args.prom_file, job="agrural_scrape",
+                     error=f"{type(e).__name__}: {e}")
+        raise
+    METRICS.emit({0: "ok", 2: "sem_linhas"}.get(rc, "falhas"), args.metrics_file, args.prom_file, job="agrural_scrape")
+    sys.exit(rc)